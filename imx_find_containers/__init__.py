@@ -1,5 +1,69 @@
-from .find import *
-from .main import *
-from .utils import *
-from . import imx
-from . import fit
+import sys
+import importlib
+
+# The package has a types submodule, which replaces a types global once it is
+# imported
+from types import ModuleType as _ModuleType
+
+
+# The package modules are only imported when one of their names is first used
+# so that importing the package (and starting the command line tool) is fast.
+# The public names of these modules are available from the package:
+_star_modules = ('find', 'main', 'utils', 'aio')
+
+# These modules are available as attributes of the package
+_submodules = ('imx', 'fit')
+
+
+def __getattr__(name):
+    # Submodules that have already been imported
+    module = sys.modules.get(f'{__name__}.{name}')
+    if module is not None:
+        return module
+
+    if name in _submodules:
+        return importlib.import_module(f'.{name}', __name__)
+
+    # "from . import <module>" looks up the module as an attribute first, only
+    # the module itself is imported so the star modules (and the modules they
+    # import) aren't imported by a module that they import. The main function
+    # is returned instead of the main module, see _Package.
+    if name != 'main':
+        try:
+            return importlib.import_module(f'.{name}', __name__)
+        except ModuleNotFoundError as e:
+            if e.name != f'{__name__}.{name}':
+                raise
+
+    for modname in _star_modules:
+        module = importlib.import_module(f'.{modname}', __name__)
+        if name in module.__all__:
+            value = getattr(module, name)
+            # Cache the value so this function isn't called again for this name
+            globals()[name] = value
+            return value
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    names = set(globals()) | set(_submodules)
+    for modname in _star_modules:
+        names.update(importlib.import_module(f'.{modname}', __name__).__all__)
+    return sorted(names)
+
+
+class _Package(_ModuleType):
+    # Importing a submodule sets the package attribute with the name of the
+    # submodule. A star module that exports its own name (the main function of
+    # the main module) sets the exported value instead, so the package
+    # attribute is the same as it was when the star modules were imported by
+    # "from .<module> import *".
+    def __setattr__(self, name, value):
+        if isinstance(value, _ModuleType) and value.__name__ == f'{__name__}.{name}' and \
+                name in _star_modules and name in getattr(value, '__all__', ()):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
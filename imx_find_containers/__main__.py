@@ -1,2 +1,5 @@
-from . import main
-main()
+from .main import main
+
+# The scan server's worker processes import this module again
+if __name__ == '__main__':
+    main()
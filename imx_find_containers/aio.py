@@ -0,0 +1,112 @@
+import asyncio
+import functools
+import threading
+import concurrent.futures
+
+from . import find
+
+
+# Marks the end of the containers found by a scan
+_DONE = object()
+
+
+class AsyncScanner:
+    # Runs scan_file() in an executor so scans don't block the event loop. The
+    # executor must run the scans in threads of this process (the default is
+    # the event loop's default executor), max_scans limits the number of
+    # scans that run at the same time, other scans wait for their turn.
+    #
+    # When the task awaiting a scan is cancelled the scan loop is stopped
+    # before the next offset is searched and the cancellation is complete once
+    # the scan has stopped.
+    def __init__(self, executor=None, max_scans=None):
+        assert not isinstance(executor, concurrent.futures.ProcessPoolExecutor)
+        assert max_scans is None or max_scans > 0
+        self.executor = executor
+        self.max_scans = max_scans
+        self._semaphore = None
+
+    def _limit(self):
+        if self.max_scans is None:
+            return _no_limit()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_scans)
+        return self._semaphore
+
+    async def _run(self, filename, cancel, kwargs):
+        loop = asyncio.get_running_loop()
+        scan = functools.partial(find.scan_file, filename, cancel=cancel, **kwargs)
+        return await loop.run_in_executor(self.executor, scan)
+
+    async def scan_file(self, filename, **kwargs):
+        # Returns the list of containers found, kwargs are the scan_file()
+        # params
+        cancel = threading.Event()
+        async with self._limit():
+            task = asyncio.ensure_future(self._run(filename, cancel, kwargs))
+            try:
+                return await asyncio.shield(task)
+            finally:
+                await _stop(task, cancel)
+
+    async def iter_containers(self, filename, **kwargs):
+        # Yields each container as soon as it is found, kwargs are the
+        # scan_file() params. Closing the generator early stops the scan.
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancel = threading.Event()
+
+        def found(c):
+            loop.call_soon_threadsafe(queue.put_nowait, c)
+
+        async with self._limit():
+            task = asyncio.ensure_future(self._run(filename, cancel, dict(kwargs, on_container=found)))
+            task.add_done_callback(lambda _: queue.put_nowait(_DONE))
+            try:
+                while True:
+                    c = await queue.get()
+                    if c is _DONE:
+                        break
+                    yield c
+
+                # Raise any exception from the scan
+                task.result()
+            finally:
+                await _stop(task, cancel)
+
+
+class _no_limit:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+async def _stop(task, cancel):
+    # Stop a scan that hasn't finished and wait for the executor thread to
+    # return so the scan no longer uses the file
+    if not task.done():
+        cancel.set()
+        await asyncio.wait([task])
+    if not task.cancelled():
+        # Retrieve the exception so it isn't reported as unhandled
+        task.exception()
+
+
+async def scan_file_async(filename, executor=None, **kwargs):
+    # Asynchronous version of scan_file() that returns the same containers
+    return await AsyncScanner(executor=executor).scan_file(filename, **kwargs)
+
+
+async def iter_containers_async(filename, executor=None, **kwargs):
+    # Use with "async for" to process each container as it is found
+    async for c in AsyncScanner(executor=executor).iter_containers(filename, **kwargs):
+        yield c
+
+
+__all__ = [
+    'AsyncScanner',
+    'scan_file_async',
+    'iter_containers_async',
+]
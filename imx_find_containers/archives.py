@@ -0,0 +1,155 @@
+import os
+import fnmatch
+import tarfile
+import zipfile
+import threading
+import collections
+
+
+# Files inside of zip and tar archives are identified by the archive path and
+# the name of the file in the archive separated by "!/", such as:
+#   release.zip!/images/flash.bin
+SEPARATOR = '!/'
+
+_zip_patterns = ('*.zip',)
+_tar_patterns = ('*.tar', '*.tar.gz', '*.tgz', '*.tar.bz2', '*.tbz2', '*.tar.xz', '*.txz')
+
+# Each thread keeps the most recently opened archive open, so scans in
+# different threads don't share an archive. The files in a tar archive are
+# listed while the archive is read, when each file is read before the next one
+# is listed a compressed tar archive is only decompressed once.
+_local = threading.local()
+
+# The sizes of the most recently listed files in archives
+MAX_MEMBER_SIZES = 0x10000
+_member_sizes = collections.OrderedDict()
+_member_sizes_lock = threading.Lock()
+
+# The exceptions raised when an archive can't be read
+ArchiveErrors = (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError)
+
+
+def is_archive(filename):
+    name = os.path.basename(filename).lower()
+    return any(fnmatch.fnmatch(name, p) for p in _zip_patterns + _tar_patterns)
+
+
+def split_path(path):
+    # Returns the (archive, member name) of a path to a file inside of an
+    # archive, or None if the path isn't inside of an archive
+    if not isinstance(path, str):
+        return None
+    archive, sep, name = path.partition(SEPARATOR)
+    if not sep or not name or not is_archive(archive) or not os.path.isfile(archive):
+        return None
+    return (archive, name)
+
+
+class _Archive:
+    def __init__(self, filename):
+        self.filename = filename
+        if fnmatch.fnmatch(os.path.basename(filename).lower(), '*.zip'):
+            self._zip = zipfile.ZipFile(filename)
+            self._tar = None
+        else:
+            self._tar = tarfile.open(filename)
+            self._zip = None
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
+
+    def members(self):
+        # Yields the (name, size) of each regular file in the archive, in the
+        # order they are stored
+        if self._zip is not None:
+            for info in self._zip.infolist():
+                if not info.is_dir():
+                    yield (info.filename, info.file_size)
+        else:
+            for info in self._tar:
+                if info.isreg():
+                    yield (info.name, info.size)
+
+    def open(self, name):
+        if self._zip is not None:
+            return self._zip.open(name)
+
+        # The file is usually the last one that was listed, only the headers up
+        # to the file are read instead of the whole archive
+        members = self._tar.members
+        if members and members[-1].name == name:
+            return self._tar.extractfile(members[-1])
+        for info in self._tar:
+            if info.name == name:
+                return self._tar.extractfile(info)
+        raise KeyError(f'{name} not found in {self.filename}')
+
+
+def _get_archive(filename):
+    archive = getattr(_local, 'archive', None)
+    if archive is None or archive.filename != filename:
+        close()
+        archive = _local.archive = _Archive(filename)
+    return archive
+
+
+def close():
+    # Close the archive that has been kept open by this thread
+    archive = getattr(_local, 'archive', None)
+    if archive is not None:
+        archive.close()
+        _local.archive = None
+
+
+def forget():
+    # Forget the open archive without closing it, used by worker processes so
+    # they don't use the file objects of the parent process
+    _local.archive = None
+
+
+def iter_members(filename):
+    # Yields the (path, size) of each file in an archive as the archive is
+    # read, paths use the archive!/name format
+    archive = _get_archive(filename)
+    for name, size in archive.members():
+        path = f'{filename}{SEPARATOR}{name}'
+        with _member_sizes_lock:
+            _member_sizes[path] = size
+            _member_sizes.move_to_end(path)
+            while len(_member_sizes) > MAX_MEMBER_SIZES:
+                _member_sizes.popitem(last=False)
+        yield (path, size)
+
+
+def list_members(filename):
+    # Returns the (path, size) of each file in an archive
+    return list(iter_members(filename))
+
+
+def member_size(path):
+    # Returns the size of a file inside of an archive that has been listed
+    # recently, or None
+    with _member_sizes_lock:
+        return _member_sizes.get(path)
+
+
+def open_member(path):
+    # Returns a file-like object to read a file inside of an archive, the file
+    # is read in order and can't be seeked.
+    archive, name = split_path(path)
+    return _get_archive(archive).open(name)
+
+
+__all__ = [
+    'SEPARATOR',
+    'ArchiveErrors',
+    'is_archive',
+    'split_path',
+    'iter_members',
+    'list_members',
+    'member_size',
+    'open_member',
+]
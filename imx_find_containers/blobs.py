@@ -0,0 +1,114 @@
+import os
+import hashlib
+import contextlib
+
+from .types import LazyBytes
+
+
+# Default directory name used to hold image contents, the directory is created
+# next to the scan results file
+DEFAULT_BLOB_DIR = 'scan_results.blobs'
+
+
+class BlobStore:
+    def __init__(self, path=DEFAULT_BLOB_DIR):
+        self.path = path
+
+    def _blob_path(self, digest):
+        # Split the blobs into subdirectories based on the first byte of the
+        # digest so no single directory ends up with too many files
+        return os.path.join(self.path, digest[:2], digest[2:])
+
+    def __contains__(self, digest):
+        return os.path.exists(self._blob_path(digest))
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+
+        # Identical contents are only written once
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+
+            # Write to a temporary file first so a partially written blob is
+            # never mistaken for a complete one
+            tmp_path = f'{blob_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, blob_path)
+
+        return BlobRef(digest, len(data), store=self)
+
+    def get(self, digest):
+        with open(self._blob_path(digest), 'rb') as f:
+            return f.read()
+
+    def put_image(self, img):
+        # Return a copy of the image where the contents have been replaced
+        # with a reference to the blob. Only binary contents are moved to the
+        # store, generated text (such as the DTS of a FIT image) stays inline.
+        data = img['data']
+        if isinstance(data, bytes) or (isinstance(data, LazyBytes) and data.export_contents):
+            img = img.copy()
+            img['data'] = self.put(bytes(data))
+        return img
+
+
+# The blob store that newly loaded BlobRef objects should retrieve their
+# contents from
+_current_store = None
+
+
+def current_store():
+    return _current_store
+
+
+@contextlib.contextmanager
+def using_store(store):
+    global _current_store
+    prev_store = _current_store
+    _current_store = store
+    try:
+        yield store
+    finally:
+        _current_store = prev_store
+
+
+class BlobRef(LazyBytes):
+    export_contents = False
+
+    def __init__(self, digest, length, store=None):
+        self.digest = digest
+        self.length = length
+
+        if store is None:
+            store = _current_store
+        self._store = store
+        self._data = None
+
+    def resolve(self):
+        if self._data is None:
+            if self._store is None:
+                raise FileNotFoundError(f'No blob store available for {self.digest}')
+            self._data = self._store.get(self.digest)
+            assert len(self._data) == self.length
+        return self._data
+
+    def __reduce__(self):
+        # Only the digest and length are saved, the contents stay in the store
+        return (self.__class__, (self.digest, self.length))
+
+    @classmethod
+    def to_yaml(cls, representer, node):
+        value = {'digest': node.digest, 'length': node.length}
+        return representer.represent_mapping(cls.yaml_tag, value, flow_style=False)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.digest}, {self.length:#x})'
+
+
+__all__ = [
+    'DEFAULT_BLOB_DIR',
+    'BlobStore',
+    'BlobRef',
+]
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import socket
+
+
+# This module only uses the standard library so the client starts quickly, the
+# scanning modules are only imported by the server (or if there is no server
+# running).
+
+# The server socket can be set with the IMX_FIND_CONTAINERS_SOCKET environment
+# variable, by default the socket is in the user's runtime directory.
+SOCKET_ENV = 'IMX_FIND_CONTAINERS_SOCKET'
+
+
+def default_socket():
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'imx_find_containers.sock')
+    return f'/tmp/imx_find_containers-{os.getuid()}.sock'
+
+
+# The protocol is one JSON object per line. The client sends one request:
+#   {"command": "run", "argv": [...], "cwd": "..."}
+#       Run a command line in the client's working directory
+#   {"command": "stop"}
+#       Stop the server
+# and the server responds with any number of output messages followed by the
+# exit status of the command:
+#   {"output": "..."}
+#   {"status": 0}
+
+
+def request(message, socket_path=None):
+    # Yields the messages that the server responds with
+    if socket_path is None:
+        socket_path = default_socket()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile('rwb') as f:
+            f.write(json.dumps(message).encode() + b'\n')
+            f.flush()
+            for line in f:
+                yield json.loads(line)
+
+
+def run(argv, socket_path=None, cwd=None):
+    # Runs a command line on the server and prints the output, returns the
+    # exit status
+    if cwd is None:
+        cwd = os.getcwd()
+    status = 1
+    for msg in request({'command': 'run', 'argv': argv, 'cwd': cwd}, socket_path):
+        if 'output' in msg:
+            sys.stdout.write(msg['output'])
+            sys.stdout.flush()
+        if 'status' in msg:
+            status = msg['status']
+    return status
+
+
+def main(argv=None):
+    # Accepts the same arguments as imx_find_containers, if the server isn't
+    # running the command is run by this process instead
+    if argv is None:
+        argv = sys.argv[1:]
+    try:
+        return run(argv)
+    except (FileNotFoundError, ConnectionRefusedError):
+        from .main import main as cli_main
+        return cli_main(argv)
+
+
+__all__ = [
+    'default_socket',
+    'request',
+    'run',
+]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
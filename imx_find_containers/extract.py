@@ -0,0 +1,302 @@
+import os
+import time
+import json
+import hashlib
+import tarfile
+import zipfile
+import concurrent.futures
+
+from .types import LazyBytes, SourceData
+
+
+# Size of the buffer used when the contents have to be copied through python
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _copy_file_range(src_fd, dst_fd, offset, length):
+    # Copies within the kernel, and on filesystems that support it (btrfs, XFS,
+    # NFS 4.2, ...) creates a reflink instead of copying the data at all
+    copied = 0
+    while copied < length:
+        count = os.copy_file_range(src_fd, dst_fd, length - copied, offset + copied)
+        if count == 0:
+            break
+        copied += count
+    return copied
+
+
+def _sendfile(src_fd, dst_fd, offset, length):
+    copied = 0
+    while copied < length:
+        count = os.sendfile(dst_fd, src_fd, offset + copied, length - copied)
+        if count == 0:
+            break
+        copied += count
+    return copied
+
+
+def _copy_chunks(src_fd, dst_fd, offset, length):
+    buf = bytearray(min(length, COPY_CHUNK_SIZE))
+    view = memoryview(buf)
+    copied = 0
+    while copied < length:
+        count = os.preadv(src_fd, [view[:length - copied]], offset + copied)
+        if count == 0:
+            break
+        os.write(dst_fd, view[:count])
+        copied += count
+    return copied
+
+
+# The copy methods in order of preference, if a method is not supported for a
+# particular file the next method is tried
+_copy_methods = [_copy_file_range, _sendfile, _copy_chunks]
+
+
+def copy_range(src_fd, dst_fd, offset, length):
+    # Copy length bytes from offset in the source file to the current position
+    # of the destination file without reading the contents into python.
+    dst_pos = os.lseek(dst_fd, 0, os.SEEK_CUR)
+    for method in _copy_methods:
+        try:
+            copied = method(src_fd, dst_fd, offset, length)
+        except (AttributeError, OSError) as e:
+            # AttributeError: the method isn't available on this platform.
+            # OSError: the method isn't supported for these files (EXDEV,
+            # EINVAL, ENOSYS, ...), if nothing was written yet try the next
+            # method.
+            if isinstance(e, OSError) and os.lseek(dst_fd, 0, os.SEEK_CUR) != dst_pos:
+                raise
+            continue
+
+        if copied != length:
+            raise EOFError(f'Only {copied:#x} of {length:#x} bytes available @ {offset:#x}')
+        return copied
+
+    raise OSError(f'Unable to copy {length:#x} bytes @ {offset:#x}')
+
+
+def hash_range(fd, offset, length):
+    # Returns the SHA-256 digest of length bytes from offset in a file
+    hasher = hashlib.sha256()
+    buf = bytearray(min(length, COPY_CHUNK_SIZE))
+    view = memoryview(buf)
+    done = 0
+    while done < length:
+        count = os.preadv(fd, [view[:length - done]], offset + done)
+        if count == 0:
+            raise EOFError(f'Only {done:#x} of {length:#x} bytes available @ {offset:#x}')
+        hasher.update(view[:count])
+        done += count
+    return hasher.hexdigest()
+
+
+def write_image(data, filename, hash_contents=False):
+    # Write image contents to a file, image contents that are part of a scanned
+    # file are copied directly from that file. Returns the size of the image
+    # and the SHA-256 digest of the contents if hash_contents is set.
+    digest = None
+    if isinstance(data, SourceData):
+        with open(data.source, 'rb') as src, open(filename, 'wb') as dst:
+            size = copy_range(src.fileno(), dst.fileno(), data.offset, data.length)
+
+            # The copy doesn't pass through python so the contents are hashed
+            # separately, the source range was just read and is usually still
+            # in the page cache
+            if hash_contents:
+                digest = hash_range(src.fileno(), data.offset, data.length)
+        return size, digest
+
+    if isinstance(data, LazyBytes):
+        data = data.resolve()
+    elif isinstance(data, str):
+        # Generated text such as the DTS of a FIT image
+        data = data.encode()
+
+    if hash_contents:
+        digest = hashlib.sha256(data).hexdigest()
+    with open(filename, 'wb') as f:
+        f.write(data)
+    return len(data), digest
+
+
+class ExtractionPool:
+    # Writes images with a pool of threads. If a manifest filename is provided
+    # a JSON manifest is saved when the pool is closed that maps each file
+    # written to the image it came from, along with the size and SHA-256 digest
+    # of the file.
+    def __init__(self, workers=None, manifest=None):
+        self.manifest = manifest
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._pending = []
+        self._names = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(save_manifest=exc_type is None)
+
+    def _write(self, data, filename, info):
+        size, digest = write_image(data, filename, hash_contents=self.manifest is not None)
+        entry = {'file': filename, 'size': size, 'sha256': digest}
+        entry.update(info)
+        return entry
+
+    def submit(self, data, filename, **info):
+        # The same image may be part of more than one container, only write
+        # it once
+        if filename in self._names:
+            return
+        self._names.add(filename)
+
+        print(f'Exporting image: {filename}')
+        self._pending.append(self._executor.submit(self._write, data, filename, info))
+
+    def close(self, save_manifest=True):
+        self._executor.shutdown(wait=True)
+        entries = [f.result() for f in self._pending]
+        self._pending = []
+
+        if save_manifest and self.manifest is not None and entries:
+            print(f'Saving extraction manifest: {self.manifest}')
+            with open(self.manifest, 'w') as f:
+                json.dump(entries, f, indent=1)
+
+        return entries
+
+
+class _ImageReader:
+    # File-like reader for image contents used to stream images into an
+    # archive, contents that are part of a scanned file are read directly from
+    # that file. The SHA-256 digest of the contents is calculated as they are
+    # read.
+    def __init__(self, data):
+        self._fd = None
+        self._data = None
+        if isinstance(data, SourceData):
+            self._fd = os.open(data.source, os.O_RDONLY)
+            self._offset = data.offset
+            self.length = data.length
+        else:
+            if isinstance(data, LazyBytes):
+                data = data.resolve()
+            elif isinstance(data, str):
+                data = data.encode()
+            self._data = memoryview(data)
+            self.length = len(data)
+        self._pos = 0
+        self._hash = hashlib.sha256()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.length - self._pos:
+            size = self.length - self._pos
+        if self._fd is not None:
+            data = os.pread(self._fd, size, self._offset + self._pos)
+        else:
+            data = self._data[self._pos:self._pos + size].tobytes()
+        self._pos += len(data)
+        self._hash.update(data)
+        return data
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+def _tar_mode(filename):
+    for ext, mode in (('.tar.gz', 'w:gz'), ('.tgz', 'w:gz'), ('.tar.bz2', 'w:bz2'), ('.tar.xz', 'w:xz')):
+        if filename.endswith(ext):
+            return mode
+    return 'w'
+
+
+class ArchiveWriter:
+    # Writes images into a single tar or zip archive instead of individual
+    # files. Each image is streamed into the archive as it is submitted without
+    # any intermediate files. The submit() and close() methods work the same as
+    # the ExtractionPool.
+    def __init__(self, filename, manifest=None):
+        self.filename = filename
+        self.manifest = manifest
+        self._entries = []
+        self._names = set()
+
+        if filename.endswith('.zip'):
+            self._zip = zipfile.ZipFile(filename, 'w', compression=zipfile.ZIP_DEFLATED)
+            self._tar = None
+        else:
+            self._tar = tarfile.open(filename, _tar_mode(filename))
+            self._zip = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(save_manifest=exc_type is None)
+
+    def _add(self, reader, name):
+        if self._zip is not None:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = self._zip.compression
+            info.file_size = reader.length
+            with self._zip.open(info, 'w') as f:
+                while True:
+                    data = reader.read(COPY_CHUNK_SIZE)
+                    if not data:
+                        break
+                    f.write(data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = reader.length
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self._tar.addfile(info, reader)
+
+    def submit(self, data, filename, **info):
+        # The same image may be part of more than one container, only add it
+        # to the archive once
+        if filename in self._names:
+            return
+        self._names.add(filename)
+
+        print(f'Archiving image: {filename}')
+        with _ImageReader(data) as reader:
+            self._add(reader, filename)
+            entry = {'file': filename, 'size': reader.length, 'sha256': reader.hexdigest()}
+        entry.update(info)
+        self._entries.append(entry)
+
+    def close(self, save_manifest=True):
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
+        self._zip = None
+        self._tar = None
+
+        if save_manifest and self.manifest is not None and self._entries:
+            print(f'Saving extraction manifest: {self.manifest}')
+            with open(self.manifest, 'w') as f:
+                json.dump(self._entries, f, indent=1)
+
+        return self._entries
+
+
+__all__ = [
+    'copy_range',
+    'hash_range',
+    'write_image',
+    'ExtractionPool',
+    'ArchiveWriter',
+]
@@ -0,0 +1,194 @@
+import re
+import enum
+import operator
+
+
+# Filter expressions have the form "key<op>value" where op is one of =, !=, <,
+# <=, > or >=.  Equality filters can match any of a comma separated list of
+# values, for example:
+#   container=iMXImageContainer
+#   type=EXE,DATA
+#   core_id!=SC
+#   signed=0
+#   fdt=fit
+#   size<=16M
+#
+# Enum values are compared by name, all of the expressions must match for an
+# image to be selected.  If an image doesn't have the attribute a filter is for
+# (such as the "type" of a FIT image) the image doesn't match.
+_ops = {
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+_size_suffixes = {
+    'K': 1024,
+    'M': 1024 * 1024,
+    'G': 1024 * 1024 * 1024,
+}
+
+
+def _container_signed(container):
+    # i.MX containers are signed if they have a signature block, IVTs are
+    # signed if there is a CSF
+    if getattr(container, 'sigblock', None) is not None:
+        return True
+    elif getattr(container, 'csf', None) is not None:
+        return True
+    return False
+
+
+def _container_fdt(container):
+    # FDT blobs are either FIT images or plain device trees
+    if not hasattr(container, 'fit'):
+        return None
+    return 'fit' if container.fit else 'dtb'
+
+
+def _image_size(img):
+    if img.get('range') is not None:
+        return len(img['range'])
+    elif img.get('data') is not None:
+        return len(img['data'])
+    return None
+
+
+# Filter keys that are attributes of the container, all other keys are image
+# attributes
+_container_keys = {
+    'container': lambda c: c.__class__.__name__,
+    'signed': _container_signed,
+    'fdt': _container_fdt,
+}
+
+_image_keys = {
+    'type': lambda img: img.get('type'),
+    'core_id': lambda img: img.get('core_id'),
+    'cpu_id': lambda img: img.get('cpu_id'),
+    'encrypted': lambda img: img.get('encrypted'),
+    'fileext': lambda img: img.get('fileext', 'bin'),
+    'size': _image_size,
+}
+
+
+def _parse_value(value):
+    value = value.strip()
+    if value.lower() in ('true', 'yes'):
+        return True
+    elif value.lower() in ('false', 'no'):
+        return False
+
+    try:
+        return int(value, 0)
+    except ValueError:
+        pass
+
+    match = re.fullmatch(r'(\d+)([KMG])i?B?', value, re.IGNORECASE)
+    if match is not None:
+        return int(match.group(1)) * _size_suffixes[match.group(2).upper()]
+
+    return value
+
+
+def split_expression(expr):
+    # Returns the (key, op, values) of an expression without checking that the
+    # key is a filter key
+    match = re.fullmatch(r'\s*(\w+)\s*(==|=|!=|<=|>=|<|>)\s*(.*)', expr)
+    if match is None:
+        raise ValueError(f'invalid filter: {expr}')
+    key, op, value = match.groups()
+
+    values = tuple(_parse_value(v) for v in value.split(','))
+    if len(values) > 1 and op not in ('=', '==', '!='):
+        raise ValueError(f'multiple values can only be used with = or !=: {expr}')
+    return (key, op, values)
+
+
+def parse_expression(expr):
+    key, op, values = split_expression(expr)
+    if key not in _container_keys and key not in _image_keys:
+        raise ValueError(f'unknown filter key "{key}" in: {expr}')
+    return (key, op, values)
+
+
+def _compare(actual, op, expected):
+    if actual is None:
+        return False
+
+    # Enum values are matched by name
+    if isinstance(actual, enum.Enum) and isinstance(expected, str):
+        actual = actual.name
+
+    try:
+        return _ops[op](actual, expected)
+    except TypeError:
+        # Values that can't be ordered (such as an unknown enum value compared
+        # to a name) don't match
+        return False
+
+
+def _match_term(actual, op, values):
+    if op == '!=':
+        return actual is not None and all(_compare(actual, op, v) for v in values)
+    return any(_compare(actual, op, v) for v in values)
+
+
+class ImageFilter:
+    def __init__(self, expressions=()):
+        self.container_terms = []
+        self.image_terms = []
+
+        # The parsed expressions are kept so the filter can be pickled, the
+        # terms hold the functions that get each value
+        self.expressions = tuple(parse_expression(e) if isinstance(e, str) else tuple(e) for e in expressions)
+        for key, op, values in self.expressions:
+            if key in _container_keys:
+                self.container_terms.append((_container_keys[key], op, values))
+            else:
+                self.image_terms.append((_image_keys[key], op, values))
+
+    def __bool__(self):
+        return bool(self.container_terms or self.image_terms)
+
+    def __reduce__(self):
+        return (self.__class__, (self.expressions,))
+
+    def match_container(self, container):
+        return all(_match_term(get(container), op, values) for get, op, values in self.container_terms)
+
+    def match_image(self, img):
+        return all(_match_term(get(img), op, values) for get, op, values in self.image_terms)
+
+    def match(self, container, img):
+        return self.match_container(container) and self.match_image(img)
+
+    def select_images(self, container):
+        # Returns the images in a container that match the filter, only the
+        # image attributes are checked, the image contents are not accessed
+        if not container.images or not self.match_container(container):
+            return []
+        return [img for img in container.images if self.match_image(img)]
+
+    def select_containers(self, containers):
+        # Returns the containers that match the filter, if there are any image
+        # filters only containers with at least one matching image are included
+        selected = []
+        for c in containers:
+            if not self.match_container(c):
+                continue
+            if self.image_terms and not self.select_images(c):
+                continue
+            selected.append(c)
+        return selected
+
+
+__all__ = [
+    'split_expression',
+    'parse_expression',
+    'ImageFilter',
+]
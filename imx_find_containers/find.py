@@ -1,8 +1,26 @@
+import os
+import sys
+import mmap
+import stat
+import time
+import json
 import traceback
+import collections
 
 from .imx import iMXImageContainer, iMXImageVectorTable
+from .imx.types import ContainerHeader, MAX_CONTAINER_SIZE
+from .imx.ivt_types import IVT_HEADER_SIZE
 from .fit import FITContainer
+from .fit.fit_types import FDTHeader
 from . import utils
+from . import views
+from . import filters
+from .types import SourceData
+
+
+# Files smaller than the smallest container header can't contain anything
+MIN_HEADER_SIZE = min(ContainerHeader.size, IVT_HEADER_SIZE, FDTHeader.size)
+
 
 def _find_next_unknown_addr(container_list, offset, verbose=False):
     # Ensure that this address does not fall in any of the images belonging to
@@ -39,95 +57,404 @@ def _find_next_unknown_addr(container_list, offset, verbose=False):
         return offset
 
 
-def _find_container(data, increment=4, verbose=False):
+def _parse_imx_container(data, offset, verbose=False, image_filter=None, stats=None):
+    c = iMXImageContainer(data, offset, verbose=verbose, image_filter=image_filter)
+    container_list = [c]
+
+    # iMX container images may be FIT images, check now. The FIT is parsed
+    # from the scanned data so the image contents don't need to be read.
+    for img in c.images:
+        if img['range'] is None:
+            continue
+        start = img['range'].start
+        if FITContainer.is_container(data=data, offset=start, verbose=verbose) and \
+                FITContainer.validate(data, start) is None:
+            if verbose:
+                print(f'Extracting FIT from image @ {img["offset"]:#x}')
+
+            # A FIT that can't be parsed is only counted, the container is
+            # still valid
+            try:
+                fit = FITContainer(data=data, offset=start, verbose=verbose, image_filter=image_filter)
+            except AssertionError:
+                if stats is not None:
+                    stats[(FITContainer.__name__, 'parse error')] += 1
+                if verbose:
+                    print(f'Unable to extract probable {FITContainer.__name__} @ {start:#x}')
+                    traceback.print_exc()
+                continue
+
+            # The FIT must be inside of the container image
+            if fit.end > img['range'].stop:
+                continue
+
+            # If the fit image uses the entire container image, set
+            # it's data to None
+            if img['range'].stop == fit.end:
+                img['data'] = None
+
+            # Add the fit image container to the list
+            container_list.append(fit)
+
+    return container_list
+
+
+def _parse_container(cls, data, offset, verbose=False, image_filter=None, stats=None):
+    # Returns the container at the offset and any containers found inside of it
+    if cls is iMXImageContainer:
+        return _parse_imx_container(data, offset, verbose=verbose, image_filter=image_filter, stats=stats)
+    return [cls(data, offset, verbose=verbose, image_filter=image_filter)]
+
+
+# The types of containers to search for, in the order they are checked
+_search_types = (iMXImageContainer, iMXImageVectorTable, FITContainer)
+
+_container_types = dict((cls.__name__, cls) for cls in _search_types)
+
+# Short names that can be used to set the alignment of each type
+_type_names = {
+    'imx': iMXImageContainer,
+    'ivt': iMXImageVectorTable,
+    'fit': FITContainer,
+}
+
+
+def get_alignments(increment=None, alignments=None):
+    # Returns the alignment to use for each type of container. If an increment
+    # is specified it is used for all types, otherwise the default alignment of
+    # each type is used. Individual alignments can be set with the alignments
+    # param, a dictionary (or list of pairs) of type name to alignment.
+    if increment is not None:
+        result = dict((cls.__name__, increment) for cls in _search_types)
+    else:
+        result = dict((cls.__name__, cls.alignment) for cls in _search_types)
+
+    if alignments:
+        if isinstance(alignments, dict):
+            alignments = alignments.items()
+        for name, value in alignments:
+            cls = _type_names.get(name.lower(), _container_types.get(name))
+            assert cls is not None, f'Unknown container type: {name}'
+            assert value > 0
+            result[cls.__name__] = value
+
+    return result
+
+
+def parse_alignment(arg):
+    # argparse type for "type=alignment" arguments
+    name, sep, value = arg.partition('=')
+    if not sep or (name.lower() not in _type_names and name not in _container_types):
+        raise ValueError(f'invalid alignment: {arg}')
+    value = int(value, 0)
+    if value <= 0:
+        raise ValueError(f'invalid alignment: {arg}')
+    return (name, value)
+
+
+def _next_candidate(data, cls, alignment, offset, end):
+    # Returns the first offset at or after the specified offset that is aligned
+    # for this type of container and, if the type has a magic value, starts
+    # with that magic value. If there are no more candidates before end, end
+    # is returned.
+    offset += -offset % alignment
+    if cls.magic is None or offset >= end:
+        return offset
+
+    while offset < end:
+        found = data.find(cls.magic, offset, end + len(cls.magic) - 1)
+        if found < 0:
+            break
+        elif found % alignment == 0:
+            return found
+        offset = found + 1
+        offset += -offset % alignment
+    return end
+
+
+class ScanCheckpoint:
+    # Periodically saves the progress of a scan to a sidecar file so that an
+    # interrupted scan can be resumed. Only the current offset and the type and
+    # offset of each container found are saved, when the scan is resumed the
+    # containers are parsed again from the same offsets.
+    def __init__(self, filename, source, alignments, interval=60, start=0, end=None):
+        self.filename = filename
+        self.interval = interval
+        st = os.stat(source)
+        self._info = {
+            'source': source,
+            'size': st.st_size,
+            'mtime': st.st_mtime_ns,
+            'alignments': alignments,
+            'start': start,
+            'end': end,
+        }
+        self._last_save = time.monotonic()
+
+    def due(self):
+        return time.monotonic() - self._last_save >= self.interval
+
+    def save(self, offset, found):
+        state = dict(self._info)
+        state['offset'] = offset
+        state['containers'] = found
+
+        # Write to a temporary file first so an interrupted save doesn't
+        # corrupt the previous checkpoint
+        tmp_filename = f'{self.filename}.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_filename, self.filename)
+        self._last_save = time.monotonic()
+
+    def load(self):
+        # Returns the saved offset and list of (container type, offset) pairs,
+        # or None if there is no usable checkpoint
+        try:
+            with open(self.filename) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            print(f'Ignoring invalid checkpoint: {self.filename}')
+            return None
+
+        if any(state.get(k) != v for k, v in self._info.items()):
+            print(f'Ignoring checkpoint for a different scan: {self.filename}')
+            return None
+
+        return state['offset'], [tuple(c) for c in state['containers']]
+
+    def remove(self):
+        try:
+            os.remove(self.filename)
+        except FileNotFoundError:
+            pass
+
+
+def _find_container(data, increment=None, verbose=False, checkpoint=None, resume=False, start=0, end=None, alignments=None,
+        stats=None, cancel=None, on_container=None, image_filter=None):
+        # Only containers that start between the start and end offsets are
+        # searched for, but the entire data is available to parse containers
+        # that extend past the end offset. All offsets are relative to the
+        # start of the data.
+        #
+        # Streams are read as the search progresses, the end of the search is
+        # moved forward each time more of the stream is read.
+        #
+        # If a cancel Event is provided the search is halted (the same as
+        # Ctrl-C) when it is set. If on_container is provided it is called with
+        # each container as soon as it is found.
+        #
+        # The contents of images that don't match the image_filter (a
+        # filters.ImageFilter) aren't read.
+        stream = data if isinstance(data, StreamData) else None
+        stream_end = end
+        if stream is not None:
+            stream.advance(start)
+            end = stream.search_end if stream_end is None else min(stream_end, stream.search_end)
+        elif end is None or end > len(data):
+            end = len(data)
+
+        # If a stats Counter is provided the number of probable containers that
+        # were rejected is counted for each type and reason
+        if stats is None:
+            stats = collections.Counter()
+
+        # Each type of container is only searched for at offsets that match the
+        # alignment of that type. The candidate offsets of all types are walked
+        # in order in a single pass.
+        if not isinstance(alignments, dict) or len(alignments) != len(_search_types):
+            alignments = get_alignments(increment, alignments)
+        search = [(cls, alignments[cls.__name__]) for cls in _search_types]
+
+        # Views of the data that aren't fully stored in the file (such as
+        # sparse images) identify the parts of the data that can be skipped
+        next_data_offset = getattr(data, 'next_data_offset', None)
+
         container_list = []
-        offset = 0
+        offset = start
 
+        # The type and offset of each container found directly in the data,
+        # used to save checkpoints
+        found = []
+
+        if checkpoint is not None and resume:
+            state = checkpoint.load()
+            if state is not None:
+                offset, found = state
+                print(f'Resuming search @ {offset:#x} with {len(found)} containers')
+                for name, container_offset in found:
+                    cls = _container_types[name]
+                    containers = _parse_container(cls, data, container_offset, verbose=verbose,
+                            image_filter=image_filter, stats=stats)
+                    container_list.extend(containers)
+                    if on_container is not None:
+                        for c in containers:
+                            on_container(c)
+
+        # The next candidate offset for each type of container
+        candidates = [_next_candidate(data, cls, align, offset, end) for cls, align in search]
+
+        halted = False
         try:
-            while offset < len(data):
-                # TODO: I could probably make the list of containers to look for
-                # automatically populate, but my intention is not to go full binwalk
-                # with this tool.
-                if iMXImageContainer.is_container(data=data, offset=offset, verbose=verbose):
-                    try:
-                        c = iMXImageContainer(data, offset, verbose=verbose)
-                        offset = c.end
-                        container_list.append(c)
-
-                        # iMX container images may be FIT images, check now
-                        for img in c.images:
-                            if FITContainer.is_container(data=img['data'], offset=0, verbose=verbose):
-                                if verbose:
-                                    print(f'Extracting FIT from image @ {img["offset"]:#x}')
-                                fit = FITContainer(data=img['data'], offset=0, verbose=verbose)
-                                fit.fix_offset(img['range'].start)
-
-                                # If the fit image uses the entire container image, set
-                                # it's data to None
-                                if img['range'].stop == fit.end:
-                                    img['data'] = None
-
-                                # Add the fit image container to the list
-                                container_list.append(fit)
-                    except AssertionError:
-                        print(f'Unable to extract probable i.MX Container @ {offset:#x}')
-                        traceback.print_exc()
+            while True:
+                if cancel is not None and cancel.is_set():
+                    halted = True
+                    break
+
+                # Find the next offset that is not part of a container or image
+                # that has already been found and is a candidate for at least
+                # one type of container.
+                #
+                # The _find_next_unknown_addr() function does the annoying work
+                # to determine what is the next address that has not been
+                # identified as part of a container or image.
+                while True:
+                    for i, (cls, align) in enumerate(search):
+                        if candidates[i] < offset:
+                            candidates[i] = _next_candidate(data, cls, align, offset, end)
+                    offset = min(candidates)
+                    if offset >= end:
+                        break
+                    if next_data_offset is not None:
+                        next_offset = next_data_offset(offset)
+                        if next_offset != offset:
+                            offset = next_offset
+                            continue
+                    next_offset = _find_next_unknown_addr(container_list, offset, verbose=verbose)
+                    if next_offset == offset:
+                        break
+                    offset = next_offset
+
+                if offset >= end and stream is not None and end != stream_end and \
+                        not (stream.eof and end >= len(stream)):
+                    # Read more of the stream, discard the data that is no
+                    # longer needed, and find the candidates in the new data
+                    stream.advance(offset)
+                    end = stream.search_end if stream_end is None else min(stream_end, stream.search_end)
+                    candidates = [_next_candidate(data, cls, align, offset, end) for cls, align in search]
+                    continue
+
+                if offset >= end:
+                    break
 
-                elif iMXImageVectorTable.is_container(data, offset):
+                if checkpoint is not None and checkpoint.due():
+                    checkpoint.save(offset, found)
+
+                # Only check for the types of containers that are aligned to
+                # this offset
+                for i, (cls, align) in enumerate(search):
+                    if candidates[i] != offset or not cls.is_container(data=data, offset=offset, verbose=verbose):
+                        continue
+
+                    # Check the rest of the container structure before
+                    # creating the container, junk data that looks like a
+                    # container header is usually rejected here.
                     try:
-                        c = iMXImageVectorTable(data, offset, verbose=verbose)
-                        offset = c.end
-                        container_list.append(c)
+                        reason = cls.validate(data, offset)
                     except AssertionError:
-                        print(f'Unable to extract probable i.MX IVT @ {offset:#x}')
-                        traceback.print_exc()
-                        offset = _find_next_unknown_addr(container_list, offset + increment, verbose=verbose)
+                        # Streams raise an exception if the container refers
+                        # to data that has already been discarded
+                        reason = 'data not available'
+                    if reason is not None:
+                        stats[(cls.__name__, reason)] += 1
+                        if verbose:
+                            print(f'REJECT @ {offset:#x}: {cls.__name__}: {reason}')
+                        continue
 
-                elif FITContainer.is_container(data, offset):
                     try:
-                        c = FITContainer(data, offset, verbose=verbose)
-                        offset = c.end
-                        container_list.append(c)
+                        containers = _parse_container(cls, data, offset, verbose=verbose,
+                                image_filter=image_filter, stats=stats)
                     except AssertionError:
-                        print(f'Unable to extract probable FIT image @ {offset:#x}')
-                        traceback.print_exc()
-                        offset = _find_next_unknown_addr(container_list, offset + increment, verbose=verbose)
+                        stats[(cls.__name__, 'parse error')] += 1
+                        if verbose:
+                            print(f'Unable to extract probable {cls.__name__} @ {offset:#x}')
+                            traceback.print_exc()
+                        continue
+
+                    found.append((cls.__name__, offset))
+                    container_list.extend(containers)
+                    if on_container is not None:
+                        for c in containers:
+                            on_container(c)
+                    offset = containers[0].end
+                    break
 
                 else:
-                    # Incrementing by 1 will take longer, but be more thorough, the
-                    # is_container() function will ensure that container headers
-                    # values are sane.
-                    #
-                    # The _find_next_unknown_addr() function does the annoying work
-                    # to determine what is the next address that has not been
-                    # identified as part of a container or image.
-                    offset = _find_next_unknown_addr(container_list, offset + increment, verbose=verbose)
-
-                    # Round up to ensure that the offset is aligned
-                    if increment > 1:
-                        unaligned = offset % increment
-                        if unaligned:
-                            offset = offset + (increment - unaligned)
+                    # Nothing was found at this offset, continue with the next
+                    # candidate
+                    offset += 1
 
         except KeyboardInterrupt:
+            halted = True
+
+        if halted:
             print(f'\nHalting search @ {offset:#x}')
+            if checkpoint is not None:
+                checkpoint.save(offset, found)
+                print(f'Saved checkpoint: {checkpoint.filename}')
+            return container_list
+
+        # The scan completed so the checkpoint is no longer needed
+        if checkpoint is not None:
+            checkpoint.remove()
 
         return container_list
 
 
+# Files that can't be memory mapped are read in blocks of this size, a limited
+# number of blocks are cached. When blocks are read sequentially the following
+# blocks are read at the same time.
+DEFAULT_BLOCK_SIZE = 0x10000
+DEFAULT_CACHE_BLOCKS = 256
+DEFAULT_READ_AHEAD = 16
+
+
+class MappedFile(mmap.mmap):
+    # Memory map of a scanned file, the contents of images found in the file
+    # are references to the file instead of copies. The filename attribute is
+    # set after the file is mapped.
+    def image_data(self, start, end):
+        return SourceData(self.filename, start, end - start)
+
+
 class OpenedFile:
-    def __init__(self, filename, increment):
-        # normal python file IO is buffered so in theory this shouldn't too 
-        # horrible to do, but make sure the buffer is bigger than normal. Make 
-        # it around 1000 times the incremental search size
-        self._file = open(filename, 'rb', buffering=increment*1000)
+    # Random access reader for files that can't be memory mapped, such as block
+    # devices or files that are too large to map. This can be used in place of
+    # the file contents when searching for and parsing containers, the amount
+    # of memory used doesn't depend on the size of the file.
+    def __init__(self, filename, block_size=DEFAULT_BLOCK_SIZE, cache_blocks=DEFAULT_CACHE_BLOCKS,
+            read_ahead=DEFAULT_READ_AHEAD):
+        assert block_size > 0 and cache_blocks > 0
+        self._block_size = block_size
+        self._cache_blocks = cache_blocks
+        self._read_ahead = max(1, min(read_ahead, cache_blocks))
+
+        # Most recently used blocks are at the end of the cache
+        self._blocks = collections.OrderedDict()
+        self._last_read = None
 
-        self._file.seek(0, os.SEEK_END)
-        self._size = self._file.tell()
-        self._file.seek(0, os.SEEK_SET)
+        self.filename = filename
+        self._fd = os.open(filename, os.O_RDONLY)
+
+        # The size of block devices is not reported by stat()
+        self._size = os.lseek(self._fd, 0, os.SEEK_END)
 
     def __del__(self):
-        self._file.close()
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if getattr(self, '_fd', None) is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._blocks.clear()
 
     @property
     def size(self):
@@ -136,28 +463,412 @@ class OpenedFile:
     def __len__(self):
         return self._size
 
+    def _get_block(self, index):
+        block = self._blocks.get(index)
+        if block is not None:
+            self._blocks.move_to_end(index)
+            return block
+
+        # If the previous block that was read from the file is just before this
+        # one the file is probably being read sequentially, read ahead
+        count = self._read_ahead if self._last_read == index - 1 else 1
+        data = os.pread(self._fd, self._block_size * count, index * self._block_size)
+        self._last_read = index + count - 1
+
+        for i in range(count):
+            start = i * self._block_size
+            if start >= len(data):
+                break
+            self._blocks[index + i] = data[start:start + self._block_size]
+            self._blocks.move_to_end(index + i)
+        while len(self._blocks) > self._cache_blocks:
+            self._blocks.popitem(last=False)
+
+        return self._blocks.get(index, b'')
+
+    def _read(self, offset, length):
+        end = min(offset + length, self._size)
+        if offset >= end:
+            return b''
+
+        index, start = divmod(offset, self._block_size)
+        if start + (end - offset) <= self._block_size:
+            # The most common case, all of the data is in one block
+            return self._get_block(index)[start:start + (end - offset)]
+
+        chunks = []
+        while offset < end:
+            index, start = divmod(offset, self._block_size)
+            chunk = self._get_block(index)[start:start + (end - offset)]
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+        return b''.join(chunks)
+
     def __getitem__(self, key):
-        self._file.seek(key, os.SEEK_SET)
-        return self._file.read1()
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._size)
+            if step == 1:
+                return self._read(start, stop - start)
+
+            # Read all of the data between the first and last index
+            indexes = range(start, stop, step)
+            if not indexes:
+                return b''
+            low = min(indexes[0], indexes[-1])
+            data = self._read(low, abs(indexes[-1] - indexes[0]) + 1)
+            return data[indexes[0] - low::step][:len(indexes)]
+
+        if key < 0:
+            key += self._size
+        if not 0 <= key < self._size:
+            raise IndexError('index out of range')
+        index, start = divmod(key, self._block_size)
+        return self._get_block(index)[start]
+
+    def image_data(self, start, end):
+        # The contents of images are read from the file when they are used
+        return SourceData(self.filename, start, end - start)
+
+    def unpack_from(self, fmt, offset=0):
+        # Used by types.unpack_from() because this class doesn't support the
+        # buffer protocol
+        index, start = divmod(offset, self._block_size)
+        if offset >= 0 and start + fmt.size <= self._block_size:
+            return fmt.unpack_from(self._get_block(index), start)
+        return fmt.unpack(self._read(offset, fmt.size))
+
+    def find(self, sub, start=0, end=None):
+        # Same as bytes.find(), one block is searched at a time
+        if end is None or end > self._size:
+            end = self._size
+        offset = max(start, 0)
+        while offset + len(sub) <= end:
+            # Include enough of the next block to find a match that starts at
+            # the end of this block
+            block_end = min((offset // self._block_size + 1) * self._block_size, end)
+            chunk = self._read(offset, min(block_end + len(sub) - 1, end) - offset)
+            found = chunk.find(sub)
+            if found >= 0:
+                return offset + found
+            offset = block_end
+        return -1
+
+
+# Streams are searched through a sliding window. Enough data is read ahead of
+# the search offset to hold the largest container that can be found in a
+# stream, including the images of i.MX containers and IVTs and the entire
+# contents of FIT images (the FDT totalsize), and must be larger than the
+# largest container header (MAX_CONTAINER_SIZE). Some data is also kept behind
+# the search offset because IVT application images start before the IVT.
+DEFAULT_STREAM_WINDOW = 0x1000000
+DEFAULT_STREAM_HISTORY = 0x10000
+DEFAULT_STREAM_CHUNK_SIZE = 0x100000
+
+
+class StreamData:
+    # Sliding window over a stream that can't be seeked, such as stdin or a
+    # pipe. This can be used in place of the file contents when searching for
+    # and parsing containers, only the data in the window is kept in memory.
+    # Offsets are relative to the start of the stream, the length is the
+    # amount of data that has been read so far.
+    def __init__(self, stream, window=DEFAULT_STREAM_WINDOW, history=DEFAULT_STREAM_HISTORY,
+            chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+        assert window >= MAX_CONTAINER_SIZE
+        self._stream = stream
+        self._window = window
+        self._history = history
+        self._chunk_size = chunk_size
+
+        # The offset in the stream of the first byte in the buffer
+        self._base = 0
+        self._buf = bytearray()
+        self.eof = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._buf = bytearray()
+
+    def __len__(self):
+        return self._base + len(self._buf)
+
+    @property
+    def search_end(self):
+        # Containers can only be searched for if the window has been read
+        # after the offset, or the end of the stream has been reached
+        if self.eof:
+            return len(self)
+        return max(len(self) - self._window, self._base)
+
+    def advance(self, offset):
+        # Read the stream until containers can be searched for at the offset,
+        # and discard the data that is no longer needed
+        while not self.eof and self.search_end <= offset:
+            chunk = self._stream.read(self._chunk_size)
+            if not chunk:
+                self.eof = True
+            else:
+                self._buf += chunk
+
+        # Only discard data once a full chunk can be removed to limit how
+        # often the buffer is moved
+        discard = offset - self._history - self._base
+        if discard >= self._chunk_size:
+            del self._buf[:discard]
+            self._base += discard
+
+    def _index(self, offset):
+        # Data that has been discarded is not available anymore, this is
+        # handled the same way as an invalid container
+        assert offset >= self._base, f'stream data @ {offset:#x} has been discarded'
+        return offset - self._base
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if start >= stop and step > 0:
+                return b''
+            return bytes(self._buf[self._index(start):max(stop - self._base, 0):step])
+
+        if key < 0:
+            key += len(self)
+        return self._buf[self._index(key)]
+
+    def unpack_from(self, fmt, offset=0):
+        # Used by types.unpack_from() because the buffer can't be exported
+        # while it is being resized
+        return fmt.unpack_from(self._buf, self._index(offset))
+
+    def find(self, sub, start=0, end=None):
+        if end is None:
+            end = len(self)
+        found = self._buf.find(sub, self._index(max(start, self._base)), max(end - self._base, 0))
+        return found + self._base if found >= 0 else -1
+
+
+def checkpoint_filename(filename):
+    # Checkpoints are saved in the current directory, named after the file
+    # being scanned
+    return f'{utils._path_to_filename(filename)}.checkpoint'
+
+
+def _warn_stream_options(name, checkpoint, resume, nand):
+    # Streams can't be seeked or reread, so scans of streams can't be
+    # checkpointed or resumed and NAND dumps can't be split into pages
+    ignored = [o for o, v in (('checkpoint', checkpoint), ('resume', resume), ('nand', nand)) if v]
+    if ignored:
+        print(f'WARNING: ignoring {", ".join(ignored)} when scanning stream {name}')
 
-    def seek(self, offset, whence=os.SEEK_SET):
-        self._file.seek(offset, whence)
 
-    def read(self, size):
-        return self._file.read(size)
+def scan_file(filename, increment=None, verbose=False, checkpoint=False, resume=False, checkpoint_interval=60,
+        start=0, end=None, alignments=None, stats=None, use_mmap=True, stream_window=DEFAULT_STREAM_WINDOW,
+        expand_sparse=True, nand=None, cancel=None, on_container=None, image_filter=None, **kwargs):
+    # If checkpoint is set the progress of the scan is saved periodically, if
+    # resume is set the scan continues from the last saved checkpoint (if there
+    # is one).
+    #
+    # The start and end params limit the search to a window of the file, the
+    # offsets of any containers found are still relative to the start of the
+    # file.
+    #
+    # By default each type of container is searched for at its own alignment,
+    # if increment is set it is used as the alignment for all types.
+    #
+    # If a stats Counter is provided the number of probable containers that
+    # were rejected is counted for each (container type, reason).
+    #
+    # If use_mmap is not set the file is read in blocks instead of being memory
+    # mapped, this limits the amount of memory used when scanning very large
+    # files.
+    #
+    # The filename may also be "-" to scan stdin, or a file-like object. These
+    # streams (and files that can't be seeked such as pipes) are read once
+    # through a sliding window, stream_window is the largest amount of data
+    # that a container and its images can use. Only the contents of the images
+    # that are found are kept in memory.
+    #
+    # Android sparse images are scanned as if they had been expanded unless
+    # expand_sparse is not set, only the RAW chunks are searched for containers
+    # and offsets are relative to the start of the expanded image.
+    #
+    # If nand is set to the (page size, OOB size) of a raw NAND dump the OOB
+    # bytes are skipped and offsets are relative to the start of the page data.
+    #
+    # Containers found in sparse images and NAND dumps also have a file_offset
+    # attribute, the offset of the container in the scanned file.
+    #
+    # Files inside of zip and tar archives (such as "bundle.zip!/flash.bin")
+    # are read from the archive as streams without being unpacked to disk.
+    #
+    # If a cancel Event (such as a threading.Event) is provided the scan stops
+    # when it is set and the containers found so far are returned. If
+    # on_container is provided it is called with each container as soon as it
+    # is found, from the thread running the scan.
+    #
+    # The contents of images found in regular files and block devices are
+    # references to the range of the file (SourceData) and are read when they
+    # are used, the contents of images found in other data are copied. If an
+    # image_filter (a filters.ImageFilter or a list of filter expressions) is
+    # provided the contents of images that don't match it aren't read at all.
+
+    # archives imports tarfile and zipfile, it is only imported once a file is
+    # scanned
+    from . import archives
+
+    if start is None:
+        start = 0
+    alignments = get_alignments(increment, alignments)
+    if image_filter is not None and not isinstance(image_filter, filters.ImageFilter):
+        image_filter = filters.ImageFilter(image_filter)
 
-    def tell(self):
-        return self._file.tell()
+    if filename == '-' or hasattr(filename, 'read'):
+        stream = sys.stdin.buffer if filename == '-' else filename
+        _warn_stream_options(getattr(stream, 'name', '<stream>'), checkpoint, resume, nand)
+        return _scan_stream(stream, verbose=verbose, start=start, end=end,
+                alignments=alignments, stats=stats, stream_window=stream_window,
+                cancel=cancel, on_container=on_container, image_filter=image_filter)
 
+    if archives.split_path(filename) is not None:
+        _warn_stream_options(filename, checkpoint, resume, nand)
+        with archives.open_member(filename) as f:
+            return _scan_stream(f, verbose=verbose, start=start, end=end,
+                    alignments=alignments, stats=stats, stream_window=stream_window,
+                    cancel=cancel, on_container=on_container, image_filter=image_filter)
 
-def scan_file(filename, increment=4, verbose=False, **kwargs):
-    # TODO: find a better way to do this, like chunking the file into memory or 
-    # something.
+    # Pipes and other files that aren't regular files or block devices are also
+    # read as streams
+    mode = os.stat(filename).st_mode
+    if not stat.S_ISREG(mode) and not stat.S_ISBLK(mode):
+        _warn_stream_options(filename, checkpoint, resume, nand)
+        with open(filename, 'rb') as f:
+            return _scan_stream(f, verbose=verbose, start=start, end=end,
+                    alignments=alignments, stats=stats, stream_window=stream_window,
+                    cancel=cancel, on_container=on_container, image_filter=image_filter)
+
+    scan_checkpoint = None
+    if checkpoint or resume:
+        scan_checkpoint = ScanCheckpoint(checkpoint_filename(filename), filename,
+                alignments, interval=checkpoint_interval, start=start, end=end)
+
+    # The file is memory mapped instead of being read so only the parts of the
+    # file that are searched or parsed are read. Block devices and files that
+    # are too large to map are read through an OpenedFile instead.
     with open(filename, 'rb') as f:
-        data = f.read()
-    return _find_container(data, increment, verbose)
+        size = os.lseek(f.fileno(), 0, os.SEEK_END)
+        if size == 0:
+            return []
+
+        data = None
+        if nand is not None:
+            data = views.NandFile(filename, *nand)
+        elif expand_sparse and views.is_sparse(filename):
+            try:
+                data = views.SparseFile(filename)
+                if verbose:
+                    print(f'Expanding Android sparse image {filename} ({len(data):#x} bytes)')
+            except AssertionError as e:
+                print(f'Unable to expand sparse image {filename}, scanning it as is: {e}')
+        if data is None and use_mmap and stat.S_ISREG(os.fstat(f.fileno()).st_mode):
+            try:
+                data = MappedFile(f.fileno(), 0, access=mmap.ACCESS_READ)
+                data.filename = filename
+            except (OSError, OverflowError, ValueError):
+                if verbose:
+                    print(f'Unable to map {filename}, reading it instead')
+        if data is None:
+            data = OpenedFile(filename)
+        elif isinstance(data, mmap.mmap) and hasattr(data, 'madvise'):
+            data.madvise(mmap.MADV_SEQUENTIAL)
+
+        # The offsets of views aren't offsets in the file so their image
+        # contents are copied, the containers record the file offsets instead
+        def found(c):
+            if isinstance(data, views.DataView):
+                c.set_file_offsets(data)
+            if on_container is not None:
+                on_container(c)
+
+        with data:
+            return _find_container(data, verbose=verbose, alignments=alignments,
+                    checkpoint=scan_checkpoint, resume=resume, start=start, end=end, stats=stats,
+                    cancel=cancel, on_container=found, image_filter=image_filter)
+
+
+def _scan_stream(stream, verbose=False, start=0, end=None, alignments=None, stats=None,
+        stream_window=DEFAULT_STREAM_WINDOW, cancel=None, on_container=None, image_filter=None):
+    # Streams can't be checkpointed because the scan can't be resumed part way
+    # through, and the image contents are kept because the stream can't be
+    # read again
+    with StreamData(stream, window=stream_window) as data:
+        return _find_container(data, verbose=verbose, alignments=alignments, start=start, end=end,
+                stats=stats, cancel=cancel, on_container=on_container, image_filter=image_filter)
+
+
+# Files inside of archives that are at least this large are scanned by a
+# ScanPool worker process
+PARALLEL_MIN_SIZE = 0x1000000
+
+
+def _scan_worker(filename, kwargs):
+    # Runs in a worker process, an archive kept open by the parent process
+    # must not be shared with the parent.
+    from . import archives
+    archives.forget()
+    stats = collections.Counter()
+    containers = scan_file(filename, stats=stats, **kwargs)
+    return (containers, stats)
+
+
+class ScanPool:
+    # Scans large files with a pool of processes while the caller continues
+    # with the next file. Only files inside of archives are scanned by the
+    # pool, other files are memory mapped and are scanned faster by the
+    # caller. The worker processes are only started once a file is submitted.
+    def __init__(self, workers=None, min_size=PARALLEL_MIN_SIZE):
+        self.min_size = min_size
+        self._workers = workers
+        self._executor = None
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(cancel=exc_type is not None)
+
+    def should_submit(self, filename):
+        from . import archives
+        size = archives.member_size(filename)
+        return size is not None and size >= self.min_size
+
+    def submit(self, filename, **kwargs):
+        # kwargs are the scan_file() params, the stats are returned by results()
+        if self._executor is None:
+            import concurrent.futures
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self._workers)
+
+        kwargs.pop('stats', None)
+        self._pending.append((filename, self._executor.submit(_scan_worker, filename, kwargs)))
+
+    def results(self):
+        # Yields the (filename, containers, stats) of each file in the order
+        # they were submitted
+        while self._pending:
+            filename, future = self._pending.pop(0)
+            containers, stats = future.result()
+            yield (filename, containers, stats)
+
+    def close(self, cancel=False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=cancel)
+            self._executor = None
+        self._pending = []
 
 
 __all__ = [
     'scan_file',
+    'ScanPool',
 ]
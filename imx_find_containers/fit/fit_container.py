@@ -1,23 +1,73 @@
 import io
 import struct
 
-from pyfdt.pyfdt import FdtBlobParse
-
-from ..types import Container
+from ..types import Container, Image, unpack_from
 from .fit_types import *
 
 
 class FITContainer(Container):
+    # FIT images are often only 4 byte aligned inside of other images
+    alignment = 4
+    magic = struct.pack('>I', 0xD00DFEED)
+
     @classmethod
     def is_container(cls, data, offset, verbose=False):
         # First 4 bytes will be the FDT_MAGIC of 0xD00DFEED
         # second 4 bytes is the size
         if data is not None and len(data) >= offset + 8:
-            magic, size = struct.unpack_from('>II', data[offset:])
-            return magic == 0xD00DFEED and len(data) >= size
+            magic, size = unpack_from(_magic_size, data, offset)
+            return magic == FDT_MAGIC and FDT_MIN_SIZE <= size <= len(data) - offset
         else:
             return False
 
+    @classmethod
+    def validate(cls, data, offset):
+        # Sanity check the entire header before handing the blob to pyfdt
+        if len(data) < offset + FDT_V17_HEADER_SIZE:
+            return 'header truncated'
+        _, totalsize, off_dt_struct, off_dt_strings, off_mem_rsvmap, version, last_comp_version = \
+                unpack_from(FDTHeader._struct, data, offset)
+        _, size_dt_strings, size_dt_struct = unpack_from(FDTHeaderV17._struct, data, offset + FDTHeader.size)
+
+        # The entire FDT is read into memory to be parsed, don't read past the
+        # end of the data when scanning a device
+        if offset + totalsize > len(data):
+            return 'FDT truncated'
+
+        if not FDT_MIN_VERSION <= version <= FDT_MAX_VERSION:
+            return 'version'
+        elif not FDT_MIN_VERSION <= last_comp_version <= min(version, FDT_MAX_LAST_COMP_VERSION):
+            return 'last compatible version'
+
+        hdr_size = FDT_V17_HEADER_SIZE if version >= 17 else FDT_V16_HEADER_SIZE
+
+        # The memory reservation map must hold at least the terminating entry
+        if off_mem_rsvmap % 8 or off_mem_rsvmap < hdr_size or off_mem_rsvmap + 16 > totalsize:
+            return 'memory reservation map offset'
+        elif off_dt_struct % 4 or off_dt_struct < hdr_size or off_dt_struct + 8 > totalsize:
+            return 'structure block offset'
+        elif off_dt_strings < hdr_size or off_dt_strings + size_dt_strings > totalsize:
+            return 'strings block offset'
+        elif version >= 17 and off_dt_struct + size_dt_struct > totalsize:
+            return 'structure block size'
+
+        # The structure block must start with the root node, possibly after
+        # some NOP tokens
+        token_offset = offset + off_dt_struct
+        end = offset + totalsize
+        while token_offset + 4 <= end:
+            token, = unpack_from(_token, data, token_offset)
+            if token != FDT_NOP:
+                break
+            token_offset += 4
+        else:
+            return 'structure block truncated'
+
+        if token != FDT_BEGIN_NODE:
+            return 'first token'
+
+        return None
+
     def init_from_data(self, data, offset):
         # It isn't strictly necessary to parse the header here since the pyfdt
         # module will parse the entire FDT for us, but this will allow the scan
@@ -27,15 +77,27 @@ class FITContainer(Container):
         self.end = offset + self.hdr.totalsize
         imgrange = range(offset, self.end)
 
+        # pyfdt is only imported when an FDT is found
+        from pyfdt.pyfdt import FdtBlobParse
+
         dtb = data[offset:self.end]
-        parsed_dtb = FdtBlobParse(io.BytesIO(dtb))
-        dts = parsed_dtb.to_fdt().to_dts()
+        try:
+            parsed_dtb = FdtBlobParse(io.BytesIO(dtb))
+            fdt = parsed_dtb.to_fdt()
+            dts = fdt.to_dts()
+
+            # FIT images have an /images node, otherwise this is a plain device
+            # tree blob
+            self.fit = fdt.resolve_path('/images') is not None
+        except Exception as e:
+            # pyfdt only raises generic exceptions
+            raise AssertionError(f'Unable to parse FDT @ {offset:#x}: {e}') from e
 
         # Add the DTB and DTS contents as images with custom extensions to get
-        # exports of the files.
+        # exports of the files. The DTB contents are set by load_images().
         self.images = [
-            {'offset': offset, 'range': imgrange, 'fileext': f'dtb', 'data': dtb},
-            {'offset': offset, 'range': imgrange, 'fileext': f'dts', 'data': dts},
+            Image(offset=offset, range=imgrange, fileext='dtb', data=None),
+            Image(offset=offset, range=imgrange, fileext='dts', data=dts),
         ]
 
         # Now do standard image/addr mapping
@@ -49,11 +111,20 @@ class FITContainer(Container):
         self.end = offset + self.hdr.totalsize
 
         # First image is the DTB
+        self.images[0]['offset'] = offset
         self.images[0]['range'] = range(offset, self.end)
 
         # Second image is the DTS
+        self.images[1]['offset'] = offset
         self.images[1]['range'] = range(offset, self.end)
 
+        # The image address map needs to be updated to match
+        self.map_images_by_addr()
+
+
+_magic_size = struct.Struct('>II')
+_token = struct.Struct('>I')
+
 
 __all__ = [
     'FITContainer',
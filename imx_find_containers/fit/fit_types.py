@@ -1,6 +1,29 @@
 from ..types import StructTupleMeta
 
 
+FDT_MAGIC = 0xD00DFEED
+
+# The FDT versions that can be parsed by pyfdt
+FDT_MIN_VERSION = 16
+FDT_MAX_VERSION = 17
+FDT_MAX_LAST_COMP_VERSION = 16
+
+# Structure block tokens
+FDT_BEGIN_NODE = 0x1
+FDT_NOP = 0x4
+
+# The full header size depends on the version, boot_cpuid_phys was added in
+# version 2 and size_dt_strings in version 3 so the version 16 header ends after
+# them, version 17 adds size_dt_struct
+FDT_V16_HEADER_SIZE = 36
+FDT_V17_HEADER_SIZE = 40
+
+# The smallest possible FDT: the header, an empty memory reservation map (one
+# 16 byte terminating entry), and a structure block with an empty root node
+# (FDT_BEGIN_NODE, empty name, FDT_END_NODE, FDT_END)
+FDT_MIN_SIZE = FDT_V16_HEADER_SIZE + 16 + 16
+
+
 # FDT fields are big-endian
 class FDTHeader(metaclass=StructTupleMeta):
     fmt = '>IIIIIII'
@@ -9,6 +32,24 @@ class FDTHeader(metaclass=StructTupleMeta):
     ]
 
 
+# Version 16 and 17 header fields that follow the FDTHeader fields
+class FDTHeaderV17(metaclass=StructTupleMeta):
+    fmt = '>III'
+    fields = [
+        'boot_cpuid_phys', 'size_dt_strings', 'size_dt_struct',
+    ]
+
+
 __all__ = [
+    'FDT_MAGIC',
+    'FDT_MIN_VERSION',
+    'FDT_MAX_VERSION',
+    'FDT_MAX_LAST_COMP_VERSION',
+    'FDT_BEGIN_NODE',
+    'FDT_NOP',
+    'FDT_V16_HEADER_SIZE',
+    'FDT_V17_HEADER_SIZE',
+    'FDT_MIN_SIZE',
     'FDTHeader',
+    'FDTHeaderV17',
 ]
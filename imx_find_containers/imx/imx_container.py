@@ -1,9 +1,33 @@
-from ..types import Container
+import mmap
+
+from ..types import Container, Image, unpack_from
 from .. import utils
 from .types import *
 
 
+class ContainerImage(Image):
+    # The flags and metadata values of i.MX container images are decoded from
+    # the image header when they are accessed
+    __slots__ = ()
+
+    _decoded = {
+        # Flags
+        'type': lambda hdr: utils.enum_or_int(ImageType, hdr.flags & 0x0000000F),
+        'core_id': lambda hdr: utils.enum_or_int(CoreType, (hdr.flags & 0x000000F0) >> 4),
+        'hash_type': lambda hdr: utils.enum_or_int(HashType, (hdr.flags & 0x00000700) >> 8),
+        'encrypted': lambda hdr: bool(hdr.flags & 0x00000800),
+        'boot_flags': lambda hdr: (hdr.flags & 0xFFFF0000) >> 16,
+
+        # Image Metadata
+        'cpu_id': lambda hdr: utils.enum_or_int(CPUID, hdr.metadata & 0x000003FF),
+        'mu_id': lambda hdr: utils.enum_or_int(MUID, (hdr.metadata & 0x000FFC00) >> 10),
+        'partition_id': lambda hdr: utils.enum_or_int(PartitionID, (hdr.metadata & 0x0FF00000) >> 20),
+    }
+
+
 class iMXImageContainer(Container):
+    alignment = 0x400
+
     @classmethod
     def is_container(cls, data, offset, verbose=False):
         if len(data) > offset + ContainerHeader.size:
@@ -13,7 +37,7 @@ class iMXImageContainer(Container):
                 # Only do a struct.unpack() instead of creating a full
                 # StructTuple to save time. We don't need all of the header
                 # elements for this check.
-                _, length, _, _, _, _, num_images, sig_offset = ContainerHeader._struct.unpack_from(data, offset)
+                _, length, _, _, _, _, num_images, sig_offset = unpack_from(ContainerHeader._struct, data, offset)
 
                 # This probably is a container, but first do a sanity check and
                 # make sure the length, number of images, or signature block
@@ -30,8 +54,29 @@ class iMXImageContainer(Container):
 
         return False
 
+    @classmethod
+    def validate(cls, data, offset):
+        _, length, tag, _, _, _, num_images, sig_offset = unpack_from(ContainerHeader._struct, data, offset)
+
+        # Only containers should have images
+        if tag == HeaderTag.MESSAGE and num_images:
+            return 'message with images'
+
+        # Images that extend past the end of the data (such as in a truncated
+        # dump) don't make the container invalid, see _parse_image()
+        start = offset + ContainerHeader.size
+        if start + (num_images * ImageHeader.size) > len(data):
+            return 'image headers truncated'
+
+        if sig_offset:
+            return _validate_sig_block(data, offset + sig_offset)
+
+        return None
+
     def init_from_data(self, data, offset):
-        assert isinstance(data, bytes)
+        # The data is either the file contents, a memory map of the file or a
+        # find.OpenedFile for files that can't be mapped
+        assert isinstance(data, (bytes, mmap.mmap)) or hasattr(data, 'unpack_from')
         self._parse_header(data, offset)
 
         self.sigblock = None
@@ -78,26 +123,9 @@ class iMXImageContainer(Container):
         if self._verbose:
             print(hdr)
 
-        img = {
-            'hdr': hdr,
-
-            # The offset of the image data itself
-            'offset': None,
-            'range': None,
-
-            # Flags
-            'type': utils.enum_or_int(ImageType, hdr.flags & 0x0000000F),
-            'core_id': utils.enum_or_int(CoreType, (hdr.flags & 0x000000F0) >> 4),
-            'hash_type': utils.enum_or_int(HashType, (hdr.flags & 0x00000700) >> 8),
-            'encrypted': bool(hdr.flags & 0x00000800),
-            'boot_flags': (hdr.flags & 0xFFFF0000) >> 16,
-
-            # Image Metadata
-            'cpu_id': utils.enum_or_int(CPUID, hdr.metadata & 0x000003FF),
-            'mu_id': utils.enum_or_int(MUID, (hdr.metadata & 0x000FFC00) >> 10),
-            'partition_id': utils.enum_or_int(PartitionID, (hdr.metadata & 0x0FF00000) >> 20),
-            'data': None,
-        }
+        # The offset of the image data itself is set below, the flags and
+        # metadata are decoded from the header when they are accessed
+        img = ContainerImage(hdr=hdr, offset=None, range=None, data=None)
 
         if hdr.offset:
             img['offset'] = self.offset + hdr.offset
@@ -111,8 +139,8 @@ class iMXImageContainer(Container):
                 if len(data) < end:
                     print(f'WARNING: (@ {offset:#x}) Image length invalid: {len(data):#x} ! >= {end:#x}')
                 else:
+                    # The contents are set by load_images()
                     img['range'] = range(img['offset'], end)
-                    img['data'] = data[img['offset']:end]
 
             elif img['type'] == ImageType.DCD_DDR:
                 # The DDR initialization image is embedded in the SCFW image,
@@ -294,6 +322,125 @@ class iMXImageContainer(Container):
         return dek
 
 
+# Structure validation functions used by iMXImageContainer.validate(), these
+# mirror the checks made while parsing the container but return a reason
+# instead of raising an exception
+
+def _fits(data, offset, size):
+    return offset >= 0 and offset + size <= len(data)
+
+
+def _validate_sig_block(data, offset):
+    if not _fits(data, offset, SignatureBlock.size):
+        return 'signature block truncated'
+    version, _, tag, cert_offset, srk_table_offset, sig_offset, dek_offset = \
+            unpack_from(SignatureBlock._struct, data, offset)
+
+    if version != ContainerVersions.VERSION_0:
+        return 'signature block version'
+    elif tag != HeaderTag.SIGNATURE_BLOCK:
+        return 'signature block tag'
+
+    reason = _validate_srk_table(data, offset + srk_table_offset)
+    if reason is None:
+        reason = _validate_sig(data, offset + sig_offset)
+    if reason is None and cert_offset != 0:
+        reason = _validate_cert(data, offset + cert_offset)
+    if reason is None and dek_offset != 0:
+        reason = _validate_dek(data, offset + dek_offset)
+    return reason
+
+
+def _validate_srk_table(data, offset):
+    if not _fits(data, offset, SRKTable.size):
+        return 'SRK table truncated'
+    tag, length, version = unpack_from(SRKTable._struct, data, offset)
+
+    if version != ContainerVersions.SRK_TABLE_VERSION:
+        return 'SRK table version'
+    elif tag != HeaderTag.SRK_TABLE:
+        return 'SRK table tag'
+
+    # There are always 4 keys
+    srk_offset = offset + SRKTable.size
+    for i in range(4):
+        reason, srk_length = _validate_srk(data, srk_offset)
+        if reason is not None:
+            return reason
+        srk_offset += srk_length
+
+    if srk_offset != offset + length:
+        return 'SRK table length'
+    return None
+
+
+def _validate_srk(data, offset):
+    # Returns the reason and the length of the SRK record
+    if not _fits(data, offset, SRKRecordHeader.size):
+        return 'SRK record truncated', 0
+    tag, length, alg, hash_type, key_size, _, mod_len, exp_len = \
+            unpack_from(SRKRecordHeader._struct, data, offset)
+
+    if tag != HeaderTag.SRK:
+        return 'SRK record tag', 0
+    elif not utils.is_enum_value(AlgType, alg):
+        return 'SRK record algorithm', 0
+    elif not utils.is_enum_value(HashType, hash_type):
+        return 'SRK record hash type', 0
+    elif alg == AlgType.RSA and not utils.is_enum_value(RSAKeySize, key_size):
+        return 'SRK record key size', 0
+    elif alg != AlgType.RSA and not utils.is_enum_value(ECDSACurve, key_size):
+        return 'SRK record curve', 0
+    elif length != SRKRecordHeader.size + mod_len + exp_len:
+        return 'SRK record length', 0
+    elif not _fits(data, offset, length):
+        return 'SRK record truncated', 0
+    return None, length
+
+
+def _validate_sig(data, offset):
+    if not _fits(data, offset, SignatureHeader.size):
+        return 'signature truncated'
+    version, _, tag = unpack_from(SignatureHeader._struct, data, offset)
+
+    if version != ContainerVersions.VERSION_0:
+        return 'signature version'
+    elif tag != HeaderTag.SIGNATURE:
+        return 'signature tag'
+    return None
+
+
+def _validate_cert(data, offset):
+    if not _fits(data, offset, CertificateHeader.size):
+        return 'certificate truncated'
+    version, _, tag, _, perms_inv, perms = unpack_from(CertificateHeader._struct, data, offset)
+
+    if version != ContainerVersions.VERSION_0:
+        return 'certificate version'
+    elif tag != HeaderTag.CERTIFICATE:
+        return 'certificate tag'
+    elif utils.invert(perms) != perms_inv:
+        return 'certificate permissions'
+
+    reason, _ = _validate_srk(data, offset + CertificateHeader.size)
+    return reason
+
+
+def _validate_dek(data, offset):
+    if not _fits(data, offset, DEKHeader.size):
+        return 'DEK truncated'
+    version, _, tag, _, _, alg, mode = unpack_from(DEKHeader._struct, data, offset)
+
+    if version != ContainerVersions.VERSION_0:
+        return 'DEK version'
+    elif tag != HeaderTag.DEK:
+        return 'DEK tag'
+    elif alg != EncryptionAlg.AES or mode != EncryptionMode.CBC:
+        return 'DEK algorithm'
+    return None
+
+
 __all__ = [
+    'ContainerImage',
     'iMXImageContainer',
 ]
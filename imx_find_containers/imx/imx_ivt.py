@@ -1,9 +1,13 @@
-from ..types import Container
+import mmap
+
+from ..types import Container, Image, unpack_from
 from .. import utils
 from .ivt_types import *
 
 
 class iMXImageVectorTable(Container):
+    alignment = 0x400
+
     @classmethod
     def is_container(cls, data, offset, verbose=False):
         if len(data) > offset + IVT_HEADER_SIZE:
@@ -17,8 +21,8 @@ class iMXImageVectorTable(Container):
                 # Only do a struct.unpack() instead of creating a full
                 # StructTuple to save time. We don't need all of the header
                 # elements for this check.
-                _, length, _ = Header._struct.unpack_from(data, offset)
-                _, reserved1, _, _, _, _, reserved2 = IVT._struct.unpack_from(data, offset + Header.size)
+                _, length, _ = unpack_from(Header._struct, data, offset)
+                _, reserved1, _, _, _, _, reserved2 = unpack_from(IVT._struct, data, offset + Header.size)
 
                 # This might be an IVT, but first do a sanity check and make
                 # sure the length, and reserved fields make sense.
@@ -32,8 +36,32 @@ class iMXImageVectorTable(Container):
 
         return False
 
+    @classmethod
+    def validate(cls, data, offset):
+        _, reserved1, dcd, boot_data, addr, csf, _ = unpack_from(IVT._struct, data, offset + Header.size)
+
+        # The boot_data, dcd and csf values are absolute addresses, see
+        # init_from_data()
+        boot_data_offset = offset + (boot_data - addr)
+        if boot_data_offset < 0 or boot_data_offset + BootData.size > len(data):
+            return 'boot data outside of data'
+
+        if dcd != 0:
+            reason = _validate_dcd(data, offset + (dcd - addr))
+            if reason is not None:
+                return reason
+
+        if csf != 0:
+            csf_offset = offset + (csf - addr)
+            if csf_offset < 0 or csf_offset + Header.size > len(data):
+                return 'CSF outside of data'
+
+        return None
+
     def init_from_data(self, data, offset):
-        assert isinstance(data, bytes)
+        # The data is either the file contents, a memory map of the file or a
+        # find.OpenedFile for files that can't be mapped
+        assert isinstance(data, (bytes, mmap.mmap)) or hasattr(data, 'unpack_from')
         self._parse_header(data, offset)
 
         # The boot_data, dcd, csf, and entry values are "absolute" addresses for
@@ -137,9 +165,12 @@ class iMXImageVectorTable(Container):
 
         # For every command except "NOP" parse the specified number of command 
         # data structures based on the length
-        cmd_struct = DCD_COMMAND_TO_STRUCT[hdr.tag]
-        cmd_range = range(offset+hdr.size, offset+hdr.length, cmd_struct.size)
-        cmd['commands'] = [cmd_struct(data, off) for off in cmd_range]
+        cmd_struct = DCD_COMMAND_TO_STRUCT.get(hdr.tag)
+        if cmd_struct is not None:
+            cmd_range = range(offset+hdr.size, offset+hdr.length, cmd_struct.size)
+            cmd['commands'] = [cmd_struct(data, off) for off in cmd_range]
+        else:
+            cmd['commands'] = []
 
         return cmd
 
@@ -175,20 +206,57 @@ class iMXImageVectorTable(Container):
 
         # For some reason the BOOT_DATA.length sometimes exceeds the available
         # data
-        if app_end > len(data):
+        app_range = None
+        if app_start < 0 or app_start >= len(data):
+            print(f'WARNING: (@ {offset:#x}) Application outside of available data: {app_start:#x}')
+        elif app_end > len(data):
             print(f'WARNING: (@ {app_start:#x}) Application length exceeds available data: {len(data):#x} ! >= {app_end:#x}')
-            app_end = len(data)
+            app_range = range(app_start, len(data))
+        else:
+            app_range = range(app_start, app_end)
 
-        app = {
-            'offset': app_start,
-            'entry': app_entry,
-            'range': range(app_start, app_end),
-            'data': data[app_start:app_end],
-        }
+        # The contents are set by load_images()
+        app = Image(
+            offset=app_start,
+            entry=app_entry,
+            range=app_range,
+            data=None,
+        )
 
         return app
 
 
+def _validate_dcd(data, offset):
+    # Mirrors the checks made while parsing the DCD but returns a reason
+    # instead of raising an exception
+    if offset < 0 or offset + Header.size > len(data):
+        return 'DCD outside of data'
+    tag, length, version = unpack_from(Header._struct, data, offset)
+
+    if tag != IVTHeaderTag.DCD:
+        return 'DCD tag'
+    elif not utils.is_enum_value(DCDHeaderVersion, version):
+        return 'DCD version'
+    elif length < Header.size or length > MAX_DCD_SIZE:
+        return 'DCD length'
+    elif offset + length > len(data):
+        return 'DCD truncated'
+
+    end = offset + length
+    offset += Header.size
+    while offset < end:
+        if offset + Header.size > end:
+            return 'DCD command truncated'
+        tag, length, _ = unpack_from(Header._struct, data, offset)
+        if not utils.is_enum_value(DCDCommand, tag):
+            return 'DCD command tag'
+        elif length < Header.size or offset + length > end:
+            return 'DCD command length'
+        offset += length
+
+    return None
+
+
 __all__ = [
     'iMXImageVectorTable',
 ]
@@ -0,0 +1,175 @@
+import io
+import os
+import struct
+import pickle
+import collections.abc
+
+from .types import LazyBytes, ExportPickler
+from . import blobs
+
+
+# Indexed results files start with the magic value and end with a trailer that
+# contains the offset of the index followed by the magic value again:
+#
+#   MAGIC
+#   image contents and pickled container lists for each scanned file
+#   pickled index: { filename: (offset, length) }
+#   trailer: index offset, MAGIC
+#
+# The pickled container lists refer to image contents by offset and length so
+# the contents are only read when they are accessed.
+MAGIC = b'IMXFC-INDEXED-01'
+_trailer = struct.Struct(f'<Q{len(MAGIC)}s')
+
+
+def is_indexed(filename):
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class _IndexedPickler(ExportPickler):
+    def __init__(self, file, results_file):
+        super().__init__(file, out_of_band=True)
+        self._results_file = results_file
+
+    def persistent_id(self, obj):
+        # Image contents are provided as PickleBuffers by the ExportPickler,
+        # write them directly to the results file and only pickle the location.
+        if isinstance(obj, pickle.PickleBuffer):
+            with obj.raw() as raw:
+                offset = self._results_file.tell()
+                self._results_file.write(raw)
+                length = raw.nbytes
+            obj.release()
+            return (offset, length)
+        return None
+
+
+class _IndexedUnpickler(pickle.Unpickler):
+    def __init__(self, file, results):
+        super().__init__(file)
+        self._results = results
+
+    def persistent_load(self, pid):
+        offset, length = pid
+        return IndexedData(self._results, offset, length)
+
+
+def write(filename, results):
+    full_filename = f'{filename}.idx'
+    print(f'Saving scan results: {full_filename}')
+
+    index = {}
+    with open(full_filename, 'wb') as f:
+        f.write(MAGIC)
+
+        for path, containers in results.items():
+            blob = io.BytesIO()
+            _IndexedPickler(blob, f).dump(containers)
+            index[path] = (f.tell(), blob.tell())
+            f.write(blob.getbuffer())
+
+        index_offset = f.tell()
+        pickle.dump(index, f, protocol=5)
+        f.write(_trailer.pack(index_offset, MAGIC))
+
+    # Return the filename
+    return full_filename
+
+
+class IndexedResults(collections.abc.Mapping):
+    # A read-only mapping of filename to the containers found in that file.
+    # The containers for each file are only loaded when they are accessed.
+    def __init__(self, filename):
+        self.filename = filename
+        self._fd = os.open(filename, os.O_RDONLY)
+        self._cache = {}
+
+        # Containers are loaded after open_results() has returned, keep track of
+        # the blob store that should be used for any image references
+        self._blob_store = blobs.current_store()
+
+        try:
+            size = os.fstat(self._fd).st_size
+            if size < len(MAGIC) + _trailer.size or self._pread(0, len(MAGIC)) != MAGIC:
+                raise ValueError(f'not an indexed results file: {filename}')
+            index_offset, magic = _trailer.unpack(self._pread(size - _trailer.size, _trailer.size))
+            if magic != MAGIC or not len(MAGIC) <= index_offset <= size - _trailer.size:
+                raise ValueError(f'corrupt indexed results file: {filename}')
+            index_data = self._pread(index_offset, size - _trailer.size - index_offset)
+            try:
+                self._index = pickle.loads(index_data)
+            except Exception as e:
+                raise ValueError(f'corrupt indexed results file: {filename}') from e
+        except Exception:
+            self.close()
+            raise
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if getattr(self, '_fd', None) is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _pread(self, offset, length):
+        data = os.pread(self._fd, length, offset)
+        if len(data) != length:
+            raise ValueError(f'{self.filename} is truncated, unable to read {length:#x} bytes @ {offset:#x}')
+        return data
+
+    def __getitem__(self, key):
+        if key not in self._cache:
+            offset, length = self._index[key]
+            blob = io.BytesIO(self._pread(offset, length))
+            with blobs.using_store(self._blob_store):
+                self._cache[key] = _IndexedUnpickler(blob, self).load()
+        return self._cache[key]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __reduce__(self):
+        # The open file can't be saved, save the loaded results instead
+        return (dict, (dict(self.items()),))
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.filename!r})'
+
+
+class IndexedData(LazyBytes):
+    def __init__(self, results, offset, length):
+        self._results = results
+        self.offset = offset
+        self.length = length
+
+    def resolve(self):
+        # The contents are not cached, each access reads from the results file
+        return self._results._pread(self.offset, self.length)
+
+    def read(self, offset, length):
+        length = max(min(length, self.length - offset), 0)
+        return self._results._pread(self.offset + offset, length)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.offset:#x}, {self.length:#x})'
+
+
+def load(filename):
+    return IndexedResults(filename)
+
+
+__all__ = [
+    'IndexedResults',
+    'IndexedData',
+]
@@ -0,0 +1,115 @@
+import json
+import base64
+
+from .types import ExportableIntEnum, ExportableIntFlag, ExportableObject, LazyBytes
+from .yaml import find_types_with_custom_yaml_repr
+from .blobs import BlobRef
+
+
+# JSON results are saved as JSON Lines, the first line identifies the format and
+# each following line holds the containers for one scanned file:
+#   {"!imx_find_containers": 1}
+#   {"file": "emmc_image.bin", "containers": [...]}
+#
+# Values that don't have a native JSON type are saved as a single key object
+# where the key is the type tag (the same tags used in the yaml results):
+#   {"!ImageType": 3}
+#   {"!range": [start, stop, step]}
+#   {"!binary": "<base64>"}
+#   {"!ContainerHeader": {"version": 0, ...}}
+MAGIC = '!imx_find_containers'
+VERSION = 1
+
+_plain_types = (str, int, float, bool, type(None))
+
+
+def _encode(obj):
+    typ = type(obj)
+    if typ in _plain_types:
+        return obj
+    elif typ is dict:
+        return dict((k, _encode(v)) for k, v in obj.items())
+    elif typ in (list, tuple):
+        return [_encode(v) for v in obj]
+    elif isinstance(obj, (ExportableIntEnum, ExportableIntFlag)):
+        return {obj.yaml_tag: int(obj)}
+    elif typ is range:
+        return {'!range': [obj.start, obj.stop, obj.step]}
+    elif typ is bytes:
+        return {'!binary': base64.b64encode(obj).decode()}
+    elif isinstance(obj, BlobRef):
+        return {obj.yaml_tag: {'digest': obj.digest, 'length': obj.length}}
+    elif isinstance(obj, LazyBytes):
+        return {'!binary': base64.b64encode(obj.resolve()).decode()}
+    elif isinstance(obj, ExportableObject):
+        if hasattr(obj, 'get_yaml_attrs'):
+            value = dict((a, _encode(obj.get_yaml_value(a))) for a in obj.get_yaml_attrs())
+        else:
+            value = dict((k, _encode(v)) for k, v in vars(obj).items() if not k.startswith('_'))
+        return {obj.yaml_tag: value}
+    else:
+        raise TypeError(f'Unable to export {typ.__name__} as JSON')
+
+
+class JsonIface:
+    def __init__(self):
+        self._types = None
+
+    def _decode(self, obj):
+        # Every JSON object is passed through this hook, only single key objects
+        # with a tag as the key are custom types
+        if len(obj) == 1:
+            tag, value = next(iter(obj.items()))
+            if tag[:1] == '!':
+                if tag == '!range':
+                    return range(*value)
+                elif tag == '!binary':
+                    return base64.b64decode(value)
+
+                typ = self._types.get(tag)
+                if typ is None:
+                    return obj
+                elif issubclass(typ, (ExportableIntEnum, ExportableIntFlag)):
+                    return typ(value)
+                else:
+                    return typ(**value)
+        return obj
+
+    def open(self, filename):
+        if self._types is None:
+            self._types = dict((t.yaml_tag, t) for t in find_types_with_custom_yaml_repr())
+
+        decoder = json.JSONDecoder(object_hook=self._decode)
+        results = {}
+        with open(filename, 'r') as f:
+            header = json.loads(f.readline())
+            assert header.get(MAGIC) == VERSION
+            for line in f:
+                entry = decoder.decode(line)
+                results[entry['file']] = entry['containers']
+        return results
+
+    def write(self, filename, results):
+        full_filename = f'{filename}.jsonl'
+        print(f'Saving scan results: {full_filename}')
+
+        encoder = json.JSONEncoder(separators=(',', ':'))
+        with open(full_filename, 'w') as f:
+            f.write(encoder.encode({MAGIC: VERSION}))
+            f.write('\n')
+            for path, containers in results.items():
+                f.write(encoder.encode({'file': path, 'containers': _encode(containers)}))
+                f.write('\n')
+
+        # Return the filename
+        return full_filename
+
+
+def is_json(filename):
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC) + 2) == f'{{"{MAGIC}'.encode()
+
+
+__all__ = [
+    'JsonIface',
+]
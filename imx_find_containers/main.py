@@ -1,44 +1,176 @@
+import os
+import sys
 import argparse
+import functools
+import collections
 
 from . import utils
 from . import find
+from . import blobs
+from . import filters
+from . import views
 
-def main():
-    parser = argparse.ArgumentParser(
+
+def _report(containers, stats, verbose=False):
+    # Print a summary of the probable containers that were rejected
+    # instead of each one
+    if stats:
+        print(f'Rejected {sum(stats.values())} probable containers')
+        if verbose:
+            for (name, reason), count in stats.most_common():
+                print(f'  {name}: {reason}: {count}')
+
+    if verbose:
+        print('\nFound:')
+        for c in containers:
+            print(c)
+
+
+def _scan_item(item, args, alignments_str, on_container=None):
+    # Scan one file and print the results like the command line does
+    print(f'Searching {item} ({alignments_str})')
+    stats = collections.Counter()
+    containers = find.scan_file(item, stats=stats, on_container=on_container, **vars(args))
+    _report(containers, stats, verbose=args.verbose)
+    return containers
+
+
+def build_parser(parser_class=argparse.ArgumentParser):
+    parser = parser_class(
             prog=__package__,
             description='Tool to scrape metadata, find, and extract images from i.MX flash images')
     parser.add_argument('path',
-            help='Path to search for i.MX containers in all binaries')
+            help='Path to search for i.MX containers in all binaries, or "-" to scan stdin')
+    parser.add_argument('--include', action='append',
+            help='Only scan files that match this glob pattern, may be specified multiple times')
+    parser.add_argument('--exclude', action='append',
+            help='Do not scan files or directories that match this glob pattern, may be specified multiple times')
+    parser.add_argument('--archives', action='store_true',
+            help='Scan the files inside of zip and tar archives (.zip, .tar, .tar.gz, .tar.bz2, .tar.xz) without unpacking them, results are saved as "ARCHIVE!/PATH"')
+    parser.add_argument('--workers', type=int,
+            help='Number of processes used to scan large files inside of archives (default: based on the number of CPUs)')
     parser.add_argument('--verbose', '-v', action='store_true',
             help='verbose debug/searching printouts')
-    parser.add_argument('--increment', '-i', default=0x400,
-            help='The amount to increment each address when searching for a container (default: 0x400)')
+    parser.add_argument('--increment', '-i',
+            help='The amount to increment each address when searching for all types of containers (default: the alignment of each type)')
+    parser.add_argument('--align', '-a', dest='alignments', action='append', type=find.parse_alignment,
+            help='Set the alignment used when searching for one type of container such as "fit=0x8" (types: imx, ivt, fit), may be specified multiple times')
+    parser.add_argument('--start', type=lambda x: int(x, 0), default=0,
+            help='Offset in each file to start searching for containers at (default: 0)')
+    parser.add_argument('--end', type=lambda x: int(x, 0),
+            help='Offset in each file to stop searching for containers at (default: end of the file)')
+    parser.add_argument('--length', type=lambda x: int(x, 0),
+            help='Number of bytes to search after the start offset, alternative to --end')
+    parser.add_argument('--checkpoint', action='store_true',
+            help='Periodically save the progress of each scan so it can be resumed if it is interrupted')
+    parser.add_argument('--checkpoint-interval', type=int, default=60,
+            help='Number of seconds between checkpoints (default: 60)')
+    parser.add_argument('--resume', action='store_true',
+            help='Resume scans from the last saved checkpoint (implies --checkpoint)')
+    parser.add_argument('--stream-window', type=lambda x: int(x, 0), default=find.DEFAULT_STREAM_WINDOW,
+            help=f'Amount of data kept in memory ahead of the search offset when scanning stdin ("-") or a pipe, the largest container that can be found (default: {find.DEFAULT_STREAM_WINDOW:#x})')
+    parser.add_argument('--nand', type=views.parse_nand_geometry, metavar='PAGE+OOB',
+            help='Scan raw NAND dumps with the specified page and OOB sizes (such as 2048+64 or 4096+224), the OOB bytes are skipped')
+    parser.add_argument('--no-sparse', dest='expand_sparse', action='store_false',
+            help='Scan Android sparse images as they are stored instead of as the expanded image')
+    parser.add_argument('--no-mmap', dest='use_mmap', action='store_false',
+            help='Read files in blocks instead of memory mapping them, limits the memory used when scanning very large files (block devices are always read in blocks)')
     parser.add_argument('--include-image-contents', '-I', action='store_true',
             help='Include contents of identified containers in the scan results file (increases time it takes to save scan results)')
+    parser.add_argument('--blob-store', '-b', nargs='?', const=blobs.DEFAULT_BLOB_DIR,
+            help=f'Save the contents of identified images to a content-addressed blob directory and only include references in the scan results file (default: {blobs.DEFAULT_BLOB_DIR})')
     parser.add_argument('--extract', '-e', action='store_true',
             help='Extract the contents of any identified containers')
+    parser.add_argument('--extract-workers', type=int,
+            help='Number of threads used to write extracted images (default: based on the number of CPUs)')
+    parser.add_argument('--extract-archive', metavar='ARCHIVE',
+            help='Extract the contents of any identified containers into a single tar (.tar, .tar.gz, .tar.bz2, .tar.xz) or zip (.zip) archive')
+    parser.add_argument('--filter', '-f', dest='image_filter', action='append', type=filters.parse_expression,
+            help='Only save and extract images that match a filter such as "type=EXE", "core_id=A53,A72", "signed=1", "fdt=fit", "container=iMXImageContainer" or "size<=16M", may be specified multiple times')
     parser.add_argument('--output-format', '-o', default='auto',
-            choices=['auto', 'yaml', 'PyYAML', 'ruamel.yaml', 'pickle'],
-            help='Select if the scan results should be saved as a yaml or pickle')
-    args = parser.parse_args()
+            choices=['auto', 'yaml', 'PyYAML', 'ruamel.yaml', 'json', 'pickle', 'indexed', 'sqlite'],
+            help='Select if the scan results should be saved as a yaml, JSON, pickle, or indexed file, or added to a SQLite database')
+    # sqlite3 is only imported if the results are saved to a database
+    parser.add_argument('--database', '-d',
+            help='SQLite database to add scan results to when the output format is sqlite (default: scan_results.db)')
+    return parser
+
+
+def parse_args(parser, argv=None):
+    args = parser.parse_args(argv)
 
     if isinstance(args.increment, str):
         args.increment = int(args.increment, 0)
 
+    if args.start < 0:
+        parser.error('--start can not be negative')
+    if args.length is not None:
+        if args.end is not None:
+            parser.error('--end and --length can not both be specified')
+        if args.length <= 0:
+            parser.error('--length must be greater than 0')
+        args.end = args.start + args.length
+    elif args.end is not None and args.end <= args.start:
+        parser.error('--end must be greater than --start')
+
+    args.alignments = find.get_alignments(args.increment, args.alignments)
+    return args
+
+
+def describe_alignments(alignments):
+    return ', '.join(f'{name} every {align:#x} bytes' for name, align in alignments.items())
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # "serve" starts a scan server that the client (imx_find_containers_client)
+    # sends command lines to
+    if argv[:1] == ['serve']:
+        from . import server
+        return server.main(argv[1:])
+
+    args = parse_args(build_parser(), argv)
+    alignments_str = describe_alignments(args.alignments)
+
+    # Images are added to the extraction archive as each container is found,
+    # images from files scanned by worker processes are added when the
+    # results are saved
+    archive = None
+    on_container = None
+    if args.extract_archive:
+        from . import extract
+        archive = extract.ArchiveWriter(args.extract_archive)
+        image_filter = filters.ImageFilter(args.image_filter or ())
+
     results = {}
-    for item in utils.find_files(args.path):
-        print(f'Searching {filename} every {args.increment:#x} bytes')
-        containers = find.scan_file(item, **vars(args))
-        if containers:
-            results[item] = containers
+    with find.ScanPool(workers=args.workers) as pool:
+        for item in utils.find_files(args.path, include=args.include, exclude=args.exclude, archives=args.archives):
+            if pool.should_submit(item):
+                print(f'Searching {item} in a worker process ({alignments_str})')
+                pool.submit(item, **vars(args))
+                continue
+
+            if archive is not None:
+                on_container = functools.partial(utils.container_save_images, prefix=utils._path_to_filename(item),
+                        pool=archive, source=item, image_filter=image_filter)
+            containers = _scan_item(item, args, alignments_str, on_container=on_container)
+            if containers:
+                results[item] = containers
 
-        if args.verbose:
-            print('\nFound:')
-            for c in containers:
-                print(c)
+        for item, containers, stats in pool.results():
+            print(f'Finished searching {item}')
+            if containers:
+                results[item] = containers
+            _report(containers, stats, verbose=args.verbose)
 
     if results:
-        utils.save_results(results, **vars(args))
+        utils.save_results(results, **dict(vars(args), extract_archive=archive))
+    elif archive is not None:
+        # Nothing was found, don't leave an empty archive
+        archive.close(save_manifest=False)
+        os.remove(args.extract_archive)
 
     return 0
 
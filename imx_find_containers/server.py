@@ -0,0 +1,283 @@
+import io
+import os
+import json
+import stat
+import socket
+import argparse
+import threading
+import traceback
+import contextlib
+import collections
+import socketserver
+import multiprocessing
+import concurrent.futures
+
+from .types import SourceData
+from .main import build_parser, parse_args, describe_alignments, _scan_item
+from . import utils
+from . import archives
+from . import client
+
+
+# The maximum number of scanned files whose results are kept in memory
+DEFAULT_CACHE_SIZE = 1024
+
+
+def _warm_worker():
+    # Import the modules that are otherwise only imported when they are first
+    # needed so the first request handled by each worker isn't slower
+    from . import find
+    from . import extract
+    from . import sqlite
+    utils.get_yaml_modules_available()
+    try:
+        import pyfdt.pyfdt
+    except ImportError:
+        pass
+
+
+def _in_dir(cwd, func, *args):
+    # Runs in a worker process, requests are run in the client's working
+    # directory and the output is returned to the client instead of being
+    # printed. A worker only runs one request at a time.
+    os.chdir(cwd)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = func(*args)
+    return (result, output.getvalue())
+
+
+def _list_files(args):
+    return list(utils.find_files(args.path, include=args.include, exclude=args.exclude, archives=args.archives))
+
+
+def _scan(item, args, alignments_str):
+    containers = _scan_item(item, args, alignments_str)
+
+    # The cached results may be used by requests from other directories. Only
+    # references to the images in the scanned file are returned and cached,
+    # the contents are read again when the results are saved.
+    for c in containers:
+        for img in c.images:
+            if isinstance(img['data'], SourceData):
+                img['data'].source = os.path.abspath(img['data'].source)
+    return containers
+
+
+def _save(results, args):
+    utils.save_results(results, **vars(args))
+
+
+class ResultCache:
+    # The containers found in each file and the output that was printed while
+    # scanning it. Results are keyed by the file identity, modification time
+    # and the scan options so they aren't used once the file has changed, the
+    # least recently used results are discarded.
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _cache_key(cwd, item, args):
+    # Files that can change without their modification time changing (block
+    # devices and pipes) and scans that use checkpoints aren't cached
+    if args.checkpoint or args.resume:
+        return None
+    path = os.path.join(cwd, item)
+    member = archives.split_path(path)
+    if member is not None:
+        path, name = member
+    else:
+        name = None
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+
+    options = (tuple(args.alignments.items()), args.start, args.end, args.stream_window, args.expand_sparse,
+            args.nand, args.verbose, tuple(args.image_filter or ()))
+    return (os.path.realpath(path), name, st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, options)
+
+
+class _ParserExit(Exception):
+    def __init__(self, status):
+        self.status = status
+
+
+class _Parser(argparse.ArgumentParser):
+    # Returns the usage and error messages to the client instead of printing
+    # them and exiting the server
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output = []
+
+    def _print_message(self, message, file=None):
+        if message:
+            self.output.append(message)
+
+    def exit(self, status=0, message=None):
+        if message:
+            self._print_message(message)
+        raise _ParserExit(status)
+
+
+class ScanServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, workers=None, cache_size=DEFAULT_CACHE_SIZE):
+        self.socket_path = socket_path
+        self.cache = ResultCache(cache_size)
+
+        # The workers are started by a fork server because the server threads
+        # may be running when more workers are started
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                mp_context=multiprocessing.get_context('forkserver'), initializer=_warm_worker)
+
+        _remove_stale_socket(socket_path)
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def run(self, argv, cwd, send):
+        # Runs a command line the same way as main() and sends the output to
+        # the client, returns the exit status
+        parser = build_parser(_Parser)
+        try:
+            args = parse_args(parser, argv)
+        except _ParserExit as e:
+            send(''.join(parser.output))
+            return e.status
+
+        if args.path == '-':
+            send('stdin can not be scanned by the server\n')
+            return 2
+        alignments_str = describe_alignments(args.alignments)
+
+        items, output = self.pool.submit(_in_dir, cwd, _list_files, args).result()
+        send(output)
+
+        # All files are scanned at the same time, the output is sent to the
+        # client in the same order as the command line
+        pending = []
+        for item in items:
+            key = _cache_key(cwd, item, args)
+            cached = self.cache.get(key) if key is not None else None
+            if cached is not None:
+                future = concurrent.futures.Future()
+                future.set_result(cached)
+            else:
+                future = self.pool.submit(_in_dir, cwd, _scan, item, args, alignments_str)
+            pending.append((item, key, cached is None, future))
+
+        results = {}
+        for item, key, scanned, future in pending:
+            containers, output = future.result()
+            send(output)
+            if scanned and key is not None:
+                self.cache.put(key, (containers, output))
+            if containers:
+                results[item] = containers
+
+        if results:
+            _, output = self.pool.submit(_in_dir, cwd, _save, results, args).result()
+            send(output)
+        return 0
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _send(self, **msg):
+        self.wfile.write(json.dumps(msg).encode() + b'\n')
+        self.wfile.flush()
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        msg = json.loads(line)
+
+        if msg.get('command') == 'stop':
+            self._send(status=0)
+            threading.Thread(target=self.server.shutdown).start()
+            return
+
+        if msg.get('command') != 'run':
+            self._send(output=f'unknown command: {msg.get("command")}\n', status=2)
+            return
+
+        try:
+            status = self.server.run(msg['argv'], msg['cwd'], lambda output: output and self._send(output=output))
+        except Exception:
+            self._send(output=traceback.format_exc())
+            status = 1
+        self._send(status=status)
+
+
+def _remove_stale_socket(socket_path):
+    # A socket left behind by a server that is no longer running is removed,
+    # it is an error if a server is still using the socket
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except ConnectionRefusedError:
+            os.unlink(socket_path)
+            return
+    raise OSError(f'a server is already running on {socket_path}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            prog=f'{__package__} serve',
+            description='Run a scan server that keeps worker processes and scan results in memory, '
+                'use imx_find_containers_client to send it the same arguments as imx_find_containers')
+    parser.add_argument('--socket', default=client.default_socket(),
+            help=f'Unix socket to listen on (default: ${client.SOCKET_ENV} or {client.default_socket()})')
+    parser.add_argument('--workers', type=int,
+            help='Number of worker processes (default: the number of CPUs)')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+            help=f'Number of scanned files whose results are kept in memory (default: {DEFAULT_CACHE_SIZE})')
+    args = parser.parse_args(argv)
+
+    with ScanServer(args.socket, workers=args.workers, cache_size=args.cache_size) as server:
+        print(f'Listening on {args.socket}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        print(f'Stopping server (result cache: {server.cache.hits} hits, {server.cache.misses} misses)')
+    return 0
+
+
+__all__ = [
+    'ResultCache',
+    'ScanServer',
+]
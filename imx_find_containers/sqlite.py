@@ -0,0 +1,457 @@
+import re
+import enum
+import pathlib
+import sqlite3
+import argparse
+
+from .types import Container
+from . import imx
+from . import utils
+from . import filters
+
+
+# Default database that scan results are added to, the same database is used
+# for every scan so results accumulate over time.
+DEFAULT_DATABASE = 'scan_results.db'
+
+
+_schema = '''
+PRAGMA foreign_keys = ON;
+
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    scanned TEXT
+);
+
+CREATE TABLE IF NOT EXISTS containers (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    type TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    end INTEGER,
+    tag TEXT,
+    sw_ver INTEGER,
+    fuse_ver INTEGER,
+    num_images INTEGER,
+    srk_set TEXT,
+    srk_index INTEGER,
+    srk_revoke_mask INTEGER,
+    signed INTEGER
+);
+CREATE INDEX IF NOT EXISTS containers_file ON containers(file_id);
+CREATE INDEX IF NOT EXISTS containers_type ON containers(type, signed);
+CREATE INDEX IF NOT EXISTS containers_srk ON containers(srk_set, srk_revoke_mask);
+
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    container_id INTEGER NOT NULL REFERENCES containers(id) ON DELETE CASCADE,
+    offset INTEGER,
+    size INTEGER,
+    type TEXT,
+    core_id TEXT,
+    cpu_id TEXT,
+    mu_id TEXT,
+    partition_id TEXT,
+    hash_type TEXT,
+    encrypted INTEGER,
+    boot_flags INTEGER,
+    entry INTEGER,
+    fileext TEXT
+);
+CREATE INDEX IF NOT EXISTS images_container ON images(container_id);
+CREATE INDEX IF NOT EXISTS images_type ON images(type, core_id);
+CREATE INDEX IF NOT EXISTS images_core ON images(core_id, type);
+CREATE INDEX IF NOT EXISTS images_cpu ON images(cpu_id);
+
+CREATE TABLE IF NOT EXISTS sigblocks (
+    id INTEGER PRIMARY KEY,
+    container_id INTEGER NOT NULL REFERENCES containers(id) ON DELETE CASCADE,
+    offset INTEGER,
+    srk_alg TEXT,
+    srk_hash TEXT,
+    srk_key_size TEXT,
+    cert INTEGER,
+    cert_perms INTEGER,
+    dek INTEGER,
+    dek_key_size TEXT
+);
+CREATE INDEX IF NOT EXISTS sigblocks_container ON sigblocks(container_id);
+
+CREATE TABLE IF NOT EXISTS ivts (
+    id INTEGER PRIMARY KEY,
+    container_id INTEGER NOT NULL REFERENCES containers(id) ON DELETE CASCADE,
+    version TEXT,
+    addr INTEGER,
+    entry INTEGER,
+    dcd INTEGER,
+    csf INTEGER,
+    boot_start INTEGER,
+    boot_length INTEGER,
+    plugins INTEGER
+);
+CREATE INDEX IF NOT EXISTS ivts_container ON ivts(container_id);
+
+CREATE TABLE IF NOT EXISTS dcds (
+    id INTEGER PRIMARY KEY,
+    container_id INTEGER NOT NULL REFERENCES containers(id) ON DELETE CASCADE,
+    offset INTEGER,
+    length INTEGER,
+    version TEXT,
+    num_cmds INTEGER,
+    num_writes INTEGER,
+    num_checks INTEGER,
+    num_nops INTEGER,
+    num_unlocks INTEGER
+);
+CREATE INDEX IF NOT EXISTS dcds_container ON dcds(container_id);
+'''
+
+
+def _value(value):
+    # Enums are saved by name so queries can use the same names that are
+    # printed in the scan results, all other values are saved as-is
+    if isinstance(value, enum.Enum):
+        return value.name
+    elif isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def connect(database=DEFAULT_DATABASE, readonly=False):
+    # Read-only connections are used for queries, the database must already
+    # exist and it isn't modified
+    if readonly:
+        uri = f'{pathlib.Path(database).absolute().as_uri()}?mode=ro'
+        db = sqlite3.connect(uri, uri=True)
+        db.row_factory = sqlite3.Row
+        return db
+
+    db = sqlite3.connect(database)
+    db.row_factory = sqlite3.Row
+    db.executescript(_schema)
+
+    # WAL mode allows queries to run while new scan results are being added
+    db.execute('PRAGMA journal_mode = WAL')
+    db.execute('PRAGMA synchronous = NORMAL')
+    return db
+
+
+def _container_row(file_id, container):
+    row = {
+        'file_id': file_id,
+        'type': container.__class__.__name__,
+        'offset': container.offset,
+        'end': getattr(container, 'end', None),
+        'tag': None,
+        'sw_ver': None,
+        'fuse_ver': None,
+        'num_images': len(container.images) if container.images else None,
+        'srk_set': None,
+        'srk_index': None,
+        'srk_revoke_mask': None,
+        'signed': None,
+    }
+
+    hdr = getattr(container, 'hdr', None)
+    if hasattr(container, 'srk'):
+        # i.MX Container
+        row.update({
+            'tag': _value(utils.enum_or_int(imx.HeaderTag, hdr.tag)),
+            'sw_ver': hdr.sw_ver,
+            'fuse_ver': hdr.fuse_ver,
+            'num_images': hdr.num_images,
+            'srk_set': _value(container.srk['set']),
+            'srk_index': container.srk['index'],
+            'srk_revoke_mask': container.srk['revoke_mask'],
+            'signed': int(container.sigblock is not None),
+        })
+    elif hasattr(container, 'ivt'):
+        # i.MX IVTs are signed if there is a CSF
+        row.update({
+            'tag': _value(utils.enum_or_int(imx.IVTHeaderTag, hdr.tag)),
+            'signed': int(container.csf is not None),
+        })
+
+    return row
+
+
+def _image_row(container_id, img):
+    return {
+        'container_id': container_id,
+        'offset': img.get('offset'),
+        'size': len(img['range']) if img.get('range') is not None else None,
+        'type': _value(img.get('type')),
+        'core_id': _value(img.get('core_id')),
+        'cpu_id': _value(img.get('cpu_id')),
+        'mu_id': _value(img.get('mu_id')),
+        'partition_id': _value(img.get('partition_id')),
+        'hash_type': _value(img.get('hash_type')),
+        'encrypted': _value(img.get('encrypted')),
+        'boot_flags': img.get('boot_flags'),
+        'entry': img.get('entry'),
+        'fileext': img.get('fileext'),
+    }
+
+
+def _sigblock_row(container_id, sigblock):
+    row = {
+        'container_id': container_id,
+        'offset': sigblock['offset'],
+        'srk_alg': None,
+        'srk_hash': None,
+        'srk_key_size': None,
+        'cert': int(sigblock['cert'] is not None),
+        'cert_perms': None,
+        'dek': int(sigblock['dek'] is not None),
+        'dek_key_size': None,
+    }
+
+    # All SRK records in a table use the same algorithm
+    records = sigblock['srk_table']['records']
+    if records:
+        srk = records[0]
+        row['srk_alg'] = _value(srk['type'])
+        row['srk_hash'] = _value(srk['hash'])
+        row['srk_key_size'] = _value(srk.get('key_size', srk.get('curve')))
+
+    if sigblock['cert'] is not None:
+        row['cert_perms'] = int(sigblock['cert']['perm'])
+
+    if sigblock['dek'] is not None:
+        row['dek_key_size'] = _value(sigblock['dek']['key_size'])
+
+    return row
+
+
+def _ivt_row(container_id, container):
+    return {
+        'container_id': container_id,
+        'version': _value(utils.enum_or_int(imx.IVTHeaderVersion, container.hdr.version)),
+        'addr': container.ivt.addr,
+        'entry': container.ivt.entry,
+        'dcd': container.ivt.dcd,
+        'csf': container.ivt.csf,
+        'boot_start': container.boot_data.start,
+        'boot_length': container.boot_data.length,
+        'plugins': container.boot_data.plugins,
+    }
+
+
+def _dcd_row(container_id, dcd):
+    cmds = [c['hdr'].tag for c in dcd['cmds']]
+    return {
+        'container_id': container_id,
+        'offset': dcd['offset'],
+        'length': dcd['hdr'].length,
+        'version': _value(utils.enum_or_int(imx.DCDHeaderVersion, dcd['hdr'].version)),
+        'num_cmds': len(cmds),
+        'num_writes': cmds.count(imx.DCDCommand.WRITE_DATA),
+        'num_checks': cmds.count(imx.DCDCommand.CHECK_DATA),
+        'num_nops': cmds.count(imx.DCDCommand.NOP),
+        'num_unlocks': cmds.count(imx.DCDCommand.UNLOCK),
+    }
+
+
+def _insert(db, table, row):
+    cols = ', '.join(row)
+    params = ', '.join(f':{c}' for c in row)
+    return db.execute(f'INSERT INTO {table} ({cols}) VALUES ({params})', row).lastrowid
+
+
+def _insert_many(db, table, rows):
+    if rows:
+        cols = ', '.join(rows[0])
+        params = ', '.join(f':{c}' for c in rows[0])
+        db.executemany(f'INSERT INTO {table} ({cols}) VALUES ({params})', rows)
+
+
+def write(database, results, scanned=None):
+    # Add the results to the database, if a file has already been scanned the
+    # previous results for that file are replaced.
+    db = connect(database)
+    try:
+        with db:
+            for path, containers in results.items():
+                db.execute('DELETE FROM files WHERE path = ?', (path,))
+                file_id = _insert(db, 'files', {'path': path, 'scanned': scanned})
+
+                for container in containers:
+                    assert isinstance(container, Container)
+                    container_id = _insert(db, 'containers', _container_row(file_id, container))
+
+                    images = container.images if container.images else []
+                    if container.image_filter:
+                        images = container.image_filter.select_images(container)
+                    _insert_many(db, 'images', [_image_row(container_id, img) for img in images])
+
+                    if getattr(container, 'sigblock', None) is not None:
+                        _insert(db, 'sigblocks', _sigblock_row(container_id, container.sigblock))
+
+                    if hasattr(container, 'ivt'):
+                        _insert(db, 'ivts', _ivt_row(container_id, container))
+                        if container.dcd is not None:
+                            _insert(db, 'dcds', _dcd_row(container_id, container.dcd))
+    finally:
+        db.close()
+
+    print(f'Saving scan results: {database}')
+
+    # Return the filename
+    return database
+
+
+def query(database, sql, params=()):
+    db = connect(database, readonly=True)
+    try:
+        return db.execute(sql, params).fetchall()
+    finally:
+        db.close()
+
+
+# Comparison operators that can be appended to a column name to filter on
+# something other than equality, for example "srk_revoke_mask__ne=0"
+_operators = {
+    'eq': '=',
+    'ne': '!=',
+    'lt': '<',
+    'le': '<=',
+    'gt': '>',
+    'ge': '>=',
+}
+
+
+def _where(filters):
+    terms = []
+    params = []
+    for key, value in filters.items():
+        col, _, op = key.partition('__')
+        assert re.fullmatch(r'\w+', col)
+        if value is None:
+            terms.append(f'{col} IS NULL' if op in ('', 'eq') else f'{col} IS NOT NULL')
+        elif isinstance(value, (list, tuple)):
+            # Matches any (or with __ne none) of the values
+            assert op in ('', 'eq', 'ne')
+            placeholders = ', '.join('?' for _ in value)
+            terms.append(f'{col} {"NOT IN" if op == "ne" else "IN"} ({placeholders})')
+            params.extend(_value(v) for v in value)
+        else:
+            terms.append(f'{col} {_operators[op or "eq"]} ?')
+            params.append(_value(value))
+
+    if terms:
+        return 'WHERE ' + ' AND '.join(terms), params
+    else:
+        return '', params
+
+
+# The tables that can be searched with find(), each query returns the source
+# file and container information along with the requested table columns.
+_queries = {
+    'containers': '''SELECT * FROM (
+        SELECT files.path, containers.* FROM containers
+        JOIN files ON files.id = containers.file_id)''',
+    'images': '''SELECT * FROM (
+        SELECT files.path, containers.type AS container, containers.offset AS container_offset,
+            containers.srk_set, containers.srk_revoke_mask, containers.signed, images.*
+        FROM images
+        JOIN containers ON containers.id = images.container_id
+        JOIN files ON files.id = containers.file_id)''',
+    'sigblocks': '''SELECT * FROM (
+        SELECT files.path, containers.offset AS container_offset, containers.srk_set,
+            containers.srk_revoke_mask, sigblocks.*
+        FROM sigblocks
+        JOIN containers ON containers.id = sigblocks.container_id
+        JOIN files ON files.id = containers.file_id)''',
+    'ivts': '''SELECT * FROM (
+        SELECT files.path, containers.offset AS container_offset, containers.signed, ivts.*
+        FROM ivts
+        JOIN containers ON containers.id = ivts.container_id
+        JOIN files ON files.id = containers.file_id)''',
+    'dcds': '''SELECT * FROM (
+        SELECT files.path, containers.offset AS container_offset, dcds.*
+        FROM dcds
+        JOIN containers ON containers.id = dcds.container_id
+        JOIN files ON files.id = containers.file_id)''',
+}
+
+
+def find(database, table='images', **filters):
+    # Find rows in the specified table that match all of the column filters,
+    # for example:
+    #   find(db, 'images', core_id='A53', type='EXE', signed=0)
+    #   find(db, 'containers', srk_set='OEM', srk_revoke_mask__ne=0)
+    where, params = _where(filters)
+    return query(database, f'{_queries[table]} {where}', params)
+
+
+# The column filter operators are the same as the image filter expressions
+_suffixes = {'=': '', '==': '', '!=': '__ne', '<': '__lt', '<=': '__le', '>': '__gt', '>=': '__ge'}
+
+
+def _parse_filter(arg):
+    try:
+        col, op, values = filters.split_expression(arg)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+    values = tuple(None if isinstance(v, str) and v.lower() in ('null', 'none') else v for v in values)
+    return col + _suffixes[op], values[0] if len(values) == 1 else values
+
+
+# Offsets, sizes, addresses and masks are printed as hex, all other integers
+# (row ids, counts, versions and flags) are printed as decimal
+_hex_columns = {
+    'offset', 'end', 'size', 'length', 'entry', 'addr', 'dcd', 'csf', 'boot_start', 'boot_length',
+    'srk_revoke_mask', 'boot_flags', 'cert_perms',
+}
+
+
+def _format_value(value, hex_column):
+    if value is None:
+        return ''
+    elif hex_column and isinstance(value, int):
+        return f'{value:#x}'
+    return str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            prog=f'{__package__}.sqlite',
+            description='Query scan results that have been saved to a SQLite database')
+    parser.add_argument('database', nargs='?', default=DEFAULT_DATABASE,
+            help=f'Scan results database (default: {DEFAULT_DATABASE})')
+    parser.add_argument('--table', '-t', default='images', choices=list(_queries),
+            help='The type of scan result to search for (default: images)')
+    parser.add_argument('--where', '-w', action='append', default=[], type=_parse_filter,
+            help='Column filter such as "core_id=A53", "type=EXE,DATA" or "srk_revoke_mask!=0", may be specified multiple times')
+    parser.add_argument('--sql', '-s',
+            help='Run a raw SQL query instead of a filtered search')
+    args = parser.parse_args()
+
+    if args.sql:
+        rows = query(args.database, args.sql)
+    else:
+        rows = find(args.database, args.table, **dict(args.where))
+
+    if rows:
+        columns = rows[0].keys()
+        print('\t'.join(columns))
+        hex_columns = [c in _hex_columns or c.endswith('_offset') for c in columns]
+        for row in rows:
+            print('\t'.join(_format_value(v, h) for v, h in zip(row, hex_columns)))
+
+    return 0
+
+
+__all__ = [
+    'DEFAULT_DATABASE',
+    'connect',
+    'write',
+    'query',
+    'find',
+]
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,10 @@
+import os
 import enum
 import struct
+import pickle
+import copyreg
 import functools
+import bisect
 import operator
 import abc
 
@@ -61,6 +65,8 @@ class ExportableIntFlag(enum.IntFlag):
 
 
 class ExportableObject:
+    __slots__ = ()
+
     @classproperty
     def yaml_tag(cls):
         return f'!{cls.__name__}'
@@ -68,7 +74,7 @@ class ExportableObject:
     @classmethod
     def to_yaml(cls, representer, node):
         if hasattr(node, 'get_yaml_attrs'):
-            value = dict((a, getattr(node, a)) for a in node.get_yaml_attrs())
+            value = dict((a, node.get_yaml_value(a)) for a in node.get_yaml_attrs())
         else:
             value = dict((k, v) for k, v in vars(node).items() if not k.startswith('_'))
         return representer.represent_mapping(cls.yaml_tag, value, flow_style=False)
@@ -79,6 +85,208 @@ class ExportableObject:
         return cls(**data)
 
 
+class LazyBytes(ExportableObject, abc.ABC):
+    # Base class for image contents that are not held in memory, the bytes are
+    # retrieved from wherever they are stored when the contents are accessed.
+    # Subclasses may keep the contents once they have been retrieved.
+    #
+    # Slices and comparisons only read the part of the contents they need,
+    # subclasses that can read part of the contents provide read().
+
+    # If set the contents are included in exported results, otherwise only the
+    # reference is exported
+    export_contents = True
+
+    # The amount of data read at a time when comparing contents
+    _compare_size = 0x100000
+
+    @abc.abstractmethod
+    def resolve(self):
+        raise NotImplementedError
+
+    def read(self, offset, length):
+        # Returns part of the contents
+        return self.resolve()[offset:offset + length]
+
+    def __bytes__(self):
+        return self.resolve()
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            if step == 1:
+                return self.read(start, max(stop - start, 0))
+            return self.resolve()[key]
+
+        if key < 0:
+            key += self.length
+        if not 0 <= key < self.length:
+            raise IndexError('index out of range')
+        return self.read(key, 1)[0]
+
+    def __eq__(self, other):
+        try:
+            if len(other) != self.length:
+                return False
+        except TypeError:
+            return NotImplemented
+        if not isinstance(other, (LazyBytes, bytes, bytearray, memoryview)):
+            return NotImplemented
+
+        for offset in range(0, self.length, self._compare_size):
+            if self.read(offset, self._compare_size) != bytes(other[offset:offset + self._compare_size]):
+                return False
+        return True
+
+    def __hash__(self):
+        return hash(self.resolve())
+
+    def __reduce__(self):
+        # By default the contents are exported instead of the reference
+        return (bytes, (self.resolve(),))
+
+    @classmethod
+    def to_yaml(cls, representer, node):
+        return representer.represent_binary(node.resolve())
+
+
+class SourceData(LazyBytes):
+    # Image contents that are an unmodified range of the file that was scanned.
+    # The range is read each time the contents are accessed, the contents are
+    # not kept in memory.
+    def __init__(self, source, offset, length):
+        self.source = source
+        self.offset = offset
+        self.length = length
+
+    def resolve(self):
+        return self.read(0, self.length)
+
+    def read(self, offset, length):
+        length = max(min(length, self.length - offset), 0)
+        with open(self.source, 'rb') as f:
+            data = os.pread(f.fileno(), length, self.offset + offset)
+        if len(data) != length:
+            raise EOFError(f'{self.source} is truncated, unable to read {length:#x} bytes @ {self.offset + offset:#x}')
+        return data
+
+    def __reduce__(self):
+        # Only the reference is saved, results that are exported with an
+        # ExportPickler include the contents instead
+        return (self.__class__, (self.source, self.offset, self.length))
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.source!r}, {self.offset:#x}, {self.length:#x})'
+
+
+class Image(ExportableObject):
+    # Describes one image in a container. Only the values that were found while
+    # parsing are stored, attributes that can be decoded from the image header
+    # (such as the image type) are decoded each time they are accessed so they
+    # don't take up any space in memory or in exported results.
+    #
+    # Images can be accessed like a dictionary for compatibility with the plain
+    # dictionaries that were used previously, and which may be present in
+    # older scan results files.
+    __slots__ = ('hdr', 'offset', 'file_offset', 'range', 'entry', 'fileext', 'data')
+
+    # Map of attribute name to a function that decodes the attribute value from
+    # the image header
+    _decoded = {}
+
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            # Decoded attributes may be present when loading results that were
+            # saved from an image dictionary, they aren't needed.
+            if key not in self._decoded:
+                setattr(self, key, value)
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set
+        decode = self._decoded.get(name)
+        if decode is None or name == 'hdr':
+            raise AttributeError(name)
+        return decode(self.hdr)
+
+    def keys(self):
+        keys = [k for k in Image.__slots__ if hasattr(self, k)]
+        if self._decoded and hasattr(self, 'hdr'):
+            keys += list(self._decoded)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key in self._decoded:
+            raise KeyError(f'{key} is decoded from the image header and can not be set')
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self):
+        return ((k, self[k]) for k in self.keys())
+
+    def values(self):
+        return (self[k] for k in self.keys())
+
+    def copy(self):
+        return self.__class__(**dict((k, getattr(self, k)) for k in Image.__slots__ if hasattr(self, k)))
+
+    def __eq__(self, other):
+        if isinstance(other, (Image, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __getstate__(self):
+        # Only the stored values are saved, the decoded values are recreated
+        # from the header when the image is loaded
+        return dict((k, getattr(self, k)) for k in Image.__slots__ if hasattr(self, k))
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+
+    def get_yaml_attrs(self):
+        return (k for k in Image.__slots__ if hasattr(self, k))
+
+    def get_yaml_value(self, attr):
+        return getattr(self, attr)
+
+    def __repr__(self):
+        param_str = ', '.join(f'{k}={v!r}' for k, v in self.items())
+        return f'{self.__class__.__name__}({param_str})'
+
+
+def unpack_from(fmt, data, offset=0):
+    # Unpack a struct from the data being scanned. Data that doesn't support
+    # the buffer protocol (such as find.OpenedFile) provides an unpack_from()
+    # function instead.
+    try:
+        return fmt.unpack_from(data, offset)
+    except TypeError:
+        return data.unpack_from(fmt, offset)
+
+
 class StructTuple(ExportableObject):
     _struct = None
     _fields = None
@@ -92,11 +300,15 @@ class StructTuple(ExportableObject):
         assert data is not None or kwargs
 
         if data is not None:
-            assert len(data[offset:]) >= self.size
-            unpacked = self._struct.unpack_from(data, offset=offset)
+            assert len(data) - offset >= self.size
+            unpacked = unpack_from(self._struct, data, offset)
             for attr, arg in zip(self._fields, unpacked):
                 setattr(self, attr, arg)
         elif kwargs:
+            # Some structures have a field named "offset" which is captured by
+            # the offset parameter when recreating a loaded object
+            if 'offset' in self._fields:
+                kwargs['offset'] = offset
             assert all(attr in kwargs for attr in self._fields)
             for attr in self._fields:
                 setattr(self, attr, kwargs[attr])
@@ -116,6 +328,19 @@ class StructTuple(ExportableObject):
     def __iter__(self):
         return iter(self._fields)
 
+    def __eq__(self, other):
+        # Headers are equal if they have the same values, such as a header
+        # that has been saved and loaded
+        if isinstance(other, StructTuple):
+            return type(self) is type(other) and self._values() == other._values()
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((type(self), self._values()))
+
+    def _values(self):
+        return tuple(getattr(self, f) for f in self._fields)
+
     def __contains__(self, key):
         return key in self._fields
 
@@ -141,24 +366,45 @@ class StructTupleMeta(type):
 
 
 class Container(ExportableObject, abc.ABC):
+    # The default alignment of this type of container when searching a file,
+    # can be overridden when scanning
+    alignment = 4
+
+    # If the container header starts with a fixed value the value is used to
+    # quickly find possible container offsets
+    magic = None
+
+    # The image address index built by map_images_by_addr(), empty until the
+    # container has images
+    _image_addrs = ((), (), (), (), (), ())
+
     @classmethod
     @abc.abstractmethod
     def is_container(cls, data, offset, verbose=False):
         raise NotImplementedError
 
-    def __init__(self, data=None, offset=0, export_images=False, verbose=False, **kwargs):
+    def __init__(self, data=None, offset=0, export_images=False, verbose=False, image_filter=None, **kwargs):
         assert data or kwargs
 
         # This option defines whether or not any "images" are included in a yaml
         # export
         self._export_images = export_images
 
+        # If a blob store is set the image contents are exported to the store
+        # and only a reference to the contents is included in the results
+        self._blob_store = None
+
+        # If an image filter is set only the images that match the filter are
+        # exported, the contents of other images aren't read from the data
+        self._image_filter = image_filter
+
         self._verbose = verbose
         self.offset = offset
         self.images = []
 
         if data is not None:
             self.init_from_data(data, offset)
+            self.load_images(data)
         else:
             # Recreating a loaded object, probably from a scan results file.
             # each key=value pair is an attribute and value that should be set
@@ -193,12 +439,109 @@ class Container(ExportableObject, abc.ABC):
     def export_images(self, value):
         self._export_images = value
 
+    @property
+    def blob_store(self):
+        return getattr(self, '_blob_store', None)
+
+    @blob_store.setter
+    def blob_store(self, value):
+        self._blob_store = value
+
+    @property
+    def image_filter(self):
+        return getattr(self, '_image_filter', None)
+
+    @image_filter.setter
+    def image_filter(self, value):
+        self._image_filter = value
+
+    def load_images(self, data):
+        # The parsers only identify the range of each image, the contents are
+        # set once the container has been parsed. If the data is read from a
+        # file (such as a memory mapped file) the contents are a reference to
+        # the range of the file instead of a copy. Images that don't match the
+        # image filter are not read.
+        image_data = getattr(data, 'image_data', None)
+        for img in self.images:
+            if img['data'] is not None or img['range'] is None:
+                continue
+            if self.image_filter and not self.image_filter.match(self, img):
+                continue
+            start, stop = img['range'].start, img['range'].stop
+            img['data'] = image_data(start, stop) if image_data is not None else data[start:stop]
+
+    def set_source(self, source):
+        # Replace any image contents that are an unmodified copy of part of the
+        # scanned file with a reference to that part of the file so the copy
+        # isn't kept in memory.
+        for img in self.images:
+            data = img['data']
+            if isinstance(data, bytes) and img['range'] is not None and \
+                    img['range'].step == 1 and len(data) == len(img['range']):
+                img['data'] = SourceData(source, img['range'].start, len(data))
+
+    def set_file_offsets(self, view):
+        # Containers found in a view of a file (such as the page data of a NAND
+        # dump) also record the offset in the file of the container and of
+        # each image. The offset is None if the data isn't stored in the file.
+        self.file_offset = view.file_offset(self.offset)
+        for img in self.images:
+            if img['offset'] is not None:
+                img['file_offset'] = view.file_offset(img['offset'])
+
+    def get_export_images(self):
+        # Returns the list of images that should be included in exported
+        # results
+        if self.blob_store is None and not self.export_images:
+            return []
+
+        images = self.images
+        if self.image_filter:
+            images = self.image_filter.select_images(self)
+
+        if self.blob_store is not None:
+            return [self.blob_store.put_image(img) for img in images]
+        else:
+            return images
+
     def get_yaml_attrs(self):
-        if self.export_images:
+        if self.export_images or self.blob_store is not None:
             return (k for k in vars(self).keys() if not k.startswith('_'))
         else:
             return (k for k in vars(self).keys() if not k.startswith('_') and k != 'images')
 
+    def get_yaml_value(self, attr):
+        if attr == 'images':
+            return self.get_export_images()
+        return getattr(self, attr)
+
+    def __getstate__(self):
+        # The image address map is recreated when the container is loaded
+        return dict((k, v) for k, v in vars(self).items() if k != '_image_addrs')
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.images:
+            self.map_images_by_addr()
+
+    def get_export_state(self):
+        # The state saved when the container is exported with an ExportPickler,
+        # this follows the same rules as the yaml export: images are only
+        # included if export_images (or a blob store) is set. The blob store
+        # and image filter only apply to this export and are not saved.
+        state = dict((k, v) for k, v in vars(self).items()
+                     if k not in ('_image_addrs', '_image_filter', '_blob_store'))
+        state['images'] = self.get_export_images()
+        return state
+
+    @classmethod
+    def validate(cls, data, offset):
+        # Called after is_container() has identified a probable container to
+        # check the rest of the container structure before the container is
+        # created. Returns the reason the container was rejected, or None if
+        # the container looks valid. This should not raise any exceptions.
+        return None
+
     @abc.abstractmethod
     def init_from_data(self, data, offset):
         raise NotImplementedError
@@ -207,32 +550,69 @@ class Container(ExportableObject, abc.ABC):
         # Any container-specific data processing should happen before this
         # function is called
 
-        # For ease of identifying which image belongs to which addresses, map
-        # them out now
-        self._image_addrs = {}
+        # For ease of identifying which image belongs to which addresses, build
+        # an index of the image ranges sorted by start address that can be
+        # searched with bisect. Image ranges may overlap or be interleaved so
+        # along with the start and stop of each image the largest stop address
+        # of all images that start at or before each image is saved. When
+        # images overlap the first image in the container is used, if images
+        # have the same range the last of those images is used.
+        by_range = {}
         for img in self.images:
-            if img['range'] is not None:
-                self._image_addrs[img['range']] = img
+            if img['range'] is not None and len(img['range']):
+                by_range[img['range']] = img
+        ranges = sorted((r.start, r.stop, order) for order, r in enumerate(by_range))
+        by_order = list(by_range.values())
+
+        starts = []
+        max_stops = []
+        orders = []
+        images = []
+        max_stop = None
+        for start, stop, order in ranges:
+            max_stop = stop if max_stop is None else max(max_stop, stop)
+            starts.append(start)
+            max_stops.append(max_stop)
+            orders.append(order)
+            images.append(by_order[order])
+
+        # Overlapping and adjacent ranges are also merged into the list of
+        # address ranges used by any image so the next free address can be
+        # found with one lookup
+        used_starts = []
+        used_stops = []
+        for start, stop, _ in ranges:
+            if used_stops and start <= used_stops[-1]:
+                used_stops[-1] = max(used_stops[-1], stop)
+            else:
+                used_starts.append(start)
+                used_stops.append(stop)
+
+        self._image_addrs = (starts, max_stops, orders, images, used_starts, used_stops)
 
     def find_image_by_addr(self, addr):
         # If the address provided is in the address range of one of the images
         # in this container, the image info is returned
-        for addr_range, img in self._image_addrs.items():
-            if addr in addr_range:
-                return img
-        return None
+        starts, max_stops, orders, images, _, _ = self._image_addrs
+
+        # Check the images that start at or before the address, stop once no
+        # earlier image could extend past the address.
+        found = None
+        i = bisect.bisect_right(starts, addr) - 1
+        while i >= 0 and max_stops[i] > addr:
+            if addr in images[i]['range'] and (found is None or orders[i] < orders[found]):
+                found = i
+            i -= 1
+        return images[found] if found is not None else None
 
     def find_next_addr(self, addr):
         # A utility to find the next address that is not in an image belonging
         # to this container
-        img = self.find_image_by_addr(addr)
-        if img is None:
-            return addr
-        else:
-            # Find the address that is at the end of the identified image, and
-            # ensure that doesn't match any other images in this container
-            next_addr = img['range'].stop
-            return self.find_next_addr(next_addr)
+        _, _, _, _, used_starts, used_stops = self._image_addrs
+        i = bisect.bisect_right(used_starts, addr) - 1
+        if i >= 0 and addr < used_stops[i]:
+            return used_stops[i]
+        return addr
 
     def __repr__(self):
         if hasattr(self, 'hdr'):
@@ -243,15 +623,65 @@ class Container(ExportableObject, abc.ABC):
         return f'{self.__class__.__name__}({param_str})'
 
     def __str__(self):
+        if getattr(self, 'file_offset', None) is not None:
+            return f'{self.offset:#08x} (file {self.file_offset:#08x}): {repr(self)}'
         return f'{self.offset:#08x}: {repr(self)}'
 
 
+class ExportPickler(pickle.Pickler):
+    # Pickles scan results that are being exported. Containers only include
+    # the images that should be exported (see Container.get_export_state())
+    # and image contents that refer to where they are stored (such as
+    # SourceData) are replaced by the contents.
+    #
+    # If out_of_band is set the image contents are saved as PickleBuffers, with
+    # a buffer_callback they are written outside of the pickle stream. Contents
+    # that are stored elsewhere (LazyBytes) are only read when the pickler
+    # reaches them, so a callback that writes and releases each buffer only
+    # holds one image in memory at a time.
+    def __init__(self, file, out_of_band=False, **kwargs):
+        super().__init__(file, protocol=5, **kwargs)
+        self.out_of_band = out_of_band
+
+    def reducer_override(self, obj):
+        if isinstance(obj, Container):
+            state = obj.get_export_state()
+            if self.out_of_band and state['images']:
+                images = []
+                for img in state['images']:
+                    # Contents that are already in memory don't need to be
+                    # read, they are wrapped here because the pickler doesn't
+                    # call reducer_override() for bytes
+                    if isinstance(img['data'], bytes):
+                        img = img.copy()
+                        img['data'] = pickle.PickleBuffer(img['data'])
+                    images.append(img)
+                state['images'] = images
+            return (copyreg.__newobj__, (obj.__class__,), state)
+        elif isinstance(obj, LazyBytes) and obj.export_contents:
+            if self.out_of_band:
+                return (_out_of_band_data, (pickle.PickleBuffer(obj.resolve()),))
+            return (bytes, (obj.resolve(),))
+        return NotImplemented
+
+
+def _out_of_band_data(data):
+    # Image contents that were saved out-of-band are loaded as whatever object
+    # the buffer is provided as, such as bytes or the lazily read IndexedData
+    return data
+
+
 __all__ = [
     'classproperty',
     'ExportableIntEnum',
     'ExportableIntFlag',
     'ExportableObject',
+    'LazyBytes',
+    'SourceData',
+    'Image',
+    'unpack_from',
     'StructTuple',
     'StructTupleMeta',
     'Container',
+    'ExportPickler',
 ]
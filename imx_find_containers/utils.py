@@ -2,14 +2,22 @@ import re
 import os
 import enum
 import time
-import functools
-import operator
-import copy
+import stat
+import struct
+import fnmatch
+import collections.abc
 
 # pickle is the backup results saving option
 import pickle
 
-from .types import Container, StructTuple
+from .types import Container, StructTuple, ExportPickler
+from . import blobs
+from . import indexed
+
+# The find, extract, filters, json, sqlite and archives modules are imported by
+# the functions that use them. They import modules that are slow to load
+# (sqlite3, tarfile, zipfile, concurrent.futures), and the container classes
+# that find imports use this module.
 
 # YAML results saving utilities
 from .yaml import *
@@ -28,29 +36,65 @@ def enum_or_int(enum_type, num):
         return num
 
 
+def is_enum_value(enum_type, num):
+    # Check if a value is valid for an enum without raising an exception
+    return num in enum_type._value2member_map_
+
+
 def now():
     # return an ISO 8601 formatted date string
     # 2019-07-18T02:28:16+00:00
     return time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime())
 
 
-def _write_pickle(filename, results, include_image_contents=False):
-    # If include_image_contents is not set, make a duplicate of the results but 
-    # delete the images and _image_addrs from the copy
-    if not include_image_contents:
-        export_results = copy.deepcopy(results)
-        for container, _ in get_containers_from_results(export_results):
-            if hasattr(container, '_image_addrs'):
-                container._image_addrs = {}
-            if hasattr(container, 'images'):
-                container.images = []
-    else:
-        export_results = results
+# Identifies a pickle results file where the image contents are saved as
+# out-of-band buffers after the header
+PICKLE_OOB_MAGIC = 'imx_find_containers.pickle-oob.2'
+_pickle_trailer = struct.Struct('<Q')
+
 
+def _write_pickle(filename, results, include_image_contents=False, **kwargs):
+    # The containers only include images in the pickled results if the
+    # export_images (or blob_store) attributes are set, the ExportPickler
+    # applies this while pickling so no copy of the results needs to be made
+    # here.
     full_filename = f'{filename}.pickle'
     print(f'Saving scan results: {full_filename}')
     with open(full_filename, 'wb') as f:
-        pickle.dump(export_results, f)
+        if include_image_contents:
+            import shutil
+            import tempfile
+
+            # Save the image contents as out-of-band buffers, each image is
+            # written to the file as soon as it is pickled and then released
+            # so only one image is held in memory at a time. The pickled
+            # results are written to a temporary file until all images have
+            # been written. The file contains:
+            #   pickled header
+            #   image contents
+            #   pickled results
+            #   pickled (buffer lengths, results offset)
+            #   trailer: offset of the buffer lengths
+            pickle.dump((PICKLE_OOB_MAGIC,), f, protocol=5)
+            buffer_lens = []
+
+            def write_buffer(buf):
+                with buf.raw() as raw:
+                    f.write(raw)
+                    buffer_lens.append(raw.nbytes)
+                buf.release()
+
+            with tempfile.TemporaryFile() as export_results:
+                ExportPickler(export_results, out_of_band=True, buffer_callback=write_buffer).dump(results)
+                results_offset = f.tell()
+                export_results.seek(0)
+                shutil.copyfileobj(export_results, f)
+
+            lens_offset = f.tell()
+            pickle.dump((buffer_lens, results_offset), f, protocol=5)
+            f.write(_pickle_trailer.pack(lens_offset))
+        else:
+            ExportPickler(f).dump(results)
 
     # Return the filename
     return full_filename
@@ -58,58 +102,112 @@ def _write_pickle(filename, results, include_image_contents=False):
 
 def _open_pickle(filename):
     with open(filename, 'rb') as f:
-        return pickle.load(f)
+        results = pickle.load(f)
 
+        if isinstance(results, tuple) and results and results[0] == PICKLE_OOB_MAGIC:
+            buffers_offset = f.tell()
+            f.seek(-_pickle_trailer.size, os.SEEK_END)
+            lens_offset, = _pickle_trailer.unpack(f.read(_pickle_trailer.size))
+            f.seek(lens_offset)
+            buffer_lens, results_offset = pickle.load(f)
 
-def open_results(filename, output_format=None):
-    # The results being opened may be a yaml or a pickle
-    try:
-        return _open_pickle(filename)
-    except pickle.UnpicklingError:
-        yaml_avail = get_yaml_modules_available()
-        assert yaml_avail
+            f.seek(buffers_offset)
+            buffers = [f.read(size) for size in buffer_lens]
+            f.seek(results_offset)
+            results = pickle.load(f, buffers=buffers)
+
+        return results
+
+
+def _is_pickle(filename):
+    # Pickles written with protocol 2 or newer start with the PROTO opcode
+    with open(filename, 'rb') as f:
+        return f.read(1) == pickle.PROTO
+
+
+def _open_results(filename, output_format=None):
+    from . import json
 
+    # The results being opened may be indexed, JSON, a yaml or a pickle
+    if indexed.is_indexed(filename):
+        return indexed.load(filename)
+    elif json.is_json(filename):
+        return json.JsonIface().open(filename)
+    elif _is_pickle(filename):
+        return _open_pickle(filename)
+    else:
         # Use the output_format to allow selection of which YAML module to use 
         # if there is a choice
-        if output_format is not None:
-            assert output_format in yaml_avail
-            return yaml_avail[output_format].open(filename)
-        else:
-            return yaml_avail['yaml'].open(filename)
+        if output_format is None:
+            output_format = 'yaml'
+        yaml_iface = get_yaml_module(output_format)
+        assert yaml_iface is not None
+        return yaml_iface.open(filename)
+
+
+def open_results(filename, output_format=None, blob_store=None):
+    # Any image contents that were saved to a blob store are loaded from the
+    # store when they are accessed. By default the blob store is expected to
+    # be next to the results file.
+    if blob_store is None:
+        blob_store = os.path.join(os.path.dirname(filename), blobs.DEFAULT_BLOB_DIR)
+    if isinstance(blob_store, str):
+        blob_store = blobs.BlobStore(blob_store)
+
+    with blobs.using_store(blob_store):
+        return _open_results(filename, output_format)
 
 
 def _path_to_filename(path):
+    # Results for stdin are saved with the name "-"
+    if path == '-':
+        return 'stdin'
     filename = re.sub(r'/', '_', path)
     # Remove any leading '._' string if it is present
     filename = filename.lstrip('._')
     return filename
 
 
-def container_save_images(container, prefix):
+def _image_filename(img, prefix):
+    offset = img['offset']
+    if 'fileext' in img:
+        return f'{prefix}-{offset:x}.{img["fileext"]}'
+    else:
+        return f'{prefix}-{offset:x}.bin'
+
+
+def container_save_images(container, prefix, pool=None, source=None, image_filter=None):
+    from . import extract
+
     if hasattr(container, 'images') and container.images is not None:
-        for img in container.images:
-            print(list(img.keys()))
+        images = container.images
+        if image_filter:
+            # Images that don't match the filter are skipped before their
+            # contents are accessed
+            images = image_filter.select_images(container)
+
+        for img in images:
             if img['data'] is not None:
-                offset = img['offset']
-                if 'fileext' in img:
-                    imgfilename = f'{prefix}-{offset:x}.{img["fileext"]}'
-                else:
-                    imgfilename = f'{prefix}-{offset:x}.bin'
+                imgfilename = _image_filename(img, prefix)
 
                 # Handle writing out bytes or strings as determined by the 
-                # image type
-                print(f'Exporting image: {imgfilename}')
-                if isinstance(img['data'], bytes):
-                    with open(imgfilename, 'wb') as f:
-                        f.write(img['data'])
+                # image type, images that are part of the scanned file are
+                # copied directly from that file.
+                if pool is not None:
+                    pool.submit(img['data'], imgfilename,
+                            source=source,
+                            offset=img['offset'],
+                            container=container.__class__.__name__,
+                            container_offset=container.offset)
                 else:
-                    with open(imgfilename, 'w') as f:
-                        f.write(img['data'])
+                    print(f'Exporting image: {imgfilename}')
+                    extract.write_image(img['data'], imgfilename)
 
 
-def get_containers_from_results(results):
-    # The results may be a dictionary, list, or single Container
-    if isinstance(results, dict):
+def _get_sources_from_results(results):
+    # The results may be a dictionary, list, or single Container, returns a
+    # list of (source filename, container) pairs
+    if isinstance(results, collections.abc.Mapping):
         # In this format the dict key is the filename that the data was 
         # extracted from and the value is a list of containers
         # TODO: someday I really should just use type annotations
@@ -121,88 +219,227 @@ def get_containers_from_results(results):
 
         # In this format the key should be the source filename.
         # flatten the lists out
-        containers = functools.reduce(operator.iconcat, \
-                (((c, _path_to_filename(f)) for c in r) \
-                for f, r in results.items()), [])
-        return containers
+        return [(f, c) for f, r in results.items() for c in r]
 
     elif hasattr(results, '__iter__'):
-        # Filename is unknown, use a placeholder prefix
-        prefix = _path_to_filename('unknown')
+        # Filename is unknown, use a placeholder
+        results = list(results)
 
         if all(isinstance(r, Container) for r in results):
-            containers = ((r, prefix) for r in results)
-            return containers
+            return [('unknown', r) for r in results]
 
         elif all(hasattr(r, '__iter__') and \
                 all(isinstance(c, Container) for c in r) \
                 for r in results):
-            containers = itertools.chain( \
-                    ((c, prefix) for c in r) \
-                    for r in results)
-            return containers
+            return [('unknown', c) for r in results for c in r]
 
     elif isinstance(results, Container):
-        # Filename is unknown, use a placeholder prefix
-        prefix = _path_to_filename('unknown')
-
-        containers = list((results, prefix))
-        return containers
+        # Filename is unknown, use a placeholder
+        return [('unknown', results)]
 
     raise Exception(f'Unknown results format')
 
 
-def save_images(results):
-    containers = get_containers_from_results(results)
-    for container, prefix in containers:
-        container_save_images(container, prefix)
+def _get_results_by_file(results):
+    # Returns a list of (source filename, list of containers) pairs
+    by_file = {}
+    for f, c in _get_sources_from_results(results):
+        by_file.setdefault(f, []).append(c)
+    return list(by_file.items())
+
+
+def get_containers_from_results(results):
+    # Returns a list of (container, filename prefix) pairs
+    return [(c, _path_to_filename(f)) for f, c in _get_sources_from_results(results)]
+
+
+def save_images(results, manifest=None, extract_workers=None, extract_archive=None, image_filter=None, **kwargs):
+    from . import extract
+
+    # The images are written by a pool of threads, or into a single archive if
+    # an archive filename is provided. If a manifest filename is provided the
+    # size and SHA-256 digest of each image are recorded in the manifest as the
+    # images are written.
+    #
+    # extract_archive may also be an ArchiveWriter that images were added to
+    # while scanning, images that are already in the archive are skipped.
+    if isinstance(extract_archive, extract.ArchiveWriter):
+        pool = extract_archive
+        pool.manifest = manifest
+    elif extract_archive:
+        pool = extract.ArchiveWriter(extract_archive, manifest)
+    else:
+        pool = extract.ExtractionPool(extract_workers, manifest)
 
+    with pool:
+        for source, container in _get_sources_from_results(results):
+            container_save_images(container, _path_to_filename(source), pool=pool,
+                    source=source, image_filter=image_filter)
+
+
+def save_results(results, output_format=None, include_image_contents=False, extract=False, extract_archive=None, blob_store=None, database=None, image_filter=None, **kwargs):
+    from . import filters
+    from . import json
+    from . import sqlite
 
-def save_results(results, output_format=None, include_image_contents=False, extract=False, **kwargs):
     # First save the overall results
     export_filename = time.strftime("scan_results.%Y-%m-%dT%H:%M:%S%z", time.localtime())
 
+    # Lazily loaded results need to be converted to a normal dictionary before
+    # they can be saved again
+    if isinstance(results, collections.abc.Mapping) and not isinstance(results, dict):
+        results = dict(results.items())
+
+    # The image filter may be a list of filter expressions, only the containers
+    # and images that match the filter are saved or extracted
+    if image_filter is not None and not isinstance(image_filter, filters.ImageFilter):
+        image_filter = filters.ImageFilter(image_filter)
+    if image_filter:
+        results = dict((f, image_filter.select_containers(r)) for f, r in _get_results_by_file(results))
+        results = dict((f, r) for f, r in results.items() if r)
+
+    # If a blob store is specified the image contents are written to the store
+    # and the results only contain the digest and length of each image
+    if isinstance(blob_store, str):
+        blob_store = blobs.BlobStore(blob_store)
+
     # Update the export_images flag in each container to indicate if they should 
     # be included in any exported results or not
     containers = get_containers_from_results(results)
     for container, _ in containers:
         container.export_images = include_image_contents
+        container.blob_store = blob_store
+        container.image_filter = image_filter
 
-    yaml_avail = get_yaml_modules_available()
-
+    # The yaml modules are only imported if the results are saved as yaml
     if output_format == 'auto':
-        if yaml_avail:
-            yaml_avail['yaml'].write(export_filename, results)
+        yaml_iface = get_yaml_module('yaml')
+        if yaml_iface is not None:
+            yaml_iface.write(export_filename, results)
         else:
             _write_pickle(export_filename, results, include_image_contents)
     elif output_format == 'pickle':
         _write_pickle(export_filename, results, include_image_contents)
+    elif output_format == 'json':
+        json.JsonIface().write(export_filename, results)
+    elif output_format == 'indexed':
+        indexed.write(export_filename, results)
+    elif output_format == 'sqlite':
+        # The SQLite database is not timestamped, new results are added to the
+        # existing database
+        if database is None:
+            database = sqlite.DEFAULT_DATABASE
+        sqlite.write(database, results, scanned=now())
     else:
         # All other options should be in the yaml modules, if it isn't there 
         # throw an error
-        assert output_format in yaml_avail
-        yaml_avail[output_format].write(export_filename, results)
+        yaml_iface = get_yaml_module(output_format)
+        assert yaml_iface is not None
+        yaml_iface.write(export_filename, results)
 
-    if extract:
+    if extract or extract_archive:
         # Now export any image files found binwalk-style
-        for container, prefix in containers:
-            container_save_images(container, prefix)
+        save_images(results, manifest=f'{export_filename}.manifest.json',
+                extract_archive=extract_archive, image_filter=image_filter, **kwargs)
 
     # Return the filename the results were saved to
     return
 
 
-def find_files(path):
+def _match_globs(path, patterns):
+    # Patterns are matched against the file name and the full path
+    name = os.path.basename(path)
+    return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(path, p) for p in patterns)
+
+
+def _find_archive_files(path, include=None, exclude=None, min_size=0):
+    from . import archives as _archives
+
+    # Yields the files inside of an archive as the archive is read, in the
+    # order they are stored, so each file can be scanned before the next one is
+    # listed
     try:
-        file_list = []
-        for item in os.scandir(path):
-            if item.is_file():
-                file_list.append(item.path)
-            elif item.is_dir():
-                file_list.extend(recursive_scandir(item.path))
-        return file_list
-    except NotADirectoryError:
-        return [path]
+        for member, size in _archives.iter_members(path):
+            if size < min_size:
+                continue
+            if exclude and _match_globs(member, exclude):
+                continue
+            if not include or _match_globs(member, include):
+                yield member
+    except _archives.ArchiveErrors as e:
+        print(f'Unable to read archive {path}: {e}')
+
+
+def find_files(path, include=None, exclude=None, min_size=None, archives=False):
+    # Yields the files to scan as they are found. Directories are walked
+    # depth-first without recursion, files and directories are only visited
+    # once even if they are reachable through hardlinks or symlinks (which also
+    # prevents symlink loops). Files smaller than the smallest container header
+    # are skipped.
+    #
+    # If include glob patterns are provided only files that match one of them
+    # are returned, files and directories that match an exclude pattern are
+    # skipped.
+    #
+    # If archives is set the files inside of zip and tar archives are returned
+    # instead of the archive, see archives.SEPARATOR for the format of these
+    # paths. The include and exclude patterns are matched against the paths
+    # of the files in the archive.
+    from . import find
+    from . import archives as _archives
+
+    if isinstance(include, str):
+        include = [include]
+    if isinstance(exclude, str):
+        exclude = [exclude]
+    if min_size is None:
+        min_size = find.MIN_HEADER_SIZE
+
+    if not os.path.isdir(path):
+        if archives and os.path.isfile(path) and _archives.is_archive(path):
+            yield from _find_archive_files(path, include, exclude, min_size)
+        else:
+            yield path
+        return
+
+    st = os.stat(path)
+    seen = {(st.st_dev, st.st_ino)}
+    dirs = [path]
+    while dirs:
+        dirpath = dirs.pop()
+        try:
+            with os.scandir(dirpath) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            print(f'Unable to search {dirpath}: {e}')
+            continue
+
+        subdirs = []
+        for entry in entries:
+            try:
+                st = entry.stat()
+            except OSError:
+                # Broken symlink or the file was removed
+                continue
+
+            key = (st.st_dev, st.st_ino)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            if exclude and _match_globs(entry.path, exclude):
+                continue
+
+            if stat.S_ISDIR(st.st_mode):
+                subdirs.append(entry.path)
+            elif archives and stat.S_ISREG(st.st_mode) and _archives.is_archive(entry.path):
+                yield from _find_archive_files(entry.path, include, exclude, min_size)
+            elif stat.S_ISREG(st.st_mode) and st.st_size >= min_size:
+                if not include or _match_globs(entry.path, include):
+                    yield entry.path
+
+        # Visit the subdirectories in order
+        dirs.extend(reversed(subdirs))
 
 
 # Internal testing utilities
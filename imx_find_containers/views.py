@@ -0,0 +1,305 @@
+import bisect
+import enum
+import struct
+
+from .types import StructTupleMeta
+
+
+class DataView:
+    # Base class for data that is searched for containers through a view that
+    # maps the offsets used by the containers (logical offsets) to the file
+    # being scanned. Views support the same random access interface as a
+    # memory mapped file: len(), integer and slice indexing, find() and an
+    # unpack_from() used by types.unpack_from().
+    #
+    # Subclasses implement _read() and may provide the list of stored ranges,
+    # logical address ranges that aren't stored (such as the fill chunks of a
+    # sparse image) are not searched.
+
+    # The amount of data that find() searches at a time
+    _find_size = 0x100000
+
+    def __init__(self, filename):
+        # The file is read through the block cache of an OpenedFile
+        from .find import OpenedFile
+
+        self.filename = filename
+        self._file = OpenedFile(filename)
+        self._size = 0
+
+        # Sorted, non-overlapping (start, stop) logical address ranges that
+        # hold data from the file
+        self._stored = []
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if getattr(self, '_file', None) is not None:
+            self._file.close()
+            self._file = None
+
+    def _pread(self, offset, length):
+        # Read from the file being scanned
+        return self._file[offset:offset + length]
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return self._size
+
+    def _read(self, offset, length):
+        raise NotImplementedError
+
+    def file_offset(self, offset):
+        # Returns the offset in the file of the data at a logical offset, or
+        # None if the data isn't stored in the file
+        raise NotImplementedError
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._size)
+            if step == 1:
+                return self._read(start, max(stop - start, 0))
+
+            # Read all of the data between the first and last index
+            indexes = range(start, stop, step)
+            if not indexes:
+                return b''
+            low = min(indexes[0], indexes[-1])
+            data = self._read(low, abs(indexes[-1] - indexes[0]) + 1)
+            return data[indexes[0] - low::step][:len(indexes)]
+
+        if key < 0:
+            key += self._size
+        if not 0 <= key < self._size:
+            raise IndexError('index out of range')
+        return self._read(key, 1)[0]
+
+    def unpack_from(self, fmt, offset=0):
+        return fmt.unpack(self._read(offset, fmt.size))
+
+    def next_data_offset(self, offset):
+        # Returns the first offset at or after the specified offset that holds
+        # data from the file, or the size of the view if there isn't any more
+        # stored data.
+        i = bisect.bisect_right(self._stored, (offset, self._size + 1)) - 1
+        if i >= 0 and offset < self._stored[i][1]:
+            return offset
+        elif i + 1 < len(self._stored):
+            return self._stored[i + 1][0]
+        return self._size
+
+    def find(self, sub, start=0, end=None):
+        # Only the stored ranges are searched
+        if end is None or end > self._size:
+            end = self._size
+        offset = max(start, 0)
+        while offset + len(sub) <= end:
+            offset = self.next_data_offset(offset)
+            i = bisect.bisect_right(self._stored, (offset, self._size + 1)) - 1
+            if i < 0 or offset >= end:
+                break
+            stop = min(self._stored[i][1], end)
+            while offset + len(sub) <= stop:
+                chunk_end = min(offset + self._find_size, stop)
+                chunk = self._read(offset, min(chunk_end + len(sub) - 1, stop) - offset)
+                found = chunk.find(sub)
+                if found >= 0:
+                    return offset + found
+                offset = chunk_end
+            offset = max(offset, stop)
+        return -1
+
+
+# Android sparse image format, see system/core/libsparse/sparse_format.h
+SPARSE_HEADER_MAGIC = 0xED26FF3A
+SPARSE_MAJOR_VERSION = 1
+
+
+class SparseHeader(metaclass=StructTupleMeta):
+    fmt = '<IHHHHIIII'
+    fields = [
+        'magic', 'major_version', 'minor_version', 'file_hdr_sz', 'chunk_hdr_sz', 'blk_sz', 'total_blks',
+        'total_chunks', 'image_checksum',
+    ]
+
+
+class SparseChunkHeader(metaclass=StructTupleMeta):
+    fmt = '<HHII'
+    fields = [
+        'chunk_type', 'reserved1', 'chunk_sz', 'total_sz',
+    ]
+
+
+class SparseChunkType(enum.IntEnum):
+    RAW = 0xCAC1
+    FILL = 0xCAC2
+    DONT_CARE = 0xCAC3
+    CRC32 = 0xCAC4
+
+
+_magic = struct.Struct('<I')
+
+
+def is_sparse(filename):
+    with open(filename, 'rb') as f:
+        data = f.read(_magic.size)
+    return len(data) == _magic.size and _magic.unpack(data)[0] == SPARSE_HEADER_MAGIC
+
+
+class SparseFile(DataView):
+    # Expanded view of an Android sparse image. The chunk table is parsed when
+    # the file is opened, the data of RAW chunks is read from the file when it
+    # is accessed. FILL chunks are the fill value repeated and DONT_CARE chunks
+    # are zeros, but neither is searched for containers. All offsets are
+    # offsets in the expanded image.
+    def __init__(self, filename):
+        super().__init__(filename)
+
+        self.hdr = SparseHeader(self._pread(0, SparseHeader.size))
+        assert self.hdr.magic == SPARSE_HEADER_MAGIC
+        assert self.hdr.major_version == SPARSE_MAJOR_VERSION
+        assert self.hdr.file_hdr_sz >= SparseHeader.size
+        assert self.hdr.chunk_hdr_sz >= SparseChunkHeader.size
+        assert self.hdr.blk_sz > 0 and self.hdr.blk_sz % 4 == 0
+
+        # The logical start offset of each chunk, and the chunk type and either
+        # the offset of the chunk data in the file or the fill value
+        self._starts = []
+        self._chunks = []
+
+        file_offset = self.hdr.file_hdr_sz
+        offset = 0
+        for _ in range(self.hdr.total_chunks):
+            chunk = SparseChunkHeader(self._pread(file_offset, SparseChunkHeader.size))
+            data_offset = file_offset + self.hdr.chunk_hdr_sz
+            data_size = chunk.total_sz - self.hdr.chunk_hdr_sz
+            length = chunk.chunk_sz * self.hdr.blk_sz
+
+            if chunk.chunk_type == SparseChunkType.RAW:
+                assert data_size == length
+                self._add_chunk(offset, length, chunk.chunk_type, data_offset)
+                if self._stored and self._stored[-1][1] == offset:
+                    self._stored[-1] = (self._stored[-1][0], offset + length)
+                else:
+                    self._stored.append((offset, offset + length))
+            elif chunk.chunk_type == SparseChunkType.FILL:
+                assert data_size == 4
+                self._add_chunk(offset, length, chunk.chunk_type, self._pread(data_offset, 4))
+            elif chunk.chunk_type == SparseChunkType.DONT_CARE:
+                self._add_chunk(offset, length, chunk.chunk_type, None)
+            else:
+                # CRC32 chunks don't hold any data
+                assert chunk.chunk_type == SparseChunkType.CRC32
+
+            file_offset += chunk.total_sz
+            offset += length
+
+        assert offset == self.hdr.total_blks * self.hdr.blk_sz
+        self._size = offset
+
+    def _add_chunk(self, offset, length, chunk_type, value):
+        if length:
+            self._starts.append(offset)
+            self._chunks.append((offset + length, chunk_type, value))
+
+    def _read(self, offset, length):
+        end = min(offset + length, self._size)
+        if offset < 0 or offset >= end:
+            return b''
+
+        parts = []
+        i = bisect.bisect_right(self._starts, offset) - 1
+        while offset < end:
+            chunk_start = self._starts[i]
+            chunk_end, chunk_type, value = self._chunks[i]
+            part_end = min(chunk_end, end)
+            if chunk_type == SparseChunkType.RAW:
+                parts.append(self._pread(value + (offset - chunk_start), part_end - offset))
+            elif chunk_type == SparseChunkType.FILL:
+                # The fill value is repeated from the start of the chunk
+                skip = (offset - chunk_start) % 4
+                count = (part_end - offset + skip + 3) // 4
+                parts.append((value * count)[skip:skip + part_end - offset])
+            else:
+                parts.append(bytes(part_end - offset))
+            offset = part_end
+            i += 1
+
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+
+    def file_offset(self, offset):
+        i = bisect.bisect_right(self._starts, offset) - 1
+        if i < 0 or offset >= self._size:
+            return None
+        chunk_end, chunk_type, value = self._chunks[i]
+        if chunk_type != SparseChunkType.RAW:
+            return None
+        return value + (offset - self._starts[i])
+
+
+def parse_nand_geometry(arg):
+    # argparse type for "page+oob" NAND geometry arguments such as "2048+64"
+    page_size, sep, oob_size = arg.partition('+')
+    if not sep:
+        raise ValueError(f'invalid NAND geometry: {arg}')
+    page_size, oob_size = int(page_size, 0), int(oob_size, 0)
+    if page_size <= 0 or oob_size < 0:
+        raise ValueError(f'invalid NAND geometry: {arg}')
+    return (page_size, oob_size)
+
+
+class NandFile(DataView):
+    # View of a raw NAND dump where each page of data is followed by the OOB
+    # (spare) bytes of that page, such as 2048+64 or 4096+224. The view only
+    # contains the page data so containers that span pages are contiguous.
+    # Logical offsets are offsets in the page data.
+    def __init__(self, filename, page_size, oob_size):
+        super().__init__(filename)
+        self.page_size = page_size
+        self.oob_size = oob_size
+        self._raw_page_size = page_size + oob_size
+
+        # A partial page at the end of the dump is included
+        pages, remainder = divmod(len(self._file), self._raw_page_size)
+        self._size = pages * page_size + min(remainder, page_size)
+        self._stored = [(0, self._size)]
+
+    def _read(self, offset, length):
+        end = min(offset + length, self._size)
+        if offset < 0 or offset >= end:
+            return b''
+
+        parts = []
+        while offset < end:
+            page, start = divmod(offset, self.page_size)
+            part_end = min(offset - start + self.page_size, end)
+            raw_offset = page * self._raw_page_size + start
+            parts.append(self._pread(raw_offset, part_end - offset))
+            offset = part_end
+
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+
+    def file_offset(self, offset):
+        if not 0 <= offset < self._size:
+            return None
+        page, start = divmod(offset, self.page_size)
+        return page * self._raw_page_size + start
+
+
+__all__ = [
+    'DataView',
+    'SparseFile',
+    'NandFile',
+    'is_sparse',
+    'parse_nand_geometry',
+]
@@ -1,7 +1,10 @@
 import abc
 import functools
+from . import types
 from . import imx
 from . import fit
+from . import blobs
+from . import indexed
 
 
 # Initialize module YAML variables
@@ -12,12 +15,21 @@ _write_yaml = None
 
 
 def find_types_with_custom_yaml_repr():
+    # Get custom types from the base types module
+    typ_list = [t for t in (getattr(types, a) for a in types.__all__) if hasattr(t, 'yaml_tag')]
+
     # Get custom types from the iMX module
-    typ_list = [t for t in (getattr(imx, a) for a in dir(imx)) if hasattr(t, 'yaml_tag')]
+    typ_list += [t for t in (getattr(imx, a) for a in dir(imx)) if hasattr(t, 'yaml_tag')]
 
     # Get custom types from the FIT module
     typ_list += [t for t in (getattr(fit, a) for a in dir(fit)) if hasattr(t, 'yaml_tag')]
 
+    # Get custom types from the blob store module
+    typ_list += [t for t in (getattr(blobs, a) for a in dir(blobs)) if hasattr(t, 'yaml_tag')]
+
+    # Get custom types from the indexed results module
+    typ_list += [t for t in (getattr(indexed, a) for a in dir(indexed)) if hasattr(t, 'yaml_tag')]
+
     return typ_list
 
 
@@ -146,16 +158,51 @@ modules = {
 # Caching available yaml modules
 available_modules = None
 
+# Interfaces that have been created by get_yaml_module(), None indicates the
+# module isn't available
+_ifaces = {}
+
+
+def get_yaml_module(name='yaml'):
+    # Returns the interface for a yaml module, or None if the module isn't
+    # available. The interface (and the yaml module) is only created the first
+    # time it is used. The name "yaml" returns the first available module.
+    if name == 'yaml':
+        for module_name in modules:
+            iface = get_yaml_module(module_name)
+            if iface is not None:
+                return iface
+        return None
+
+    if name not in modules:
+        return None
+    elif name not in _ifaces:
+        if available_modules is not None:
+            _ifaces[name] = available_modules.get(name)
+        else:
+            try:
+                _ifaces[name] = modules[name]()
+            except ImportError:
+                _ifaces[name] = None
+    return _ifaces[name]
+
 
 def get_yaml_modules_available():
+    # Creates the interfaces for all of the yaml modules, get_yaml_module()
+    # should be used instead if only one module is needed
     global available_modules, modules
     if available_modules is None:
         available_modules = {}
         for name, iface in modules.items():
-            try:
-                available_modules[name] = iface()
-            except ImportError:
-                pass
+            if name in _ifaces:
+                iface = _ifaces[name]
+            else:
+                try:
+                    iface = iface()
+                except ImportError:
+                    iface = None
+            if iface is not None:
+                available_modules[name] = iface
 
         # If at least one YAML interface was created assign the first one to the 
         # generic "yaml" output format
@@ -167,5 +214,6 @@ def get_yaml_modules_available():
 
 
 __all__ = [
+    'get_yaml_module',
     'get_yaml_modules_available',
 ]
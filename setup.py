@@ -17,7 +17,11 @@ setup(
     packages=find_packages(),
 
     entry_points={
-        'console_scripts': ['imx_find_containers=imx_find_containers:main']
+        'console_scripts': [
+            'imx_find_containers=imx_find_containers:main',
+            'imx_query_results=imx_find_containers.sqlite:main',
+            'imx_find_containers_client=imx_find_containers.client:main',
+        ]
     },
     install_requires=required,
     extras_require={
@@ -0,0 +1,62 @@
+import random
+
+from imx_find_containers.imx.types import ContainerHeader, ImageHeader, HeaderTag, ImageType, CoreType
+
+
+# Test data with one i.MX container. The images are (offset from the container,
+# size, type, core) and the image contents are pseudo-random so they don't
+# look like container headers.
+CONTAINER_OFFSET = 0x400
+IMAGES = [
+    (0x1000, 0x800, ImageType.EXE, CoreType.A53),
+    (0x2000, 0x400, ImageType.DATA, CoreType.A72),
+    (0x3000, 0x1000, ImageType.EXE, CoreType.A72),
+]
+DATA_SIZE = 0x8000
+
+
+def container_header(images, tag=HeaderTag.CONTAINER, flags=0, sig_offset=0):
+    length = ContainerHeader.size + len(images) * ImageHeader.size
+    data = ContainerHeader._struct.pack(0, length, tag, flags, 0, 0, len(images), sig_offset)
+    for offset, size, img_type, core in images:
+        img_flags = img_type | (core << 4)
+        data += ImageHeader._struct.pack(offset, size, 0, 0, img_flags, 0, bytes(64), bytes(32))
+    return data
+
+
+def make_data(size=DATA_SIZE, offset=CONTAINER_OFFSET, images=IMAGES, seed=0):
+    # Returns the data and the absolute range of each image, if the size is
+    # too small the data is truncated
+    rand = random.Random(seed)
+    data = bytearray(b'\xff' * size)
+    hdr = container_header(images)
+    data[offset:offset + len(hdr)] = hdr
+
+    ranges = []
+    for img_offset, img_size, _, _ in images:
+        start = offset + img_offset
+        data[start:start + img_size] = rand.randbytes(img_size)
+        ranges.append(range(start, start + img_size))
+    return bytes(data[:size]), ranges
+
+
+def write_data(path, **kwargs):
+    data, ranges = make_data(**kwargs)
+    path.write_bytes(data)
+    return data, ranges
+
+
+def write_containers(path, count=2, size=DATA_SIZE, **kwargs):
+    # Writes count copies of the test data with different image contents, one
+    # after another. Returns the data, the offset of each container and the
+    # absolute range of each image in each container.
+    data = b''
+    offsets = []
+    ranges = []
+    for seed in range(count):
+        part, part_ranges = make_data(size=size, seed=seed, **kwargs)
+        offsets.append(len(data) + kwargs.get('offset', CONTAINER_OFFSET))
+        ranges.append([range(r.start + len(data), r.stop + len(data)) for r in part_ranges])
+        data += part
+    path.write_bytes(data)
+    return data, offsets, ranges
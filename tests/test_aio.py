@@ -0,0 +1,90 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from imx_find_containers import aio
+from imx_find_containers import find
+
+from imx_data import write_containers
+
+
+@pytest.fixture
+def two_containers(tmp_path):
+    path = tmp_path / 'data.bin'
+    _, offsets, _ = write_containers(path)
+    return str(path), offsets
+
+
+def test_scan_file_async(two_containers):
+    path, offsets = two_containers
+    containers = asyncio.run(aio.scan_file_async(path))
+    assert [c.offset for c in containers] == offsets
+
+
+def test_iter_containers_async(two_containers):
+    path, offsets = two_containers
+
+    async def collect(limit=None):
+        found = []
+        async for c in aio.iter_containers_async(path):
+            found.append(c.offset)
+            if len(found) == limit:
+                break
+        return found
+
+    assert asyncio.run(collect()) == offsets
+    assert asyncio.run(collect(limit=1)) == offsets[:1]
+
+
+def _blocking_scan(running, stopped):
+    # Replaces find.scan_file with a scan that runs until it is cancelled
+    def scan_file(filename, cancel=None, **kwargs):
+        running.set()
+        while not cancel.wait(0.01):
+            pass
+        stopped.set()
+        return []
+    return scan_file
+
+
+def test_cancel_stops_scan(monkeypatch):
+    running = threading.Event()
+    stopped = threading.Event()
+    monkeypatch.setattr(find, 'scan_file', _blocking_scan(running, stopped))
+
+    async def cancel_scan():
+        task = asyncio.ensure_future(aio.scan_file_async('data.bin'))
+        while not running.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The scan has returned once the cancellation is complete
+        return stopped.is_set()
+
+    assert asyncio.run(cancel_scan())
+
+
+def test_max_scans(monkeypatch):
+    lock = threading.Lock()
+    active = [0, 0]
+
+    def scan_file(filename, **kwargs):
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return [filename]
+
+    monkeypatch.setattr(find, 'scan_file', scan_file)
+
+    async def scan_all():
+        scanner = aio.AsyncScanner(max_scans=2)
+        return await asyncio.gather(*(scanner.scan_file(str(i)) for i in range(6)))
+
+    assert asyncio.run(scan_all()) == [[str(i)] for i in range(6)]
+    assert active[1] == 2
@@ -0,0 +1,56 @@
+import pytest
+
+from imx_find_containers import find
+from imx_find_containers.fit import FITContainer
+from imx_find_containers.main import build_parser, parse_args
+
+from test_fit import make_fdt
+
+
+def _alignments(argv):
+    return parse_args(build_parser(), ['data.bin'] + argv).alignments
+
+
+def test_default_alignments():
+    assert _alignments([]) == {
+        'iMXImageContainer': 0x400,
+        'iMXImageVectorTable': 0x400,
+        'FITContainer': 4,
+    }
+
+
+def test_align_args():
+    # Alignments can be set for one type, an increment sets all of them
+    assert _alignments(['--align', 'fit=0x8'])['FITContainer'] == 8
+    assert _alignments(['-a', 'imx=0x1000', '-a', 'iMXImageVectorTable=0x200']) == {
+        'iMXImageContainer': 0x1000,
+        'iMXImageVectorTable': 0x200,
+        'FITContainer': 4,
+    }
+    assert _alignments(['--increment', '0x10']) == dict.fromkeys(find.get_alignments(), 0x10)
+    assert _alignments(['--increment', '0x10', '--align', 'ivt=0x100'])['iMXImageVectorTable'] == 0x100
+
+
+@pytest.mark.parametrize('arg', ['fit', 'foo=4', 'fit=0', 'fit=-4', 'fit=x'])
+def test_invalid_align_args(arg, capsys):
+    with pytest.raises(ValueError):
+        find.parse_alignment(arg)
+    with pytest.raises(SystemExit):
+        _alignments(['--align', arg])
+
+
+def test_fit_candidates():
+    # FIT images are found at any 4 byte aligned offset
+    data = b'\xff' * 0x104 + make_fdt() + b'\xff' * 0x100
+    assert find._next_candidate(data, FITContainer, 4, 0, len(data)) == 0x104
+    assert find._next_candidate(data, FITContainer, 4, 0x105, len(data)) == len(data)
+    assert find._next_candidate(data, FITContainer, 8, 0, len(data)) == len(data)
+    assert find._next_candidate(data, FITContainer, 4, 0, 0x100) == 0x100
+
+
+def test_scan_unaligned_fit(tmp_path):
+    pytest.importorskip('pyfdt')
+    path = tmp_path / 'data.bin'
+    path.write_bytes(b'\xff' * 0x104 + make_fdt() + b'\xff' * 0x100)
+    assert [c.offset for c in find.scan_file(str(path))] == [0x104]
+    assert find.scan_file(str(path), alignments={'fit': 8}) == []
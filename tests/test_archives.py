@@ -0,0 +1,84 @@
+import zipfile
+import tarfile
+import threading
+
+import pytest
+
+from imx_find_containers import find
+from imx_find_containers import archives
+
+from imx_data import make_data
+
+
+MEMBERS = ['a.bin', 'b.bin']
+
+
+@pytest.fixture(params=['images.zip', 'images.tar.gz'])
+def archive(request, tmp_path):
+    # Returns an archive with two data files that each have one container
+    contents = {}
+    for i, name in enumerate(MEMBERS):
+        contents[name] = make_data(seed=i)
+        (tmp_path / name).write_bytes(contents[name][0])
+
+    path = tmp_path / request.param
+    if request.param.endswith('.zip'):
+        with zipfile.ZipFile(path, 'w') as z:
+            for name in MEMBERS:
+                z.write(tmp_path / name, name)
+    else:
+        with tarfile.open(path, 'w:gz') as t:
+            for name in MEMBERS:
+                t.add(tmp_path / name, name)
+    yield str(path), contents
+    archives.close()
+
+
+def _scan_member(path, ranges):
+    containers = find.scan_file(path)
+    assert len(containers) == 1
+    assert [img['range'] for img in containers[0].images] == ranges
+
+
+def test_scan_members(archive):
+    path, contents = archive
+    members = archives.list_members(path)
+    assert members == [(f'{path}!/{n}', len(contents[n][0])) for n in MEMBERS]
+
+    for member, size in members:
+        assert archives.member_size(member) == size
+        _scan_member(member, contents[member.split('!/')[1]][1])
+
+
+def test_scan_members_in_threads(archive, tmp_path):
+    # Each thread reads from its own archive without closing the archive that
+    # another thread is reading
+    path, contents = archive
+    other = str(tmp_path / 'data.bin')
+    errors = []
+
+    def scan(member, ranges):
+        try:
+            for _ in range(10):
+                _scan_member(member, ranges)
+                _scan_member(other, contents['b.bin'][1])
+        except Exception as e:
+            errors.append(e)
+        finally:
+            archives.close()
+
+    (tmp_path / 'data.bin').write_bytes(contents['b.bin'][0])
+    threads = [threading.Thread(target=scan, args=(f'{path}!/{n}', contents[n][1])) for n in MEMBERS]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+
+def test_member_sizes_are_bounded(archive, monkeypatch):
+    path, contents = archive
+    monkeypatch.setattr(archives, 'MAX_MEMBER_SIZES', 1)
+    archives.list_members(path)
+    assert archives.member_size(f'{path}!/{MEMBERS[0]}') is None
+    assert archives.member_size(f'{path}!/{MEMBERS[1]}') == len(contents[MEMBERS[1]][0])
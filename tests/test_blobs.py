@@ -0,0 +1,90 @@
+import os
+import copy
+import pickle
+
+import pytest
+
+from imx_find_containers import find
+from imx_find_containers import utils
+from imx_find_containers import blobs
+
+from imx_data import write_data
+
+
+@pytest.fixture
+def scanned(tmp_path, monkeypatch):
+    # Two files with the same images
+    monkeypatch.chdir(tmp_path)
+    results = {}
+    for name in ('a.bin', 'b.bin'):
+        data, ranges = write_data(tmp_path / name)
+        results[name] = find.scan_file(name)
+    return data, ranges, results
+
+
+def _blob_files(path):
+    return [os.path.join(d, f) for d, _, files in os.walk(path) for f in files]
+
+
+def _results_file(path, ext):
+    return next(str(p) for p in path.glob(f'scan_results.*.{ext}'))
+
+
+@pytest.mark.parametrize('output_format, ext', [('pickle', 'pickle'), ('yaml', 'yaml')])
+def test_save_to_blob_store(scanned, tmp_path, monkeypatch, output_format, ext):
+    if output_format == 'yaml' and utils.get_yaml_module('yaml') is None:
+        pytest.skip('no yaml module available')
+    data, ranges, results = scanned
+    utils.save_results(results, output_format=output_format, blob_store=blobs.DEFAULT_BLOB_DIR)
+
+    # Identical images are only stored once
+    blob_files = _blob_files(tmp_path / blobs.DEFAULT_BLOB_DIR)
+    assert len(blob_files) == len(ranges)
+    assert sorted(open(f, 'rb').read() for f in blob_files) == sorted(data[r.start:r.stop] for r in ranges)
+
+    # Only the digest and length of the images are saved in the results
+    filename = _results_file(tmp_path, ext)
+    with open(filename, 'rb') as f:
+        saved = f.read()
+    assert not any(data[r.start:r.stop] in saved for r in ranges)
+
+    # The contents are only read from the store when they are used
+    gets = []
+    get = blobs.BlobStore.get
+    monkeypatch.setattr(blobs.BlobStore, 'get', lambda self, digest: gets.append(digest) or get(self, digest))
+    loaded = utils.open_results(filename)
+    assert sorted(loaded) == ['a.bin', 'b.bin']
+    images = loaded['b.bin'][0].images
+    assert all(isinstance(img['data'], blobs.BlobRef) for img in images)
+    assert gets == []
+
+    assert bytes(images[1]['data']) == data[ranges[1].start:ranges[1].stop]
+    assert gets == [images[1]['data'].digest]
+
+
+def test_blob_ref_pickle(tmp_path):
+    store = blobs.BlobStore(str(tmp_path / 'blobs'))
+    ref = store.put(b'contents')
+    assert store.put(b'contents').digest == ref.digest
+    assert ref.digest in store
+
+    dumped = pickle.dumps(ref)
+    assert b'contents' not in dumped
+    with blobs.using_store(store):
+        loaded = pickle.loads(dumped)
+    assert (loaded.digest, loaded.length) == (ref.digest, len(b'contents'))
+    assert bytes(loaded) == b'contents'
+
+    with pytest.raises(FileNotFoundError):
+        bytes(pickle.loads(dumped))
+
+
+def test_container_without_blob_store(scanned):
+    # Containers saved before blob stores existed don't have the attribute
+    _, ranges, results = scanned
+    c = copy.copy(results['a.bin'][0])
+    del c._blob_store
+    c.export_images = True
+    assert c.blob_store is None
+    assert len(c.get_export_images()) == len(ranges)
+    assert 'images' in list(c.get_yaml_attrs())
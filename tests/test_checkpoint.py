@@ -0,0 +1,40 @@
+import os
+import threading
+
+from imx_find_containers import find
+
+from imx_data import write_containers
+
+
+def test_resume_after_cancel(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / 'data.bin'
+    _, expected, _ = write_containers(path)
+    checkpoint = find.checkpoint_filename(str(path))
+
+    # Stop the scan once the first container is found, the progress is saved
+    cancel = threading.Event()
+    found = find.scan_file(str(path), checkpoint=True, cancel=cancel, on_container=lambda c: cancel.set())
+    assert [c.offset for c in found] == expected[:1]
+    assert os.path.exists(checkpoint)
+
+    # The resumed scan includes the containers found before it was stopped and
+    # the checkpoint is removed once the scan completes
+    found = find.scan_file(str(path), resume=True)
+    assert [c.offset for c in found] == expected
+    assert 'Resuming search' in capsys.readouterr().out
+    assert not os.path.exists(checkpoint)
+
+
+def test_checkpoint_for_different_scan(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / 'data.bin'
+    _, expected, _ = write_containers(path)
+
+    cancel = threading.Event()
+    find.scan_file(str(path), checkpoint=True, cancel=cancel, on_container=lambda c: cancel.set())
+
+    # A checkpoint saved with different scan options isn't used
+    found = find.scan_file(str(path), resume=True, start=0x100)
+    assert [c.offset for c in found] == expected
+    assert 'Ignoring checkpoint for a different scan' in capsys.readouterr().out
@@ -0,0 +1,44 @@
+import json
+import hashlib
+
+from imx_find_containers import extract
+from imx_find_containers.types import SourceData
+
+
+def test_write_image_hash_uses_copy_range(tmp_path, monkeypatch):
+    # Hashing the contents for the manifest doesn't stop the image from being
+    # copied by the kernel
+    data = bytes(range(256)) * 0x100
+    src = tmp_path / 'data.bin'
+    src.write_bytes(data)
+
+    copies = []
+    copy_range = extract.copy_range
+
+    def record_copy_range(*args):
+        copies.append(args[2:])
+        return copy_range(*args)
+
+    monkeypatch.setattr(extract, 'copy_range', record_copy_range)
+    size, digest = extract.write_image(SourceData(str(src), 0x100, 0x2000), str(tmp_path / 'img.bin'),
+            hash_contents=True)
+
+    assert copies == [(0x100, 0x2000)]
+    assert size == 0x2000
+    assert digest == hashlib.sha256(data[0x100:0x2100]).hexdigest()
+    assert (tmp_path / 'img.bin').read_bytes() == data[0x100:0x2100]
+
+
+def test_extraction_pool_manifest(tmp_path):
+    src = tmp_path / 'data.bin'
+    src.write_bytes(bytes(range(256)) * 0x10)
+    manifest = tmp_path / 'manifest.json'
+
+    with extract.ExtractionPool(2, str(manifest)) as pool:
+        pool.submit(SourceData(str(src), 0x10, 0x20), str(tmp_path / 'a.bin'), offset=0x10)
+        pool.submit(b'contents', str(tmp_path / 'b.bin'), offset=0x40)
+
+    entries = json.loads(manifest.read_text())
+    assert [(e['file'], e['size'], e['offset']) for e in entries] == \
+            [(str(tmp_path / 'a.bin'), 0x20, 0x10), (str(tmp_path / 'b.bin'), 8, 0x40)]
+    assert entries[1]['sha256'] == hashlib.sha256(b'contents').hexdigest()
@@ -0,0 +1,50 @@
+import pytest
+
+from imx_find_containers import find
+from imx_find_containers import filters
+
+from imx_data import write_data
+
+
+@pytest.fixture
+def container(tmp_path):
+    path = tmp_path / 'data.bin'
+    write_data(path)
+    return find.scan_file(str(path))[0]
+
+
+def test_parse_expression():
+    assert filters.parse_expression('type=EXE,DATA') == ('type', '=', ('EXE', 'DATA'))
+    assert filters.parse_expression(' size <= 16M ') == ('size', '<=', (16 * 1024 * 1024,))
+    assert filters.parse_expression('signed=no') == ('signed', '=', (False,))
+    assert filters.parse_expression('size>0x800') == ('size', '>', (0x800,))
+
+
+@pytest.mark.parametrize('expr', ['type', 'type~EXE', 'name=foo', 'size<1,2'])
+def test_invalid_expression(expr):
+    with pytest.raises(ValueError):
+        filters.parse_expression(expr)
+
+
+@pytest.mark.parametrize('exprs, selected', [
+    ([], [0, 1, 2]),
+    (['type=EXE'], [0, 2]),
+    (['type!=EXE'], [1]),
+    (['core_id=A72'], [1, 2]),
+    (['type=EXE', 'core_id=A72'], [2]),
+    (['size>=0x800'], [0, 2]),
+    (['size<1K'], []),
+    (['container=iMXImageContainer'], [0, 1, 2]),
+    (['container=FITContainer'], []),
+    (['signed=1'], []),
+    (['fileext=bin'], [0, 1, 2]),
+])
+def test_select_images(container, exprs, selected):
+    image_filter = filters.ImageFilter(exprs)
+    assert image_filter.select_images(container) == [container.images[i] for i in selected]
+    assert image_filter.select_containers([container]) == ([container] if selected else [])
+
+
+def test_empty_filter():
+    assert not filters.ImageFilter()
+    assert filters.ImageFilter(['type=EXE'])
@@ -0,0 +1,90 @@
+import io
+import os
+import threading
+import collections
+
+import pytest
+
+from imx_find_containers import find
+from imx_find_containers.imx import iMXImageContainer
+from imx_find_containers.fit import FITContainer
+
+from imx_data import make_data, write_data, CONTAINER_OFFSET
+
+
+def test_scan_file(tmp_path):
+    path = tmp_path / 'data.bin'
+    data, ranges = write_data(path)
+    containers = find.scan_file(str(path))
+
+    assert len(containers) == 1
+    c = containers[0]
+    assert isinstance(c, iMXImageContainer)
+    assert c.offset == CONTAINER_OFFSET
+    assert [img['range'] for img in c.images] == ranges
+    assert [bytes(img['data']) for img in c.images] == [data[r.start:r.stop] for r in ranges]
+
+
+def test_nested_fit_parse_error(tmp_path, monkeypatch):
+    # A FIT in a container image that can't be parsed doesn't discard the
+    # container
+    path = tmp_path / 'data.bin'
+    data, ranges = write_data(path)
+
+    def init_from_data(self, data, offset):
+        raise AssertionError('invalid FDT')
+
+    fit_offset = ranges[0].start
+    monkeypatch.setattr(FITContainer, 'is_container',
+            classmethod(lambda cls, data, offset, verbose=False: offset == fit_offset))
+    monkeypatch.setattr(FITContainer, 'validate', classmethod(lambda cls, data, offset: None))
+    monkeypatch.setattr(FITContainer, 'init_from_data', init_from_data)
+
+    stats = collections.Counter()
+    containers = find.scan_file(str(path), stats=stats)
+    assert [c.__class__ for c in containers] == [iMXImageContainer]
+    assert len(containers[0].images) == len(ranges)
+    assert stats == {('FITContainer', 'parse error'): 1}
+
+
+def test_truncated_image(tmp_path, capsys):
+    # Containers in truncated dumps are kept, the images that extend past the
+    # end of the data have no range
+    path = tmp_path / 'data.bin'
+    data, ranges = write_data(path, size=0x3800)
+    containers = find.scan_file(str(path))
+
+    assert len(containers) == 1
+    assert [img['range'] for img in containers[0].images] == ranges[:2] + [None]
+    assert containers[0].images[2]['data'] is None
+    assert 'WARNING' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('pipe', [False, True])
+def test_stream_ignores_file_options(tmp_path, monkeypatch, capsys, pipe):
+    # Streams can't be checkpointed or read as NAND dumps, the options are
+    # reported and ignored
+    data, ranges = make_data()
+    monkeypatch.chdir(tmp_path)
+    if pipe:
+        path = str(tmp_path / 'data.fifo')
+        os.mkfifo(path)
+
+        def write():
+            with open(path, 'wb') as f:
+                f.write(data)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        filename = path
+    else:
+        filename = io.BytesIO(data)
+
+    containers = find.scan_file(filename, checkpoint=True, resume=True, nand=(0x800, 0x40))
+    if pipe:
+        writer.join()
+
+    assert len(containers) == 1
+    assert [img['range'] for img in containers[0].images] == ranges
+    assert 'WARNING: ignoring checkpoint, resume, nand' in capsys.readouterr().out
+    assert not any(p.name.endswith('.checkpoint') for p in tmp_path.iterdir())
@@ -0,0 +1,83 @@
+import os
+import zipfile
+
+from imx_find_containers import find
+from imx_find_containers import utils
+
+
+def _write(path, size=0x100):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(bytes(size))
+    return str(path)
+
+
+def _names(files, root):
+    return [os.path.relpath(f, root) for f in files]
+
+
+def _sorted_names(files, root):
+    return sorted(_names(files, root))
+
+
+def test_hardlinks_and_symlinks(tmp_path):
+    # Files reachable through hardlinks or symlinks are returned once and
+    # symlink loops don't prevent the walk from finishing
+    _write(tmp_path / 'a' / 'data.bin')
+    os.link(tmp_path / 'a' / 'data.bin', tmp_path / 'a' / 'link.bin')
+    os.symlink(tmp_path / 'a', tmp_path / 'a' / 'loop')
+    os.symlink(tmp_path, tmp_path / 'a' / 'root')
+    os.symlink(tmp_path / 'missing', tmp_path / 'broken')
+
+    assert _names(utils.find_files(str(tmp_path)), tmp_path) == ['a/data.bin']
+
+
+def test_include_exclude(tmp_path):
+    for name in ('a/boot.bin', 'a/boot.img', 'b/boot.bin', 'b/skip/boot.bin', 'c.bin'):
+        _write(tmp_path / name)
+
+    assert _sorted_names(utils.find_files(str(tmp_path), include='*.bin'), tmp_path) == \
+            ['a/boot.bin', 'b/boot.bin', 'b/skip/boot.bin', 'c.bin']
+    assert _sorted_names(utils.find_files(str(tmp_path), include=['*.img', 'c.*']), tmp_path) == ['a/boot.img', 'c.bin']
+    assert _sorted_names(utils.find_files(str(tmp_path), exclude=['skip', '*.img']), tmp_path) == \
+            ['a/boot.bin', 'b/boot.bin', 'c.bin']
+    assert _sorted_names(utils.find_files(str(tmp_path), include='*.bin', exclude=f'{tmp_path}/b/*'), tmp_path) == \
+            ['a/boot.bin', 'c.bin']
+
+
+def test_min_size(tmp_path):
+    _write(tmp_path / 'small.bin', find.MIN_HEADER_SIZE - 1)
+    _write(tmp_path / 'header.bin', find.MIN_HEADER_SIZE)
+    _write(tmp_path / 'empty.bin', 0)
+
+    assert _names(utils.find_files(str(tmp_path)), tmp_path) == ['header.bin']
+    assert _sorted_names(utils.find_files(str(tmp_path), min_size=0), tmp_path) == ['empty.bin', 'header.bin', 'small.bin']
+
+    # A single file is always returned
+    assert list(utils.find_files(str(tmp_path / 'small.bin'))) == [str(tmp_path / 'small.bin')]
+
+
+def test_archive_members(tmp_path):
+    path = tmp_path / 'images.zip'
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('boot.bin', bytes(0x100))
+        z.writestr('small.bin', bytes(1))
+        z.writestr('notes.txt', bytes(0x100))
+
+    assert list(utils.find_files(str(tmp_path), archives=True, exclude='*.txt')) == [f'{path}!/boot.bin']
+    assert list(utils.find_files(str(tmp_path))) == [str(path)]
+
+
+def test_files_are_yielded_lazily(tmp_path, monkeypatch):
+    # The first file is returned before the other directories are listed
+    for name in ('a/data.bin', 'b/data.bin', 'c/data.bin'):
+        _write(tmp_path / name)
+
+    listed = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda path: listed.append(os.path.relpath(path, tmp_path)) or scandir(path))
+
+    files = utils.find_files(str(tmp_path))
+    assert os.path.relpath(next(files), tmp_path) == 'a/data.bin'
+    assert listed == ['.', 'a']
+    assert _names(files, tmp_path) == ['b/data.bin', 'c/data.bin']
+    assert listed == ['.', 'a', 'b', 'c']
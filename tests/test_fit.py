@@ -0,0 +1,89 @@
+import struct
+
+import pytest
+
+from imx_find_containers import find
+from imx_find_containers.fit import FITContainer
+from imx_find_containers.fit.fit_types import FDT_MAGIC, FDTHeader, FDTHeaderV17, FDT_V17_HEADER_SIZE, FDT_NOP
+
+
+FDT_END_NODE = 0x2
+FDT_END = 0x9
+
+
+def make_fdt(version=17, last_comp_version=16, first_token=0x1, nops=0, **fields):
+    # Returns a minimal FIT: a root node with an empty /images node. Header
+    # fields can be overridden to make the FDT invalid.
+    rsvmap = bytes(16)
+    struct_block = struct.pack('>I', FDT_NOP) * nops + struct.pack('>II', first_token, 0)
+    struct_block += struct.pack('>I', 0x1) + b'images\0\0'
+    struct_block += struct.pack('>III', FDT_END_NODE, FDT_END_NODE, FDT_END)
+
+    hdr = dict(
+        magic=FDT_MAGIC,
+        totalsize=FDT_V17_HEADER_SIZE + len(rsvmap) + len(struct_block),
+        off_dt_struct=FDT_V17_HEADER_SIZE + len(rsvmap),
+        off_dt_strings=FDT_V17_HEADER_SIZE + len(rsvmap) + len(struct_block),
+        off_mem_rsvmap=FDT_V17_HEADER_SIZE,
+        version=version,
+        last_comp_version=last_comp_version,
+        boot_cpuid_phys=0,
+        size_dt_strings=0,
+        size_dt_struct=len(struct_block),
+    )
+    hdr.update(fields)
+    data = FDTHeader._struct.pack(*(hdr[f] for f in FDTHeader._fields))
+    data += FDTHeaderV17._struct.pack(*(hdr[f] for f in FDTHeaderV17._fields))
+    return data + rsvmap + struct_block
+
+
+def test_valid_fdt():
+    data = make_fdt()
+    assert FITContainer.is_container(data, 0)
+    assert FITContainer.validate(data, 0) is None
+    assert FITContainer.validate(make_fdt(version=16), 0) is None
+
+
+@pytest.mark.parametrize('fields, reason', [
+    (dict(version=15), 'version'),
+    (dict(version=18), 'version'),
+    (dict(last_comp_version=15), 'last compatible version'),
+    (dict(version=16, last_comp_version=17), 'last compatible version'),
+    (dict(off_mem_rsvmap=0x2c), 'memory reservation map offset'),
+    (dict(off_mem_rsvmap=0x10), 'memory reservation map offset'),
+    (dict(off_mem_rsvmap=0x1000), 'memory reservation map offset'),
+    (dict(off_dt_struct=0x3a), 'structure block offset'),
+    (dict(off_dt_struct=0x1000), 'structure block offset'),
+    (dict(off_dt_strings=0x1000), 'strings block offset'),
+    (dict(size_dt_strings=0x1000), 'strings block offset'),
+    (dict(size_dt_struct=0x1000), 'structure block size'),
+    (dict(first_token=FDT_END_NODE), 'first token'),
+])
+def test_invalid_fdt(fields, reason):
+    assert FITContainer.validate(make_fdt(**fields), 0) == reason
+
+
+def test_truncated_fdt():
+    data = make_fdt()
+    assert FITContainer.validate(data[:-4], 0) == 'FDT truncated'
+    assert FITContainer.validate(data[:FDT_V17_HEADER_SIZE - 1], 0) == 'header truncated'
+
+
+def test_leading_nops():
+    # NOP tokens before the root node are skipped
+    assert FITContainer.validate(make_fdt(nops=2), 0) is None
+    assert FITContainer.validate(make_fdt(nops=2, first_token=FDT_END_NODE), 0) == 'first token'
+
+
+def test_scan_fdt(tmp_path):
+    # The FDT is parsed with pyfdt
+    pytest.importorskip('pyfdt')
+    fdt = make_fdt()
+    path = tmp_path / 'data.bin'
+    path.write_bytes(b'\xff' * 0x104 + fdt + b'\xff' * 0x100)
+
+    containers = find.scan_file(str(path))
+    assert [c.__class__ for c in containers] == [FITContainer]
+    assert containers[0].offset == 0x104
+    assert containers[0].fit
+    assert bytes(containers[0].images[0]['data']) == fdt
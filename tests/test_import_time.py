@@ -0,0 +1,62 @@
+import os
+import re
+import sys
+import subprocess
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The total time to import the command line tool, in microseconds as reported
+# by -X importtime. This is about twice as long as it takes, the fastest of a
+# few imports is used to limit the effect of a busy system.
+IMPORT_BUDGET_US = 150000
+IMPORT_RUNS = 3
+
+# Modules that must not be imported until they are used
+LAZY_MODULES = ('pyfdt', 'yaml', 'ruamel', 'sqlite3', 'tarfile', 'zipfile', 'concurrent.futures')
+
+_importtime_line = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$')
+
+
+def _importtime(code):
+    # Returns the {module: cumulative microseconds} of the modules imported by
+    # a new interpreter that runs code
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=env,
+            capture_output=True, text=True, check=True)
+    modules = {}
+    for line in proc.stderr.splitlines():
+        match = _importtime_line.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(2))
+    return modules
+
+
+def test_cli_import_budget():
+    runs = [_importtime('import imx_find_containers.main') for _ in range(IMPORT_RUNS)]
+    assert min(m['imx_find_containers.main'] for m in runs) < IMPORT_BUDGET_US
+
+    modules = runs[0]
+
+    for name in LAZY_MODULES:
+        imported = [m for m in modules if m == name or m.startswith(f'{name}.')]
+        assert not imported, f'{name} imported at startup'
+
+
+@pytest.mark.parametrize('module', ['imx', 'fit', 'utils', 'find', 'main', 'sqlite', 'json', 'yaml', 'extract', 'server', 'client', 'aio'])
+def test_import_first(module):
+    # Each module can be the first one imported from the package
+    _importtime(f'import imx_find_containers.{module}')
+
+
+@pytest.mark.parametrize('first', ['import imx_find_containers', 'import imx_find_containers.main',
+        'import imx_find_containers.server', 'from imx_find_containers import main'])
+def test_main_is_function(first):
+    # The package main attribute is the main function even after the main
+    # module has been imported
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    code = f'{first}\nimport imx_find_containers.main\nfrom imx_find_containers import main\nprint(type(main).__name__)'
+    proc = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    assert proc.stdout.strip() == 'function'
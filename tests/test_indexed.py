@@ -0,0 +1,73 @@
+import pytest
+
+from imx_find_containers import find
+from imx_find_containers import utils
+from imx_find_containers import indexed
+
+from imx_data import write_data
+
+
+@pytest.fixture
+def results_file(tmp_path):
+    # Returns an indexed results file with the results of two scanned files
+    results = {}
+    for i in range(2):
+        path = tmp_path / f'data{i}.bin'
+        data, ranges = write_data(path, seed=i)
+        containers = find.scan_file(str(path))
+        for c in containers:
+            c.export_images = True
+        results[str(path)] = (containers, data, ranges)
+    filename = indexed.write(str(tmp_path / 'results'), dict((k, v[0]) for k, v in results.items()))
+    return filename, results
+
+
+def test_lazy_loading(results_file, monkeypatch):
+    filename, expected = results_file
+    reads = []
+    pread = indexed.IndexedResults._pread
+    monkeypatch.setattr(indexed.IndexedResults, '_pread',
+            lambda self, offset, length: reads.append(length) or pread(self, offset, length))
+
+    with utils.open_results(filename) as results:
+        assert isinstance(results, indexed.IndexedResults)
+        assert sorted(results) == sorted(expected)
+
+        # The containers of a file are only loaded when they are accessed
+        first, second = expected
+        reads.clear()
+        containers = results[first]
+        assert len(reads) == 1
+        assert second not in results._cache
+
+        # The image contents are only read when they are used
+        reads.clear()
+        images = containers[0].images
+        assert all(isinstance(img['data'], indexed.IndexedData) for img in images)
+        assert reads == []
+
+        _, data, ranges = expected[first]
+        assert bytes(images[1]['data']) == data[ranges[1].start:ranges[1].stop]
+        assert reads == [len(ranges[1])]
+
+        assert [bytes(img['data']) for img in results[second][0].images] == \
+                [expected[second][1][r.start:r.stop] for r in expected[second][2]]
+
+    assert results._fd is None
+
+
+@pytest.mark.parametrize('corrupt', [
+    lambda data: b'',
+    lambda data: b'not an indexed file' * 4,
+    lambda data: data[:-1],
+    lambda data: data[:-len(indexed.MAGIC)] + bytes(len(indexed.MAGIC)),
+    lambda data: data[:-len(indexed.MAGIC) - 8] + bytes(8) + indexed.MAGIC,
+])
+def test_corrupt_file(results_file, tmp_path, corrupt):
+    filename, _ = results_file
+    path = tmp_path / 'corrupt.idx'
+    with open(filename, 'rb') as f:
+        path.write_bytes(corrupt(f.read()))
+
+    with pytest.raises(ValueError):
+        indexed.load(str(path))
@@ -0,0 +1,50 @@
+import os
+import hashlib
+
+from imx_find_containers import find
+from imx_find_containers import extract
+from imx_find_containers.types import SourceData
+
+
+def _make_file(path, size):
+    data = os.urandom(size)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return data
+
+
+def test_slices(tmp_path):
+    path = tmp_path / 'data.bin'
+    data = _make_file(path, 0x10000)
+    with find.OpenedFile(str(path), block_size=0x100, cache_blocks=4) as f:
+        assert len(f) == len(data)
+        for start, stop in ((0, 0x10), (0xf0, 0x310), (0xfff0, 0x10010), (0x200, 0x100)):
+            assert f[start:stop] == data[start:stop]
+        assert f[0x1234] == data[0x1234]
+        assert f[-1] == data[-1]
+        assert f[0x10:0x400:3] == data[0x10:0x400:3]
+        assert f.find(data[0x8000:0x8010]) == data.find(data[0x8000:0x8010])
+
+
+def test_cache_is_bounded(tmp_path):
+    # Reading the whole file only keeps cache_blocks blocks in memory
+    path = tmp_path / 'data.bin'
+    data = _make_file(path, 0x40000)
+    with find.OpenedFile(str(path), block_size=0x100, cache_blocks=8, read_ahead=4) as f:
+        for offset in range(0, len(data), 0x80):
+            assert f[offset:offset + 0x80] == data[offset:offset + 0x80]
+            assert len(f._blocks) <= 8
+
+
+def test_image_data_is_not_read(tmp_path):
+    # Image contents refer to the file and are copied from it when extracted
+    path = tmp_path / 'data.bin'
+    data = _make_file(path, 0x10000)
+    with find.OpenedFile(str(path)) as f:
+        img = f.image_data(0x1000, 0x9000)
+    assert isinstance(img, SourceData)
+
+    size, digest = extract.write_image(img, str(tmp_path / 'img.bin'), hash_contents=True)
+    assert size == 0x8000
+    assert digest == hashlib.sha256(data[0x1000:0x9000]).hexdigest()
+    assert (tmp_path / 'img.bin').read_bytes() == data[0x1000:0x9000]
@@ -0,0 +1,108 @@
+import os
+import copy
+import pickle
+
+import pytest
+
+from imx_find_containers import find
+from imx_find_containers import utils
+from imx_find_containers import blobs
+from imx_find_containers import filters
+from imx_find_containers import json
+
+from imx_find_containers.types import SourceData
+
+from imx_data import write_data
+
+
+@pytest.fixture
+def scanned(tmp_path):
+    path = tmp_path / 'data.bin'
+    data, ranges = write_data(path)
+    containers = find.scan_file(str(path))
+    assert len(containers) == 1
+    return str(path), data, ranges, containers
+
+
+def _image_contents(containers):
+    return [bytes(img['data']) for c in containers for img in c.images]
+
+
+def test_copy_keeps_images(scanned, tmp_path):
+    # Copying is not affected by the export settings
+    path, data, ranges, containers = scanned
+    c = containers[0]
+    c.export_images = False
+    c.blob_store = blobs.BlobStore(str(tmp_path / 'blobs'))
+
+    for copied in (copy.copy(c), copy.deepcopy(c), pickle.loads(pickle.dumps(c))):
+        assert len(copied.images) == len(ranges)
+        assert copied.find_image_by_addr(ranges[1].start)['range'] == ranges[1]
+    assert not os.path.exists(tmp_path / 'blobs')
+
+
+def test_filtered_container_can_be_pickled(scanned):
+    path, data, ranges, containers = scanned
+    c = containers[0]
+    c.image_filter = filters.ImageFilter(['type=EXE', 'size>=0x1000'])
+    loaded = pickle.loads(pickle.dumps(c))
+    assert loaded.image_filter.select_images(loaded) == [loaded.images[2]]
+
+
+@pytest.mark.parametrize('include_image_contents', [False, True])
+def test_pickle_results(scanned, tmp_path, monkeypatch, include_image_contents):
+    path, data, ranges, containers = scanned
+    monkeypatch.chdir(tmp_path)
+    for c in containers:
+        c.export_images = include_image_contents
+
+    filename = utils._write_pickle('results', {path: containers}, include_image_contents)
+    loaded = utils.open_results(filename)[path]
+
+    if include_image_contents:
+        # The contents are saved instead of references to the scanned file
+        assert all(type(img['data']) is bytes for img in loaded[0].images)
+        assert _image_contents(loaded) == [data[r.start:r.stop] for r in ranges]
+    else:
+        assert loaded[0].images == []
+
+    # Saving the results doesn't change the containers
+    assert len(containers[0].images) == len(ranges)
+
+
+@pytest.mark.parametrize('include_image_contents', [False, True])
+def test_json_results(scanned, tmp_path, include_image_contents):
+    path, data, ranges, containers = scanned
+    for c in containers:
+        c.export_images = include_image_contents
+
+    filename = json.JsonIface().write(str(tmp_path / 'results'), {path: containers})
+    loaded = utils.open_results(filename)[path]
+
+    assert [c.__class__ for c in loaded] == [c.__class__ for c in containers]
+    assert loaded[0].offset == containers[0].offset
+    assert repr(loaded[0].hdr) == repr(containers[0].hdr)
+    if include_image_contents:
+        assert [img['range'] for img in loaded[0].images] == ranges
+        assert _image_contents(loaded) == [data[r.start:r.stop] for r in ranges]
+    else:
+        assert loaded[0].images == []
+
+
+def test_pickle_results_stream_images(scanned, tmp_path, monkeypatch):
+    # Each image is read when it is written, and the blob store used for an
+    # export isn't saved with the containers
+    path, data, ranges, containers = scanned
+    monkeypatch.chdir(tmp_path)
+    resolved = []
+    resolve = SourceData.resolve
+    monkeypatch.setattr(SourceData, 'resolve', lambda self: resolved.append(self.offset) or resolve(self))
+
+    for c in containers:
+        c.export_images = True
+    filename = utils._write_pickle('results', {path: containers}, True)
+    assert resolved == [r.start for r in ranges]
+
+    loaded = utils.open_results(filename)[path]
+    assert '_blob_store' not in vars(loaded[0])
+    assert _image_contents(loaded) == [data[r.start:r.stop] for r in ranges]
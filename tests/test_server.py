@@ -0,0 +1,52 @@
+import pickle
+import threading
+
+import pytest
+
+from imx_find_containers import server
+from imx_find_containers import client
+from imx_find_containers.types import SourceData
+
+from imx_data import write_data
+
+
+@pytest.fixture
+def scan_server(tmp_path):
+    socket_path = str(tmp_path / 'server.sock')
+    srv = server.ScanServer(socket_path, workers=1)
+    thread = threading.Thread(target=srv.serve_forever)
+    thread.start()
+    yield socket_path
+    srv.shutdown()
+    thread.join()
+    srv.server_close()
+
+
+def _extracted(path):
+    return sorted(p.read_bytes() for p in path.glob('*.bin'))
+
+
+def test_source_data_pickles_reference(tmp_path):
+    path = tmp_path / 'data.bin'
+    data, ranges = write_data(path)
+    src = SourceData(str(path), ranges[0].start, len(ranges[0]))
+    dumped = pickle.dumps(src)
+    assert data[ranges[0].start:ranges[0].stop] not in dumped
+    assert pickle.loads(dumped).resolve() == data[ranges[0].start:ranges[0].stop]
+
+
+def test_cached_results_use_filter(scan_server, tmp_path):
+    # A scan with a filter doesn't change the results of later scans of the
+    # same file without a filter
+    data, ranges = write_data(tmp_path / 'data.bin')
+    images = sorted(data[r.start:r.stop] for r in ranges)
+
+    for name, argv in (('filtered', ['-f', 'type=EXE']), ('all', [])):
+        cwd = tmp_path / name
+        cwd.mkdir()
+        status = client.run([str(tmp_path / 'data.bin'), '-e', '-o', 'pickle'] + argv, scan_server, str(cwd))
+        assert status == 0
+
+    exe_images = sorted(data[r.start:r.stop] for r in (ranges[0], ranges[2]))
+    assert _extracted(tmp_path / 'filtered') == exe_images
+    assert _extracted(tmp_path / 'all') == images
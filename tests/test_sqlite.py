@@ -0,0 +1,69 @@
+import sys
+import sqlite3
+
+import pytest
+
+from imx_find_containers import find
+from imx_find_containers import sqlite
+
+from imx_data import write_data
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / 'data.bin'
+    write_data(path)
+    database = str(tmp_path / 'results.db')
+    sqlite.write(database, {str(path): find.scan_file(str(path))}, scanned='now')
+    return database
+
+
+def test_find(database):
+    rows = sqlite.find(database, 'containers', tag='CONTAINER')
+    assert [(r['type'], r['num_images'], r['signed']) for r in rows] == [('iMXImageContainer', 3, 0)]
+
+    assert len(sqlite.find(database, 'images', type='EXE')) == 2
+    assert len(sqlite.find(database, 'images', type=('EXE', 'DATA'))) == 3
+    assert len(sqlite.find(database, 'images', type__ne=('EXE', 'DATA'))) == 0
+    rows = sqlite.find(database, 'images', type='EXE', core_id='A72', size__ge=0x1000)
+    assert [(r['offset'], r['size']) for r in rows] == [(0x3400, 0x1000)]
+
+
+def test_rescan_replaces_results(database, tmp_path):
+    path = str(tmp_path / 'data.bin')
+    sqlite.write(database, {path: find.scan_file(path)}, scanned='later')
+    rows = sqlite.query(database, 'SELECT path, scanned FROM files')
+    assert [tuple(r) for r in rows] == [(path, 'later')]
+    assert len(sqlite.find(database, 'images')) == 3
+
+
+def test_query_is_readonly(tmp_path):
+    database = tmp_path / 'missing.db'
+    with pytest.raises(sqlite3.OperationalError):
+        sqlite.find(str(database), 'images')
+    assert not database.exists()
+
+
+def test_parse_filter():
+    assert sqlite._parse_filter('srk_revoke_mask!=0') == ('srk_revoke_mask__ne', 0)
+    assert sqlite._parse_filter('type=EXE,DATA') == ('type', ('EXE', 'DATA'))
+    assert sqlite._parse_filter('size >= 16K') == ('size__ge', 0x4000)
+    assert sqlite._parse_filter('entry=null') == ('entry', None)
+
+
+def test_main(database, monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['imx_query_results', database, '-t', 'containers', '-w', 'tag=CONTAINER'])
+    assert sqlite.main() == 0
+    header, row = capsys.readouterr().out.splitlines()
+    assert header.split('\t')[:3] == ['path', 'id', 'file_id']
+    assert row.split('\t')[header.split('\t').index('tag')] == 'CONTAINER'
+
+
+def test_main_formats_values(database, monkeypatch, capsys):
+    # Only offsets, sizes and addresses are printed as hex
+    monkeypatch.setattr(sys, 'argv', ['imx_query_results', database, '-w', 'type=EXE', '-w', 'core_id=A72'])
+    assert sqlite.main() == 0
+    header, row = capsys.readouterr().out.splitlines()
+    values = dict(zip(header.split('\t'), row.split('\t')))
+    assert (values['offset'], values['size'], values['container_offset']) == ('0x3400', '0x1000', '0x400')
+    assert (values['id'], values['container_id'], values['signed'], values['encrypted']) == ('3', '1', '0', '0')
@@ -0,0 +1,177 @@
+import copy
+import pickle
+import random
+
+import pytest
+
+from imx_find_containers import find
+from imx_find_containers import utils
+from imx_find_containers.types import Image, LazyBytes, SourceData
+from imx_find_containers.imx.types import ImageType, CoreType, CPUID
+
+from imx_data import write_data, IMAGES
+
+
+def _brute_force_image(images, addr):
+    # The image lookup used before images were indexed
+    by_range = {}
+    for img in images:
+        if img['range'] is not None:
+            by_range[img['range']] = img
+    for addr_range, img in by_range.items():
+        if addr in addr_range:
+            return img
+    return None
+
+
+def _brute_force_next_addr(images, addr):
+    img = _brute_force_image(images, addr)
+    if img is None:
+        return addr
+    return _brute_force_next_addr(images, img['range'].stop)
+
+
+def test_find_image_by_addr(tmp_path):
+    # Overlapping, interleaved, duplicate, adjacent and empty image ranges are
+    # found the same way as searching every image
+    path = tmp_path / 'data.bin'
+    write_data(path)
+    c = find.scan_file(str(path))[0]
+    rand = random.Random(0)
+
+    for _ in range(200):
+        images = []
+        for _ in range(rand.randrange(8)):
+            start = rand.randrange(0, 0x100, 0x10)
+            stop = start + rand.randrange(0, 0x80, 0x10)
+            img_range = None if rand.random() < 0.05 else range(start, stop)
+            images.append(Image(range=img_range, data=None))
+        if images and rand.random() < 0.2:
+            images.append(Image(range=rand.choice(images)['range'], data=None))
+
+        c.images = images
+        c.map_images_by_addr()
+        for addr in range(0, 0x180, 8):
+            assert c.find_image_by_addr(addr) is _brute_force_image(images, addr)
+            assert c.find_next_addr(addr) == _brute_force_next_addr(images, addr)
+
+
+@pytest.fixture
+def scanned(tmp_path):
+    path = tmp_path / 'data.bin'
+    data, ranges = write_data(path)
+    return str(path), data, ranges, find.scan_file(str(path))[0]
+
+
+def test_image_decoded_values(scanned):
+    # The flags are decoded from the image header when they are accessed
+    path, data, ranges, c = scanned
+    for img, (_, _, img_type, core) in zip(c.images, IMAGES):
+        assert img['type'] == img_type and isinstance(img['type'], ImageType)
+        assert img['core_id'] == core and isinstance(img['core_id'], CoreType)
+        assert img['cpu_id'] == utils.enum_or_int(CPUID, 0)
+        assert img.type == img['type']
+        assert 'type' in img.keys() and 'type' not in img.__getstate__()
+
+
+def test_image_dict_api(scanned):
+    path, data, ranges, c = scanned
+    img = c.images[0]
+    assert img.get('range') == ranges[0]
+    assert img.get('missing') is None
+    assert img.get('missing', 1) == 1
+    with pytest.raises(KeyError):
+        img['missing']
+
+    items = dict(img.items())
+    assert list(items) == img.keys() == list(img)
+    assert len(img) == len(items)
+    assert items['type'] == IMAGES[0][2]
+
+    # Images are equal to a dictionary with the same values, including the
+    # decoded values
+    assert img == items
+    assert img != dict(items, type=ImageType.DATA)
+
+    copied = img.copy()
+    assert copied == img and copied is not img
+    copied['fileext'] = 'img'
+    assert 'fileext' not in img and copied['fileext'] == 'img'
+
+    # Decoded values can't be set
+    with pytest.raises(KeyError):
+        img['type'] = ImageType.DATA
+    assert img['type'] == IMAGES[0][2]
+
+
+def test_image_pickle(scanned):
+    # Only the stored values are pickled
+    path, data, ranges, c = scanned
+    img = c.images[0]
+    loaded = pickle.loads(pickle.dumps(img))
+    assert loaded == img
+    assert copy.deepcopy(img) == img
+    assert b'core_id' not in pickle.dumps(img)
+
+
+def test_image_yaml(scanned, tmp_path):
+    yaml_iface = utils.get_yaml_module('yaml')
+    if yaml_iface is None:
+        pytest.skip('no yaml module available')
+    path, data, ranges, c = scanned
+    c.export_images = True
+    filename = yaml_iface.write(str(tmp_path / 'results'), {path: [c]})
+
+    with open(filename) as f:
+        saved = f.read()
+    assert 'core_id' not in saved
+    loaded = utils.open_results(filename)[path][0]
+    assert loaded.images == c.images
+
+
+class CountingData(LazyBytes):
+    def __init__(self, data):
+        self.data = data
+        self.length = len(data)
+        self.reads = []
+
+    def resolve(self):
+        self.reads.append(self.length)
+        return self.data
+
+    def read(self, offset, length):
+        self.reads.append(length)
+        return self.data[offset:offset + length]
+
+
+def test_lazy_bytes_ranged_reads(monkeypatch):
+    monkeypatch.setattr(LazyBytes, '_compare_size', 0x100)
+    data = bytes(range(256)) * 4
+    lazy = CountingData(data)
+    assert lazy[0x10:0x20] == data[0x10:0x20]
+    assert lazy[-4:] == data[-4:]
+    assert lazy[5] == data[5] and lazy[-1] == data[-1]
+    assert lazy.reads == [0x10, 4, 1, 1]
+    with pytest.raises(IndexError):
+        lazy[len(data)]
+
+    # Comparisons stop at the first difference and don't read data of a
+    # different length
+    lazy.reads.clear()
+    assert lazy != data[:-1]
+    assert lazy != b'\xff' + data[1:]
+    assert lazy == CountingData(data)
+    assert lazy.reads == [0x100] + [0x100] * 4
+
+
+def test_source_data_ranged_reads(scanned):
+    path, data, ranges, c = scanned
+    src = SourceData(path, ranges[0].start, len(ranges[0]))
+    assert src[0x10:0x20] == data[ranges[0].start + 0x10:ranges[0].start + 0x20]
+    assert src[len(src) - 4:len(src) + 4] == data[ranges[0].stop - 4:ranges[0].stop]
+    assert src == data[ranges[0].start:ranges[0].stop]
+
+
+def test_lazy_bytes_is_abstract():
+    with pytest.raises(TypeError):
+        LazyBytes()
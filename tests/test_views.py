@@ -0,0 +1,104 @@
+import struct
+
+import pytest
+
+from imx_find_containers import find
+from imx_find_containers import views
+from imx_find_containers.imx.types import ImageType, CoreType
+
+from imx_data import make_data, CONTAINER_OFFSET
+
+
+BLOCK_SIZE = 0x1000
+
+# The second image is split between two RAW chunks
+IMAGES = [
+    (0x1000, 0x800, ImageType.EXE, CoreType.A53),
+    (0x3800, 0x1000, ImageType.DATA, CoreType.A72),
+]
+
+
+def _chunk(chunk_type, blocks, data=b''):
+    return views.SparseChunkHeader._struct.pack(chunk_type, 0, blocks, views.SparseChunkHeader.size + len(data)) + data
+
+
+def write_sparse(path, data):
+    # Writes an Android sparse image that expands to some empty blocks, the
+    # data split into two RAW chunks in the middle of an image, and a filled
+    # block. Returns the expanded image.
+    split = BLOCK_SIZE * 4
+    chunks = [
+        _chunk(views.SparseChunkType.DONT_CARE, 2),
+        _chunk(views.SparseChunkType.RAW, split // BLOCK_SIZE, data[:split]),
+        _chunk(views.SparseChunkType.RAW, (len(data) - split) // BLOCK_SIZE, data[split:]),
+        _chunk(views.SparseChunkType.FILL, 1, b'\x12\x34\x56\x78'),
+        _chunk(views.SparseChunkType.CRC32, 0, bytes(4)),
+    ]
+    total_blocks = 2 + len(data) // BLOCK_SIZE + 1
+    hdr = views.SparseHeader._struct.pack(views.SPARSE_HEADER_MAGIC, views.SPARSE_MAJOR_VERSION, 0,
+            views.SparseHeader.size, views.SparseChunkHeader.size, BLOCK_SIZE, total_blocks, len(chunks), 0)
+    path.write_bytes(hdr + b''.join(chunks))
+    return bytes(2 * BLOCK_SIZE) + data + b'\x12\x34\x56\x78' * (BLOCK_SIZE // 4)
+
+
+def test_sparse_file(tmp_path):
+    data, ranges = make_data(images=IMAGES)
+    path = tmp_path / 'data.simg'
+    expanded = write_sparse(path, data)
+
+    assert views.is_sparse(str(path))
+    with views.SparseFile(str(path)) as view:
+        assert len(view) == len(expanded)
+        assert view[:] == expanded
+        for start in range(0, len(expanded), 0x7f3):
+            assert view[start:start + 0x1234] == expanded[start:start + 0x1234]
+        assert view.file_offset(0) is None
+        assert view.file_offset(len(expanded) - 1) is None
+        assert view.next_data_offset(0) == 2 * BLOCK_SIZE
+        assert view.find(data[CONTAINER_OFFSET:CONTAINER_OFFSET + 16]) == 2 * BLOCK_SIZE + CONTAINER_OFFSET
+
+
+def test_scan_sparse(tmp_path):
+    # Offsets are offsets in the expanded image, the image that is split
+    # between chunks is read from both
+    data, ranges = make_data(images=IMAGES)
+    path = tmp_path / 'data.simg'
+    expanded = write_sparse(path, data)
+    containers = find.scan_file(str(path))
+
+    assert len(containers) == 1
+    c = containers[0]
+    assert c.offset == 2 * BLOCK_SIZE + CONTAINER_OFFSET
+    assert [bytes(img['data']) for img in c.images] == [expanded[r.start + 2 * BLOCK_SIZE:r.stop + 2 * BLOCK_SIZE] for r in ranges]
+
+
+def write_nand(path, data, page_size, oob_size):
+    # Writes the data as a raw NAND dump with OOB bytes after each page
+    pages = [data[i:i + page_size] for i in range(0, len(data), page_size)]
+    path.write_bytes(b''.join(p + struct.pack('<B', i & 0xff) * oob_size for i, p in enumerate(pages)))
+
+
+def test_parse_nand_geometry():
+    assert views.parse_nand_geometry('2048+64') == (2048, 64)
+    assert views.parse_nand_geometry('0x1000+224') == (0x1000, 224)
+    for arg in ('2048', '0+64', '2048+-1'):
+        with pytest.raises(ValueError):
+            views.parse_nand_geometry(arg)
+
+
+def test_scan_nand(tmp_path):
+    data, ranges = make_data()
+    path = tmp_path / 'data.nand'
+    write_nand(path, data, 0x800, 0x40)
+
+    with views.NandFile(str(path), 0x800, 0x40) as view:
+        assert len(view) == len(data)
+        assert view[:] == data
+        assert view[0x7f0:0x1810] == data[0x7f0:0x1810]
+        assert view.file_offset(0x801) == 0x841
+
+    # The OOB bytes are skipped, so the images that span pages are contiguous
+    containers = find.scan_file(str(path), nand=(0x800, 0x40))
+    assert len(containers) == 1
+    assert containers[0].offset == CONTAINER_OFFSET
+    assert [bytes(img['data']) for img in containers[0].images] == [data[r.start:r.stop] for r in ranges]
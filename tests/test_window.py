@@ -0,0 +1,66 @@
+import pytest
+
+from imx_find_containers import find
+from imx_find_containers.main import build_parser, parse_args
+
+from imx_data import write_containers, CONTAINER_OFFSET, DATA_SIZE
+
+
+@pytest.fixture
+def two_containers(tmp_path):
+    path = tmp_path / 'data.bin'
+    _, _, ranges = write_containers(path)
+    return str(path), ranges[0]
+
+
+def _offsets(containers):
+    return [c.offset for c in containers]
+
+
+def test_window(two_containers):
+    path, _ = two_containers
+    second = DATA_SIZE + CONTAINER_OFFSET
+
+    # Only containers that start in the window are found, the offsets are
+    # offsets in the file
+    assert _offsets(find.scan_file(path)) == [CONTAINER_OFFSET, second]
+    assert _offsets(find.scan_file(path, start=CONTAINER_OFFSET + 1)) == [second]
+    assert _offsets(find.scan_file(path, start=second)) == [second]
+    assert _offsets(find.scan_file(path, end=second)) == [CONTAINER_OFFSET]
+    assert _offsets(find.scan_file(path, start=CONTAINER_OFFSET + 1, end=second)) == []
+
+
+def test_images_past_end(two_containers):
+    # The images of a container in the window are parsed even if they extend
+    # past the end of the window
+    path, ranges = two_containers
+    containers = find.scan_file(path, end=CONTAINER_OFFSET + 0x100)
+    assert _offsets(containers) == [CONTAINER_OFFSET]
+    assert [img['range'] for img in containers[0].images] == ranges
+    assert all(img['data'] is not None for img in containers[0].images)
+
+
+def _window(argv):
+    args = parse_args(build_parser(), ['data.bin'] + argv)
+    return (args.start, args.end)
+
+
+def test_window_args():
+    assert _window([]) == (0, None)
+    assert _window(['--start', '0x1000']) == (0x1000, None)
+    assert _window(['--end', '0x2000']) == (0, 0x2000)
+    assert _window(['--start', '0x1000', '--length', '0x800']) == (0x1000, 0x1800)
+    assert _window(['--length', '0x800']) == (0, 0x800)
+
+
+@pytest.mark.parametrize('argv', [
+    ['--end', '0x2000', '--length', '0x800'],
+    ['--start', '0x1000', '--end', '0x1000'],
+    ['--start', '0x1000', '--end', '0x800'],
+    ['--length', '0'],
+    ['--start', '-1'],
+    ['--start', 'x'],
+])
+def test_invalid_window_args(argv, capsys):
+    with pytest.raises(SystemExit):
+        _window(argv)